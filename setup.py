@@ -17,10 +17,13 @@ setup(
         "google-cloud-secret-manager==2.5.0",
         "google_cloud_aiplatform==1.1.1",
         "google-cloud-storage==1.38.0",
+        "google-cloud-monitoring==2.4.0",
+        "kubernetes==17.17.0",
         "cookiecutter==1.7.3",
         #"dvc[gs]==2.5.0",
         "sacred==0.8.2",
         "pymongo==3.11.4",
+        "numpy>=1.19",
         "questionary==1.10.0"
     ]
 )
@@ -0,0 +1,184 @@
+"""
+Running Vertex AI batch prediction jobs over sharded inputs in Google Storage
+"""
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from typing import List, Optional
+
+from google.cloud import storage
+from google.cloud.aiplatform import Model, BatchPredictionJob
+from google.cloud.aiplatform.compat.types import job_state as gca_job_state
+
+from edge.config import ServingConfig
+from edge.exception import EdgeException
+from edge.tui import SubStepTUI, TUIStatus
+
+FORMATS = {
+    ".jsonl": "jsonl",
+    ".csv": "csv",
+}
+
+FINISHED_STATES = {
+    gca_job_state.JobState.JOB_STATE_SUCCEEDED,
+    gca_job_state.JobState.JOB_STATE_FAILED,
+    gca_job_state.JobState.JOB_STATE_CANCELLED,
+    gca_job_state.JobState.JOB_STATE_PAUSED,
+}
+
+
+@dataclass
+class BatchPredictionReport:
+    job_resource_name: str
+    state: str
+    successful_count: int
+    failed_count: int
+    elapsed_seconds: float
+
+    @property
+    def throughput(self) -> float:
+        if self.elapsed_seconds == 0:
+            return 0.0
+        return self.successful_count / self.elapsed_seconds
+
+
+def split_gcs_uri(uri: str) -> (str, str):
+    if not uri.startswith("gs://"):
+        raise EdgeException(f"'{uri}' is not a Google Storage URI (gs://bucket/path)")
+    bucket_name, _, blob_name = uri[len("gs://"):].partition("/")
+    return bucket_name, blob_name
+
+
+def get_instances_format(input_uri: str) -> str:
+    for extension, instances_format in FORMATS.items():
+        if input_uri.endswith(extension):
+            return instances_format
+    raise EdgeException(f"Unable to determine the format of '{input_uri}'. Inputs must be .jsonl or .csv files.")
+
+
+def shard_input(client: storage.Client, input_uri: str, staging_uri: str, shard_size: int) -> List[str]:
+    """
+    Split a JSONL or CSV file into shards of [shard_size] instances, so that Vertex AI can spread them over replicas.
+    The input is streamed, so it never has to fit in memory. CSV shards repeat the header line.
+
+    :param client:
+    :param input_uri:
+    :param staging_uri: directory to write shards into
+    :param shard_size:
+    :return: URIs of the shards
+    """
+    bucket_name, blob_name = split_gcs_uri(input_uri)
+    staging_bucket_name, staging_prefix = split_gcs_uri(staging_uri)
+    staging_bucket = client.bucket(staging_bucket_name)
+    extension = os.path.splitext(blob_name)[1]
+    is_csv = get_instances_format(input_uri) == "csv"
+
+    blob = client.bucket(bucket_name).get_blob(blob_name)
+    if blob is None:
+        raise EdgeException(f"Input '{input_uri}' does not exist")
+
+    shard_uris = []
+    shard = None
+    header = None
+    lines_in_shard = 0
+    with blob.open("r") as reader:
+        for line in reader:
+            if is_csv and header is None:
+                header = line
+                continue
+            if shard is None or lines_in_shard >= shard_size:
+                if shard is not None:
+                    shard.close()
+                shard_name = f"{staging_prefix.rstrip('/')}/input-{len(shard_uris):05d}{extension}"
+                shard = staging_bucket.blob(shard_name).open("w")
+                shard_uris.append(f"gs://{staging_bucket_name}/{shard_name}")
+                lines_in_shard = 0
+                if header is not None:
+                    shard.write(header)
+            shard.write(line)
+            lines_in_shard += 1
+    if shard is not None:
+        shard.close()
+    return shard_uris
+
+
+def submit_batch_prediction(
+    model_resource_name: str,
+    model_name: str,
+    input_uris: List[str],
+    output_uri: str,
+    serving: ServingConfig,
+) -> BatchPredictionJob:
+    return Model(model_resource_name).batch_predict(
+        job_display_name=f"{model_name}-batch-prediction-{uuid.uuid4().hex[:8]}",
+        gcs_source=input_uris,
+        instances_format=get_instances_format(input_uris[0]),
+        gcs_destination_prefix=output_uri,
+        predictions_format="jsonl",
+        machine_type=serving.machine_type,
+        starting_replica_count=serving.min_replica_count,
+        max_replica_count=serving.max_replica_count,
+        sync=False,
+    )
+
+
+def wait_for_batch_prediction(
+    job: BatchPredictionJob,
+    sub_step: SubStepTUI,
+    poll_interval: float = 30,
+    creation_timeout_seconds: float = 600,
+    sleep=time.sleep,
+) -> BatchPredictionReport:
+    """
+    Poll [job] until it finishes, showing progress on [sub_step]
+
+    :param job:
+    :param sub_step:
+    :param poll_interval:
+    :param creation_timeout_seconds: how long to wait for a job submitted asynchronously to be created
+    :param sleep:
+    :return:
+    """
+    started = time.monotonic()
+    # Jobs submitted asynchronously are created in the background. If creating the job fails, e.g. because of an
+    # invalid machine type or a quota, the error is kept on the job, which never gets a resource name.
+    waited = 0
+    while not getattr(getattr(job, "_gca_resource", None), "name", None):
+        exception = getattr(job, "_exception", None)
+        if exception is not None:
+            raise EdgeException(f"Batch prediction job could not be created: {exception}")
+        if waited >= creation_timeout_seconds:
+            raise EdgeException(f"Batch prediction job was not created within {creation_timeout_seconds:.0f}s")
+        sleep(1)
+        waited += 1
+    while True:
+        job._sync_gca_resource()
+        resource = job._gca_resource
+        stats = resource.completion_stats
+        elapsed = time.monotonic() - started
+        sub_step.update(
+            f"Batch prediction {resource.state.name.replace('JOB_STATE_', '').lower()}: "
+            f"{stats.successful_count} predictions, {stats.failed_count} failed, "
+            f"{stats.successful_count / elapsed if elapsed > 0 else 0:.1f} predictions/s"
+        )
+        if resource.state in FINISHED_STATES:
+            break
+        sleep(poll_interval)
+
+    report = BatchPredictionReport(
+        job_resource_name=job.resource_name,
+        state=resource.state.name,
+        successful_count=stats.successful_count,
+        failed_count=stats.failed_count,
+        elapsed_seconds=elapsed,
+    )
+    if resource.state != gca_job_state.JobState.JOB_STATE_SUCCEEDED:
+        raise EdgeException(f"Batch prediction job '{job.resource_name}' finished with state {resource.state.name}"
+                            f"{': ' + resource.error.message if resource.error.message else ''}")
+    sub_step.update(status=TUIStatus.SUCCESSFUL)
+    return report
+
+
+def staging_uri_for(bucket_name: str, vertex_jobs_directory: str, job_id: Optional[str] = None) -> str:
+    return f"gs://{bucket_name}/{vertex_jobs_directory}/batch-prediction/{job_id or uuid.uuid4().hex}"
@@ -0,0 +1,205 @@
+"""
+Load testing of prediction endpoints
+
+A sample payload is replayed against an endpoint at a series of load levels. Each level either keeps a fixed
+number of requests in flight (closed loop), or sends requests at a fixed rate regardless of how quickly they
+complete (open loop), which is what production traffic looks like.
+"""
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from serde import serialize, deserialize
+
+from edge.path import get_model_path
+
+
+@deserialize
+@serialize
+@dataclass
+class LevelResult:
+    # Either "concurrency" or "qps"
+    mode: str
+    level: float
+    duration_seconds: float
+    request_count: int
+    error_count: int
+    throughput: float
+    p50_ms: Optional[float]
+    p95_ms: Optional[float]
+    p99_ms: Optional[float]
+    max_ms: Optional[float]
+    # A few distinct error messages, to help diagnosing failures
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def error_rate(self) -> float:
+        if self.request_count == 0:
+            return 0.0
+        return self.error_count / self.request_count
+
+
+@deserialize
+@serialize
+@dataclass
+class BenchmarkReport:
+    model_name: str
+    target: str
+    started_at: str
+    instances_per_request: int
+    levels: List[LevelResult]
+    # Model version and serving configuration the benchmark ran against, for comparisons across versions
+    model_resource_name: Optional[str] = None
+    serving: Optional[str] = None
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """
+    Nearest-rank percentile of [sorted_values]
+
+    :param sorted_values:
+    :param q: between 0 and 100
+    :return:
+    """
+    if len(sorted_values) == 0:
+        return None
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class _Recorder:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def call(self, send: Callable[[List[Any]], Any], payload: List[Any], scheduled: Optional[float] = None):
+        """
+        :param send:
+        :param payload:
+        :param scheduled: `time.monotonic()` time the request was meant to be sent at, so that the time it waited
+                          for a worker counts towards its latency
+        :return:
+        """
+        start = scheduled if scheduled is not None else time.monotonic()
+        try:
+            send(payload)
+        except Exception as exc:
+            with self.lock:
+                message = str(exc)[:200]
+                self.errors[message] = self.errors.get(message, 0) + 1
+            return
+        elapsed = (time.monotonic() - start) * 1000
+        with self.lock:
+            self.latencies.append(elapsed)
+
+    def result(self, mode: str, level: float, duration: float) -> LevelResult:
+        latencies = sorted(self.latencies)
+        error_count = sum(self.errors.values())
+        return LevelResult(
+            mode=mode,
+            level=level,
+            duration_seconds=round(duration, 3),
+            request_count=len(latencies) + error_count,
+            error_count=error_count,
+            throughput=round(len(latencies) / duration, 3) if duration > 0 else 0.0,
+            p50_ms=percentile(latencies, 50),
+            p95_ms=percentile(latencies, 95),
+            p99_ms=percentile(latencies, 99),
+            max_ms=latencies[-1] if latencies else None,
+            errors=list(self.errors)[:5],
+        )
+
+
+def run_concurrency_level(
+    send: Callable[[List[Any]], Any],
+    payloads: List[List[Any]],
+    concurrency: int,
+    duration_seconds: float,
+) -> LevelResult:
+    """
+    Keep [concurrency] requests in flight for [duration_seconds]
+
+    :param send: sends one request, raising on failure
+    :param payloads: request payloads, replayed in a loop
+    :param concurrency:
+    :param duration_seconds:
+    :return:
+    """
+    recorder = _Recorder()
+    payload_cycle = itertools.cycle(payloads)
+    payload_lock = threading.Lock()
+    deadline = time.monotonic() + duration_seconds
+
+    def worker():
+        while time.monotonic() < deadline:
+            with payload_lock:
+                payload = next(payload_cycle)
+            recorder.call(send, payload)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.result("concurrency", concurrency, time.monotonic() - started)
+
+
+def run_qps_level(
+    send: Callable[[List[Any]], Any],
+    payloads: List[List[Any]],
+    qps: float,
+    duration_seconds: float,
+    max_concurrency: int = 256,
+) -> LevelResult:
+    """
+    Send [qps] requests per second for [duration_seconds], independently of response times
+
+    :param send: sends one request, raising on failure
+    :param payloads: request payloads, replayed in a loop
+    :param qps:
+    :param duration_seconds:
+    :param max_concurrency: maximum number of requests in flight. Requests are delayed once it is reached,
+                            which shows as lower throughput than the target. Latency is measured from when a
+                            request was meant to be sent, so the delay counts towards it.
+    :return:
+    """
+    recorder = _Recorder()
+    interval = 1 / qps
+    count = int(qps * duration_seconds)
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="edge-benchmark") as executor:
+        for i, payload in zip(range(count), itertools.cycle(payloads)):
+            scheduled = started + i * interval
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(recorder.call, send, payload, scheduled)
+    return recorder.result("qps", qps, time.monotonic() - started)
+
+
+def read_payloads(path: str, instances_per_request: int) -> List[List[Any]]:
+    """
+    Read a JSONL file of instances, grouped into request payloads
+
+    :param path:
+    :param instances_per_request:
+    :return:
+    """
+    with open(path) as f:
+        instances = [json.loads(line) for line in f if line.strip() != ""]
+    return [
+        instances[i:i + instances_per_request]
+        for i in range(0, len(instances), instances_per_request)
+    ]
+
+
+def get_benchmarks_path(model_name: str) -> str:
+    return os.path.join(get_model_path(model_name), "benchmarks")
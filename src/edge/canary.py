@@ -0,0 +1,167 @@
+"""
+Progressive canary rollouts of models on Vertex AI endpoints
+"""
+import abc
+import importlib
+import time
+from dataclasses import dataclass
+from typing import Optional, Callable
+
+from google.cloud import monitoring_v3
+
+from edge.config import CanaryConfig
+from edge.exception import EdgeException
+
+
+@dataclass
+class CanaryMetrics:
+    request_count: int
+    error_count: int
+    # 95th percentile of prediction latency, if any requests have been served
+    latency_ms: Optional[float] = None
+
+    @property
+    def error_rate(self) -> float:
+        if self.request_count == 0:
+            return 0.0
+        return self.error_count / self.request_count
+
+
+class MetricsSource(abc.ABC):
+    """
+    Source of serving metrics used to decide whether a canary rollout can proceed.
+    Custom sources can be configured in `canary.metrics_source` as "module:Class", and are constructed
+    without arguments.
+    """
+
+    @abc.abstractmethod
+    def get_metrics(self, endpoint_resource_name: str, deployed_model_id: str, window_seconds: int) -> CanaryMetrics:
+        """
+        Get serving metrics of a deployed model over the last [window_seconds]
+
+        :param endpoint_resource_name:
+        :param deployed_model_id:
+        :param window_seconds:
+        :return:
+        """
+        raise NotImplementedError()
+
+
+class CloudMonitoringMetricsSource(MetricsSource):
+    """
+    Reads the online prediction metrics that Vertex AI reports to Cloud Monitoring
+    """
+
+    def __init__(self):
+        self.client = monitoring_v3.MetricServiceClient()
+
+    def _query(self, project_id: str, metric_type: str, endpoint_id: str, deployed_model_id: str,
+               window_seconds: int, aligner: monitoring_v3.Aggregation.Aligner):
+        now = int(time.time())
+        return self.client.list_time_series(
+            request={
+                "name": f"projects/{project_id}",
+                "filter": (
+                    f'metric.type = "{metric_type}" '
+                    f'AND resource.labels.endpoint_id = "{endpoint_id}" '
+                    f'AND metric.labels.deployed_model_id = "{deployed_model_id}"'
+                ),
+                "interval": monitoring_v3.TimeInterval(
+                    {"end_time": {"seconds": now}, "start_time": {"seconds": now - window_seconds}}
+                ),
+                "aggregation": monitoring_v3.Aggregation(
+                    {"alignment_period": {"seconds": window_seconds}, "per_series_aligner": aligner}
+                ),
+                "view": monitoring_v3.ListTimeSeriesRequest.TimeSeriesView.FULL,
+            }
+        )
+
+    def get_metrics(self, endpoint_resource_name: str, deployed_model_id: str, window_seconds: int) -> CanaryMetrics:
+        # Endpoint resource names are projects/{project}/locations/{location}/endpoints/{endpoint_id}
+        parts = endpoint_resource_name.split("/")
+        project_id, endpoint_id = parts[1], parts[5]
+        prefix = "aiplatform.googleapis.com/prediction/online"
+        aligner = monitoring_v3.Aggregation.Aligner
+
+        def total(metric_type: str) -> int:
+            series = self._query(project_id, f"{prefix}/{metric_type}", endpoint_id, deployed_model_id,
+                                 window_seconds, aligner.ALIGN_SUM)
+            return sum(int(point.value.int64_value) for s in series for point in s.points)
+
+        latencies = [
+            point.value.double_value
+            for s in self._query(project_id, f"{prefix}/prediction_latencies", endpoint_id, deployed_model_id,
+                                 window_seconds, aligner.ALIGN_PERCENTILE_95)
+            for point in s.points
+        ]
+        return CanaryMetrics(
+            request_count=total("prediction_count"),
+            error_count=total("error_count"),
+            latency_ms=max(latencies) if latencies else None,
+        )
+
+
+def load_metrics_source(name: str) -> MetricsSource:
+    """
+    Load a metrics source by name: "cloud-monitoring", or "module:Class" for a custom source
+
+    :param name:
+    :return:
+    """
+    if name == "cloud-monitoring":
+        return CloudMonitoringMetricsSource()
+    try:
+        module_name, class_name = name.split(":")
+        return getattr(importlib.import_module(module_name), class_name)()
+    except (ValueError, ImportError, AttributeError) as exc:
+        raise EdgeException(f"Unable to load canary metrics source '{name}'. It must be either 'cloud-monitoring' "
+                            f"or a 'module:Class' path to a MetricsSource.\n{exc}")
+
+
+def check_gates(metrics: CanaryMetrics, max_latency_ms: float, max_error_rate: float) -> Optional[str]:
+    """
+    Check canary gates
+
+    :return: reason the gates failed, or None if the rollout can proceed
+    """
+    if metrics.error_rate > max_error_rate:
+        return f"error rate {metrics.error_rate:.2%} is above {max_error_rate:.2%}"
+    if metrics.latency_ms is not None and metrics.latency_ms > max_latency_ms:
+        return f"p95 latency {metrics.latency_ms:.0f}ms is above {max_latency_ms:.0f}ms"
+    return None
+
+
+def evaluate_step(
+    metrics_source: MetricsSource,
+    endpoint_resource_name: str,
+    deployed_model_id: str,
+    canary: CanaryConfig,
+    sleep: Callable[[float], None] = time.sleep,
+    on_extend: Optional[Callable[[CanaryMetrics, int], None]] = None,
+) -> Optional[str]:
+    """
+    Evaluate the gates of a canary step on the new model. The gates are only evaluated once the new model has served
+    [canary.min_requests] requests, as metrics reach Cloud Monitoring with a delay, and a handful of requests says
+    little about latency or errors. Until then, the step is extended by [canary.step_wait_seconds] at a time. A step
+    that does not serve enough requests within [canary.max_step_wait_seconds] fails.
+
+    :param metrics_source:
+    :param endpoint_resource_name:
+    :param deployed_model_id: the new model
+    :param canary:
+    :param sleep:
+    :param on_extend: called with the metrics so far and the seconds waited whenever the step is extended
+    :return: reason the step failed, or None if the rollout can proceed
+    """
+    waited = 0
+    while True:
+        sleep(canary.step_wait_seconds)
+        waited += canary.step_wait_seconds
+        metrics = metrics_source.get_metrics(endpoint_resource_name, deployed_model_id, waited)
+        if metrics.request_count >= canary.min_requests:
+            return check_gates(metrics, canary.max_latency_ms, canary.max_error_rate)
+        if waited >= canary.max_step_wait_seconds:
+            return (f"only {metrics.request_count} requests were served in {waited}s, fewer than the "
+                    f"{canary.min_requests} needed to evaluate the gates")
+        if on_extend is not None:
+            on_extend(metrics, waited)
@@ -1,6 +1,7 @@
 from edge.config import EdgeConfig
 from edge.exception import EdgeException
 from edge.gcloud import is_authenticated, project_exists, is_billing_enabled
+from edge.steps import Step, StepGraph
 from edge.tui import SubStepTUI, StepTUI
 
 
@@ -30,6 +31,14 @@ def check_billing_enabled(gcloud_project: str):
 def precommand_checks(config: EdgeConfig):
     gcloud_project = config.google_cloud_project.project_id
     with StepTUI(message="Checking your GCP environment", emoji="☁️") as step:
-        check_gcloud_authenticated(gcloud_project)
-        check_project_exists(gcloud_project)
-        check_billing_enabled(gcloud_project)
+        StepGraph([
+            Step("Authentication", lambda: check_gcloud_authenticated(gcloud_project), outputs=["authenticated"]),
+            Step(
+                "Project",
+                lambda authenticated: check_project_exists(gcloud_project),
+                inputs=["authenticated"],
+                outputs=["project"],
+            ),
+            # Billing cannot be checked for a project that does not exist, so the missing project is reported instead
+            Step("Billing", lambda project: check_billing_enabled(gcloud_project), inputs=["project"]),
+        ], show_critical_path=False).run()
@@ -0,0 +1,74 @@
+from typing import Optional
+
+from edge.command.common.precommand_check import precommand_checks
+from edge.config import EdgeConfig
+from edge.data import DATA_ROOTS, discover_outputs, get_remote, pull, checkout
+from edge.dvc import read_dvc_config, get_dvc_storage_path, get_dvc_cache_dir, get_dvc_remote_jobs, get_default_jobs
+from edge.exception import EdgeException
+from edge.tui import TUI, StepTUI, SubStepTUI, TUIStatus, format_size, format_throughput
+
+
+def data_pull(jobs: Optional[int] = None):
+    """
+    Download DVC-tracked data from the vertex:edge DVC remote, and check it out into the workspace
+
+    :param jobs: number of parallel transfers. Defaults to the number configured for the DVC remote.
+    :return:
+    """
+    intro = "Pulling DVC-tracked data"
+    success_title = "Data pulled successfully"
+    success_message = "Success"
+    failure_title = "Data pull failed"
+    failure_message = "See the errors above. Run `./edge.sh data pull` again to resume. See README for more details."
+    with EdgeConfig.context() as config:
+        with TUI(
+                intro,
+                success_title,
+                success_message,
+                failure_title,
+                failure_message
+        ) as tui:
+            with StepTUI("Finding DVC-tracked data", emoji="🔍"):
+                with SubStepTUI("Reading DVC configuration"):
+                    dvc_config = read_dvc_config(local=True)
+                    url = get_dvc_storage_path(dvc_config)
+                    if url is None:
+                        raise EdgeException("DVC remote storage is not configured. Run `./edge.sh dvc init`.")
+                    cache_dir = get_dvc_cache_dir(dvc_config)
+                    jobs = jobs or get_dvc_remote_jobs(dvc_config) or get_default_jobs()
+                with SubStepTUI(f"Finding DVC files in {', '.join(DATA_ROOTS)}") as sub_step:
+                    outputs = discover_outputs()
+                    if len(outputs) == 0:
+                        sub_step.update("No DVC-tracked data found", status=TUIStatus.NEUTRAL)
+                        tui.success_message = "There is no data to pull"
+                        return
+                    sub_step.update(f"Found {len(outputs)} tracked outputs")
+
+            if url.startswith("gs://"):
+                precommand_checks(config)
+
+            with StepTUI(f"Pulling data from '{url}'", emoji="⬇️"):
+                with SubStepTUI(f"Downloading data with {jobs} parallel transfers") as sub_step:
+                    def on_progress(report):
+                        sub_step.update(f"Downloaded {report.done}/{report.total} objects, "
+                                        f"{format_size(report.bytes_transferred)} at "
+                                        f"{format_throughput(report.throughput)}")
+
+                    report = pull(outputs, get_remote(url, config.google_cloud_project.project_id), cache_dir, jobs,
+                                  on_progress)
+                    sub_step.update(f"Downloaded {report.transferred} objects, {report.skipped} were already in the "
+                                    f"cache")
+                    if report.missing:
+                        raise EdgeException(
+                            f"{len(report.missing)} objects are missing from the DVC remote. They may not have been "
+                            f"pushed yet:\n" + "\n".join(report.missing[:10])
+                        )
+                    if report.errors:
+                        raise EdgeException("Some objects could not be downloaded:\n" + "\n".join(report.errors))
+                with SubStepTUI("Checking out data into the workspace"):
+                    checkout(outputs)
+
+            tui.success_message = (
+                f"Pulled {format_size(report.bytes_transferred)} in {report.seconds:.1f}s "
+                f"({format_throughput(report.throughput)})"
+            )
@@ -0,0 +1,74 @@
+from typing import Optional
+
+from edge.command.common.precommand_check import precommand_checks
+from edge.config import EdgeConfig
+from edge.data import DATA_ROOTS, discover_outputs, get_remote, push
+from edge.dvc import read_dvc_config, get_dvc_storage_path, get_dvc_cache_dir, get_dvc_remote_jobs, get_default_jobs
+from edge.exception import EdgeException
+from edge.tui import TUI, StepTUI, SubStepTUI, TUIStatus, format_size, format_throughput
+
+
+def data_push(jobs: Optional[int] = None):
+    """
+    Upload DVC-tracked data from the DVC cache to the vertex:edge DVC remote
+
+    :param jobs: number of parallel transfers. Defaults to the number configured for the DVC remote.
+    :return:
+    """
+    intro = "Pushing DVC-tracked data"
+    success_title = "Data pushed successfully"
+    success_message = "Success"
+    failure_title = "Data push failed"
+    failure_message = "See the errors above. Run `./edge.sh data push` again to resume. See README for more details."
+    with EdgeConfig.context() as config:
+        with TUI(
+                intro,
+                success_title,
+                success_message,
+                failure_title,
+                failure_message
+        ) as tui:
+            with StepTUI("Finding DVC-tracked data", emoji="🔍"):
+                with SubStepTUI("Reading DVC configuration"):
+                    dvc_config = read_dvc_config(local=True)
+                    url = get_dvc_storage_path(dvc_config)
+                    if url is None:
+                        raise EdgeException("DVC remote storage is not configured. Run `./edge.sh dvc init`.")
+                    cache_dir = get_dvc_cache_dir(dvc_config)
+                    jobs = jobs or get_dvc_remote_jobs(dvc_config) or get_default_jobs()
+                with SubStepTUI(f"Finding DVC files in {', '.join(DATA_ROOTS)}") as sub_step:
+                    outputs = discover_outputs()
+                    if len(outputs) == 0:
+                        sub_step.update("No DVC-tracked data found", status=TUIStatus.NEUTRAL)
+                        tui.success_message = "There is no data to push"
+                        return
+                    sub_step.update(f"Found {len(outputs)} tracked outputs")
+
+            if url.startswith("gs://"):
+                precommand_checks(config)
+
+            with StepTUI(f"Pushing data to '{url}'", emoji="⬆️"):
+                with SubStepTUI(f"Uploading data with {jobs} parallel transfers") as sub_step:
+                    def on_progress(report):
+                        sub_step.update(f"Uploaded {report.done}/{report.total} objects, "
+                                        f"{format_size(report.bytes_transferred)} at "
+                                        f"{format_throughput(report.throughput)}")
+
+                    report = push(outputs, get_remote(url, config.google_cloud_project.project_id), cache_dir, jobs,
+                                  on_progress)
+                    sub_step.update(f"Uploaded {report.transferred} objects, {report.skipped} were already in the "
+                                    f"remote")
+                    if report.errors:
+                        raise EdgeException("Some objects could not be uploaded:\n" + "\n".join(report.errors))
+                    if report.missing:
+                        sub_step.update(status=TUIStatus.WARNING)
+                        sub_step.set_dirty()
+                        sub_step.add_explanation(
+                            f"{len(report.missing)} objects are not in the DVC cache, so they were not pushed. "
+                            f"They may have been produced on another machine, or removed by `dvc gc`."
+                        )
+
+            tui.success_message = (
+                f"Pushed {format_size(report.bytes_transferred)} in {report.seconds:.1f}s "
+                f"({format_throughput(report.throughput)})"
+            )
@@ -0,0 +1,25 @@
+import argparse
+
+from edge.command.data.pull import data_pull
+from edge.command.data.push import data_push
+from edge.exception import EdgeException
+
+
+def add_data_parser(subparsers):
+    parser = subparsers.add_parser("data", help="DVC-tracked data related actions")
+    actions = parser.add_subparsers(title="action", dest="action", required=True)
+
+    pull_parser = actions.add_parser("pull", help="Download DVC-tracked data and check it out into the workspace")
+    push_parser = actions.add_parser("push", help="Upload DVC-tracked data from the DVC cache")
+    for action_parser in [pull_parser, push_parser]:
+        action_parser.add_argument("-j", "--jobs", type=int, default=None,
+                                   help="Number of parallel transfers (default: as configured by `dvc init`)")
+
+
+def run_data_actions(args: argparse.Namespace):
+    if args.action == "pull":
+        data_pull(args.jobs)
+    elif args.action == "push":
+        data_push(args.jobs)
+    else:
+        raise EdgeException("Unexpected data command")
@@ -4,7 +4,7 @@ from edge.command.common.precommand_check import precommand_checks
 from edge.config import EdgeConfig
 from edge.state import EdgeState
 from edge.tui import TUI
-from edge.dvc import setup_dvc
+from edge.dvc import setup_dvc, setup_dvc_performance
 from edge.path import get_model_dvc_pipeline
 
 
@@ -32,11 +32,14 @@ Happy herding! 🐏
         failure_title,
         failure_message
     ) as tui:
-        with EdgeConfig.context() as config:
+        with EdgeConfig.context(to_save=True) as config:
             precommand_checks(config)
             with EdgeState.context(config) as state:
                 setup_dvc(
                     state.storage.bucket_path,
                     config.storage_bucket.dvc_store_directory
                 )
+                config.storage_bucket.dvc_performance = setup_dvc_performance(
+                    config.storage_bucket.dvc_performance
+                )
 
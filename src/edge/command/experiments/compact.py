@@ -0,0 +1,61 @@
+from edge.command.common.precommand_check import precommand_checks
+from edge.compaction import compact_metrics
+from edge.config import EdgeConfig
+from edge.experiments import get_tracker_database
+from edge.storage import get_bucket
+from edge.tui import TUI, StepTUI, SubStepTUI, TUIStatus
+
+
+def experiments_compact(older_than_days: int, max_points: int, archive: bool = False, dry_run: bool = False):
+    intro = "Compacting experiment metrics" + (" (dry run)" if dry_run else "")
+    success_title = "Experiment metrics compacted successfully"
+    success_message = "Success"
+    failure_title = "Experiment metrics compaction failed"
+    failure_message = "See the errors above. See README for more details."
+    with TUI(
+        intro,
+        success_title,
+        success_message,
+        failure_title,
+        failure_message
+    ) as tui:
+        with EdgeConfig.context() as config:
+            precommand_checks(config)
+            with StepTUI("Connecting to the experiment tracker", emoji="📔"):
+                with SubStepTUI("Getting experiment tracker connection"):
+                    database = get_tracker_database(config)
+                archive_bucket = None
+                if archive and not dry_run:
+                    with SubStepTUI(f"Checking archive bucket '{config.storage_bucket.bucket_name}'"):
+                        archive_bucket = get_bucket(
+                            config.google_cloud_project.project_id,
+                            config.storage_bucket.bucket_name
+                        )
+            with StepTUI(f"Downsampling metrics of runs older than {older_than_days} days", emoji="🗜️"):
+                with SubStepTUI(f"Downsampling metric series to at most {max_points} points") as sub_step:
+                    report = compact_metrics(
+                        database,
+                        older_than_days,
+                        max_points,
+                        archive_bucket=archive_bucket,
+                        archive_directory=config.storage_bucket.experiments_archive_directory,
+                        dry_run=dry_run,
+                    )
+                    if report.series == 0:
+                        sub_step.update("No metric series need compacting", status=TUIStatus.NEUTRAL)
+                    else:
+                        sub_step.update(status=TUIStatus.SUCCESSFUL)
+                        sub_step.add_explanation(
+                            f"{report.series} series, {report.points_before} → {report.points_after} points"
+                        )
+                        sub_step.add_explanation(
+                            f"{report.bytes_before / 2**20:.1f} MiB → {report.bytes_after / 2**20:.1f} MiB "
+                            f"({report.bytes_saved / 2**20:.1f} MiB {'would be ' if dry_run else ''}saved)"
+                        )
+                        if report.archived > 0:
+                            sub_step.add_explanation(
+                                f"Raw series archived to gs://{config.storage_bucket.bucket_name}/"
+                                f"{config.storage_bucket.experiments_archive_directory}/metrics/"
+                            )
+            if dry_run:
+                tui.success_title = "Dry run finished, nothing has been changed"
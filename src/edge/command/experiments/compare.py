@@ -0,0 +1,23 @@
+import sys
+from typing import List
+
+import questionary
+
+from edge.config import EdgeConfig
+from edge.exception import EdgeException
+from edge.experiments import get_experiment_store, compare_runs
+
+
+def compare_experiments(run_ids: List[int], local: bool = False):
+    with EdgeConfig.context(silent=True) as config:
+        try:
+            store = get_experiment_store(config, local)
+            comparison = compare_runs(store, run_ids)
+            width = max(len(field) for field in comparison.keys())
+            print(f"{'RUN':<{width}}  " + "  ".join(f"{run_id:>12}" for run_id in run_ids))
+            for field, values in comparison.items():
+                print(f"{field:<{width}}  " + "  ".join(f"{str(values[run_id]):>12}" for run_id in run_ids))
+        except EdgeException as exc:
+            questionary.print(str(exc), style="fg:ansired")
+            sys.exit(1)
+        sys.exit(0)
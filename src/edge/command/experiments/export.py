@@ -0,0 +1,52 @@
+from typing import Optional
+
+from edge.command.common.precommand_check import precommand_checks
+from edge.config import EdgeConfig
+from edge.experiments import get_tracker_database
+from edge.export import export_experiments
+from edge.tui import TUI, StepTUI, SubStepTUI, TUIStatus
+
+
+def experiments_export(output_dir: str, shard_size: int = 1000, experiment_name: Optional[str] = None):
+    intro = f"Exporting experiments to '{output_dir}'"
+    success_title = "Experiments exported successfully"
+    success_message = "Success"
+    failure_title = "Experiments export failed"
+    failure_message = "See the errors above. See README for more details."
+    with TUI(
+        intro,
+        success_title,
+        success_message,
+        failure_title,
+        failure_message
+    ) as tui:
+        with EdgeConfig.context() as config:
+            precommand_checks(config)
+            with StepTUI("Connecting to the experiment tracker", emoji="📔"):
+                with SubStepTUI("Getting experiment tracker connection"):
+                    database = get_tracker_database(config)
+            with StepTUI("Exporting experiments", emoji="📦"):
+                with SubStepTUI(f"Exporting runs and metrics in shards of {shard_size} runs") as sub_step:
+                    report = export_experiments(database, output_dir, shard_size, experiment_name)
+                    if report.runs == 0:
+                        sub_step.update("No new runs to export", status=TUIStatus.NEUTRAL)
+                    else:
+                        sub_step.update(
+                            f"Exported {report.runs} runs and {report.metric_points} metric points "
+                            f"into {report.shards} shards",
+                            status=TUIStatus.SUCCESSFUL
+                        )
+                    if report.unfinished_runs > 0:
+                        sub_step.add_explanation(
+                            f"{report.unfinished_runs} runs have not finished yet, and will be exported once they do"
+                        )
+                    if report.non_numeric_values > 0:
+                        sub_step.add_explanation(
+                            f"{report.non_numeric_values} metric values are not numbers, and are exported as NaN"
+                        )
+            tui.success_message = (
+                f"Runs up to {report.last_run_id} are exported to '{output_dir}'. "
+                "Run the same command again to export new runs.\n\n"
+                "Load a shard with `numpy.load(path)`; run columns are keyed by field, e.g. 'config.epochs', "
+                "and metrics are aligned arrays keyed 'metric.run_id', 'metric.name', 'metric.step', 'metric.value'."
+            )
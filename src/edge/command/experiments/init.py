@@ -1,6 +1,5 @@
 from edge.command.common.precommand_check import precommand_checks
 from edge.config import EdgeConfig, SacredConfig
-from edge.enable_api import enable_service_api
 from edge.exception import EdgeException
 from edge.path import get_model_dvc_pipeline
 from edge.state import EdgeState
@@ -25,11 +24,6 @@ def experiments_init():
         with EdgeConfig.context(to_save=True) as config:
             precommand_checks(config)
             with EdgeState.context(config, to_lock=True, to_save=True) as state:
-                with StepTUI("Enabling required Google Cloud APIs", emoji="☁️"):
-                    with SubStepTUI("Enabling Kubernetes Engine API for experiment tracking"):
-                        enable_service_api("container.googleapis.com", config.google_cloud_project.project_id)
-                    with SubStepTUI("Enabling Secret Manager API for experiment tracking"):
-                        enable_service_api("secretmanager.googleapis.com", config.google_cloud_project.project_id)
                 with StepTUI("Configuring experiment tracking", emoji="⚙️"):
                     with SubStepTUI("Configuring Kubernetes cluster name on GCP", status=TUIStatus.NEUTRAL) as sub_step:
                         sub_step.add_explanation("If a name for an existing cluster is provided, this cluster "
@@ -0,0 +1,37 @@
+import sys
+from typing import Optional, List
+
+import questionary
+
+from edge.config import EdgeConfig
+from edge.exception import EdgeException
+from edge.experiments import get_experiment_store
+
+
+def list_experiments(
+    experiment_name: Optional[str] = None,
+    status: Optional[str] = None,
+    config_filters: Optional[List[str]] = None,
+    sort_by: str = "start_time",
+    ascending: bool = False,
+    limit: int = 20,
+    local: bool = False,
+):
+    with EdgeConfig.context(silent=True) as config:
+        try:
+            store = get_experiment_store(config, local)
+            runs = store.find_runs(experiment_name, status, config_filters, sort_by, ascending, limit)
+            print(f"{'ID':>6}  {'EXPERIMENT':<24}  {'STATUS':<12}  {'STARTED':<19}  RESULT")
+            for run in runs:
+                start_time = run.get("start_time")
+                print(
+                    f"{run['_id']:>6}  "
+                    f"{run.get('experiment', {}).get('name', ''):<24}  "
+                    f"{run.get('status', ''):<12}  "
+                    f"{start_time.strftime('%Y-%m-%d %H:%M:%S') if start_time is not None else '':<19}  "
+                    f"{run.get('result')}"
+                )
+        except EdgeException as exc:
+            questionary.print(str(exc), style="fg:ansired")
+            sys.exit(1)
+        sys.exit(0)
@@ -0,0 +1,21 @@
+import sys
+
+import questionary
+import yaml
+
+from edge.config import EdgeConfig
+from edge.exception import EdgeException
+from edge.experiments import get_experiment_store
+
+
+def show_experiment(run_id: int, local: bool = False):
+    with EdgeConfig.context(silent=True) as config:
+        try:
+            store = get_experiment_store(config, local)
+            run = store.get_run(run_id)
+            run["metrics"] = store.get_last_metric_values([run_id])[run_id]
+            print(yaml.safe_dump(run, default_flow_style=False, sort_keys=False))
+        except EdgeException as exc:
+            questionary.print(str(exc), style="fg:ansired")
+            sys.exit(1)
+        sys.exit(0)
@@ -1,9 +1,22 @@
 import argparse
 
+from edge.command.experiments.compact import experiments_compact
+from edge.command.experiments.compare import compare_experiments
+from edge.command.experiments.export import experiments_export
 from edge.command.experiments.get_dashboard import get_dashboard
 from edge.command.experiments.get_mongodb import get_mongodb
 from edge.exception import EdgeException
 from edge.command.experiments.init import experiments_init
+from edge.command.experiments.list import list_experiments
+from edge.command.experiments.show import show_experiment
+from edge.compaction import MIN_MAX_POINTS
+
+
+def max_points(value: str) -> int:
+    points = int(value)
+    if points < MIN_MAX_POINTS:
+        raise argparse.ArgumentTypeError(f"must be at least {MIN_MAX_POINTS}")
+    return points
 
 
 def add_experiments_parser(subparsers):
@@ -13,6 +26,43 @@ def add_experiments_parser(subparsers):
     actions.add_parser("get-dashboard", help="Get experiment tracker dashboard URL")
     actions.add_parser("get-mongodb", help="Get MongoDB connection string")
 
+    list_parser = actions.add_parser("list", help="List tracked experiment runs")
+    list_parser.add_argument("-n", "--name", help="Only list runs of this experiment")
+    list_parser.add_argument("-s", "--status", help="Only list runs with this status, e.g. COMPLETED or FAILED")
+    list_parser.add_argument("--config", action="append", metavar="KEY=VALUE",
+                             help="Only list runs with this config value (can be repeated)")
+    list_parser.add_argument("--sort-by", choices=["start_time", "result"], default="start_time",
+                             help="Field to sort runs by (default: start_time)")
+    list_parser.add_argument("--ascending", action="store_true", help="Sort in ascending order")
+    list_parser.add_argument("--limit", type=int, default=20, help="Maximum number of runs to list (default: 20)")
+    list_parser.add_argument("--local", action="store_true",
+                             help="List runs tracked locally, e.g. when the experiment tracker could not be reached")
+
+    show_parser = actions.add_parser("show", help="Show details of an experiment run")
+    show_parser.add_argument("run_id", metavar="run-id", type=int, help="Run ID")
+    show_parser.add_argument("--local", action="store_true", help="Show a run tracked locally")
+
+    compare_parser = actions.add_parser("compare", help="Compare experiment runs")
+    compare_parser.add_argument("run_ids", metavar="run-id", type=int, nargs="+", help="Run IDs")
+    compare_parser.add_argument("--local", action="store_true", help="Compare runs tracked locally")
+
+    compact_parser = actions.add_parser("compact", help="Downsample metrics of old experiment runs")
+    compact_parser.add_argument("--older-than", type=int, default=30, metavar="DAYS",
+                                help="Only compact runs started more than this many days ago (default: 30)")
+    compact_parser.add_argument("--max-points", type=max_points, default=1000,
+                                help=f"Maximum number of points to keep per metric series, at least {MIN_MAX_POINTS} "
+                                     "(default: 1000)")
+    compact_parser.add_argument("--archive", action="store_true",
+                                help="Archive raw metric series to the storage bucket before compacting")
+    compact_parser.add_argument("--dry-run", action="store_true",
+                                help="Report the space that would be saved without changing anything")
+
+    export_parser = actions.add_parser("export", help="Export experiment runs and metrics as NumPy shards")
+    export_parser.add_argument("-o", "--output", required=True, help="Directory to export shards into")
+    export_parser.add_argument("-n", "--name", help="Only export runs of this experiment")
+    export_parser.add_argument("--shard-size", type=int, default=1000,
+                               help="Number of runs per shard (default: 1000)")
+
 
 def run_experiments_actions(args: argparse.Namespace):
     if args.action == "init":
@@ -21,5 +71,16 @@ def run_experiments_actions(args: argparse.Namespace):
         get_dashboard()
     elif args.action == "get-mongodb":
         get_mongodb()
+    elif args.action == "list":
+        list_experiments(args.name, args.status, args.config, args.sort_by, args.ascending, args.limit,
+                         args.local)
+    elif args.action == "show":
+        show_experiment(args.run_id, args.local)
+    elif args.action == "compare":
+        compare_experiments(args.run_ids, args.local)
+    elif args.action == "compact":
+        experiments_compact(args.older_than, args.max_points, args.archive, args.dry_run)
+    elif args.action == "export":
+        experiments_export(args.output, args.shard_size, args.name)
     else:
         raise EdgeException("Unexpected experiments command")
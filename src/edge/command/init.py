@@ -5,13 +5,86 @@ from edge.exception import EdgeException
 from edge.gcloud import is_authenticated, get_gcloud_account, get_gcloud_project, get_gcloud_region, get_gcp_regions, \
     project_exists, is_billing_enabled
 from edge.state import EdgeState
-from edge.storage import setup_storage
+from edge.steps import Step, StepGraph
+from edge.storage import setup_storage, setup_lifecycle_rules, default_lifecycle_rules, managed_lifecycle_prefixes
 from edge.tui import TUI, StepTUI, SubStepTUI, TUIStatus, qmark
 from edge.versions import get_gcloud_version, Version, get_kubectl_version, get_helm_version
 from edge.path import get_model_dvc_pipeline
 import questionary
 
 
+def check_gcloud_version():
+    with SubStepTUI("Checking gcloud version") as sub_step:
+        gcloud_version = get_gcloud_version()
+        expected_gcloud_version_string = "2021.05.21"
+        expected_gcloud_version = Version.from_string(expected_gcloud_version_string)
+        if not gcloud_version.is_at_least(expected_gcloud_version):
+            raise EdgeException(
+                f"We found gcloud version {str(gcloud_version)}, "
+                f"but we require at least {str(expected_gcloud_version)}. "
+                "Update gcloud by running `gcloud components update`."
+            )
+
+        try:
+            gcloud_alpha_version = get_gcloud_version("alpha")
+            expected_gcloud_alpha_version_string = "2021.06.00"
+            expected_gcloud_alpha_version = Version.from_string(expected_gcloud_alpha_version_string)
+            if not gcloud_alpha_version.is_at_least(expected_gcloud_alpha_version):
+                raise EdgeException(
+                    f"We found gcloud alpha component version {str(gcloud_alpha_version)}, "
+                    f"but we require at least {str(expected_gcloud_alpha_version)}. "
+                    "Update gcloud by running `gcloud components update`."
+                )
+        except KeyError:
+            raise EdgeException(
+                f"We couldn't find the gcloud alpha components, "
+                f"please install these by running `gcloud components install alpha`"
+            )
+
+
+def check_kubectl_version():
+    with SubStepTUI("Checking kubectl version") as sub_step:
+        kubectl_version = get_kubectl_version()
+        expected_kubectl_version_string = "v1.19.0"
+        expected_kubectl_version = Version.from_string(expected_kubectl_version_string)
+        if not kubectl_version.is_at_least(expected_kubectl_version):
+            raise EdgeException(
+                f"We found gcloud version {str(kubectl_version)}, "
+                f"but we require at least {str(expected_kubectl_version)}. "
+                "Please visit https://kubernetes.io/docs/tasks/tools/ for installation instructions."
+            )
+
+
+def check_helm_version():
+    with SubStepTUI("Checking helm version") as sub_step:
+        helm_version = get_helm_version()
+        expected_helm_version_string = "v3.5.2"
+        expected_helm_version = Version.from_string(expected_helm_version_string)
+        if not helm_version.is_at_least(expected_helm_version):
+            raise EdgeException(
+                f"We found gcloud version {str(helm_version)}, "
+                f"but we require at least {str(expected_helm_version)}. "
+                "Please visit https://helm.sh/docs/intro/install/ for installation instructions."
+            )
+
+
+def check_region_available(gcloud_project: str, gcloud_region: str):
+    with SubStepTUI(f"{gcloud_region} is available on Vertex AI") as sub_step:
+        regions = get_gcp_regions(gcloud_project)
+        if gcloud_region not in regions:
+            formatted_regions = "\n      ".join(regions)
+            raise EdgeException(
+                "Vertex AI only works in certain regions. "
+                "Please choose one of the following by running `gcloud config set compute/region <region>`:\n"
+                f"      {formatted_regions}"
+            )
+
+
+def enable_storage_api(gcloud_project: str):
+    with SubStepTUI("Enabling Storage API") as sub_step:
+        enable_service_api("storage-component.googleapis.com", gcloud_project)
+
+
 def edge_init():
     success_title = "Initialised successfully"
     success_message = f"""
@@ -43,54 +116,11 @@ Happy herding! 🐏
             failure_message
     ) as tui:
         with StepTUI(message="Checking your local environment", emoji="🖥️") as step:
-            with SubStepTUI("Checking gcloud version") as sub_step:
-                gcloud_version = get_gcloud_version()
-                expected_gcloud_version_string = "2021.05.21"
-                expected_gcloud_version = Version.from_string(expected_gcloud_version_string)
-                if not gcloud_version.is_at_least(expected_gcloud_version):
-                    raise EdgeException(
-                        f"We found gcloud version {str(gcloud_version)}, "
-                        f"but we require at least {str(expected_gcloud_version)}. "
-                        "Update gcloud by running `gcloud components update`."
-                    )
-
-                try:
-                    gcloud_alpha_version = get_gcloud_version("alpha")
-                    expected_gcloud_alpha_version_string = "2021.06.00"
-                    expected_gcloud_alpha_version = Version.from_string(expected_gcloud_alpha_version_string)
-                    if not gcloud_alpha_version.is_at_least(expected_gcloud_alpha_version):
-                        raise EdgeException(
-                            f"We found gcloud alpha component version {str(gcloud_alpha_version)}, "
-                            f"but we require at least {str(expected_gcloud_alpha_version)}. "
-                            "Update gcloud by running `gcloud components update`."
-                        )
-                except KeyError:
-                    raise EdgeException(
-                        f"We couldn't find the gcloud alpha components, "
-                        f"please install these by running `gcloud components install alpha`"
-                    )
-
-            with SubStepTUI("Checking kubectl version") as sub_step:
-                kubectl_version = get_kubectl_version()
-                expected_kubectl_version_string = "v1.19.0"
-                expected_kubectl_version = Version.from_string(expected_kubectl_version_string)
-                if not kubectl_version.is_at_least(expected_kubectl_version):
-                    raise EdgeException(
-                        f"We found gcloud version {str(kubectl_version)}, "
-                        f"but we require at least {str(expected_kubectl_version)}. "
-                        "Please visit https://kubernetes.io/docs/tasks/tools/ for installation instructions."
-                    )
-
-            with SubStepTUI("Checking helm version") as sub_step:
-                helm_version = get_helm_version()
-                expected_helm_version_string = "v3.5.2"
-                expected_helm_version = Version.from_string(expected_helm_version_string)
-                if not helm_version.is_at_least(expected_helm_version):
-                    raise EdgeException(
-                        f"We found gcloud version {str(helm_version)}, "
-                        f"but we require at least {str(expected_helm_version)}. "
-                        "Please visit https://helm.sh/docs/intro/install/ for installation instructions."
-                    )
+            StepGraph([
+                Step("gcloud", check_gcloud_version),
+                Step("kubectl", check_kubectl_version),
+                Step("helm", check_helm_version),
+            ]).run()
 
         with StepTUI(message="Checking your GCP environment", emoji="☁️") as step:
             with SubStepTUI(message="Verifying GCloud configuration") as sub_step:
@@ -129,29 +159,29 @@ Happy herding! 🐏
                 if not questionary.confirm(f"Is this the correct region: {gcloud_region}", qmark=qmark).ask():
                     raise EdgeException("Run `gcloud config set compute/region <region>` to set the correct region")
 
-            check_gcloud_authenticated(gcloud_project)
-
-            with SubStepTUI(f"{gcloud_region} is available on Vertex AI") as sub_step:
-                if gcloud_region not in get_gcp_regions(gcloud_project):
-                    formatted_regions = "\n      ".join(get_gcp_regions(gcloud_project))
-                    raise EdgeException(
-                        "Vertex AI only works in certain regions. "
-                        "Please choose one of the following by running `gcloud config set compute/region <region>`:\n"
-                        f"      {formatted_regions}"
-                    )
+            StepGraph([
+                Step("Authentication", lambda: check_gcloud_authenticated(gcloud_project), outputs=["authenticated"]),
+                Step(
+                    "Vertex AI region",
+                    lambda authenticated: check_region_available(gcloud_project, gcloud_region),
+                    inputs=["authenticated"],
+                ),
+                Step(
+                    "Project",
+                    lambda authenticated: check_project_exists(gcloud_project),
+                    inputs=["authenticated"],
+                    outputs=["project"],
+                ),
+                Step("Billing", lambda project: check_billing_enabled(gcloud_project), inputs=["project"]),
+                Step("Storage API", lambda project: enable_storage_api(gcloud_project), inputs=["project"]),
+            ]).run()
 
             gcloud_config = GCProjectConfig(
                 project_id=gcloud_project,
                 region=gcloud_region,
             )
 
-            check_project_exists(gcloud_project)
-            check_billing_enabled(gcloud_project)
-
         with StepTUI(message="Initialising Google Storage and vertex:edge state file", emoji="💾") as step:
-            with SubStepTUI("Enabling Storage API") as sub_step:
-                enable_service_api("storage-component.googleapis.com", gcloud_project)
-
             with SubStepTUI("Configuring Google Storage bucket", status=TUIStatus.NEUTRAL) as sub_step:
                 sub_step.set_dirty()
                 storage_bucket_name = questionary.text(
@@ -172,6 +202,9 @@ Happy herding! 🐏
                 vertex_jobs_directory="vertex",
             )
             storage_state = setup_storage(gcloud_project, gcloud_region, storage_bucket_name)
+            storage_config.lifecycle_rules = default_lifecycle_rules(storage_config)
+            setup_lifecycle_rules(gcloud_project, storage_bucket_name, storage_config.lifecycle_rules,
+                                  managed_lifecycle_prefixes(storage_config))
 
             _state = EdgeState(
                 storage=storage_state
@@ -0,0 +1,132 @@
+import datetime
+import os
+import sys
+from typing import List, Optional
+
+import questionary
+from serde.json import from_json, to_json
+
+from edge.benchmark import (
+    BenchmarkReport, LevelResult, read_payloads, run_concurrency_level, run_qps_level, get_benchmarks_path
+)
+from edge.config import EdgeConfig
+from edge.exception import EdgeException
+from edge.path import get_vertex_model_json
+from edge.predict import PredictionClient
+from edge.serve import FakePredictor, LocalPredictionServer
+from edge.state import EdgeState
+from edge.train import TrainedModel
+from edge.vertex_deploy import describe_serving
+
+
+def format_ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def print_level(result: LevelResult):
+    print(f"{result.mode:>11} {result.level:>7g} | {result.request_count:>8} {result.throughput:>9.1f} | "
+          f"{format_ms(result.p50_ms):>8} {format_ms(result.p95_ms):>8} {format_ms(result.p99_ms):>8} | "
+          f"{result.error_rate:>7.2%}")
+
+
+def model_benchmark(
+    model_name: str,
+    payload_path: str,
+    concurrency: Optional[List[int]] = None,
+    qps: Optional[List[float]] = None,
+    duration_seconds: float = 30,
+    warmup_seconds: float = 5,
+    instances_per_request: int = 1,
+    url: Optional[str] = None,
+    fake_endpoint: bool = False,
+    fake_latency_ms: float = 20,
+    fake_error_rate: float = 0,
+):
+    with EdgeConfig.context(silent=True) as config:
+        if config.models is None or model_name not in config.models:
+            questionary.print("Model is not initialised. Initialise it by running `./edge.sh model init`.",
+                              style="fg:ansired")
+            sys.exit(1)
+        payloads = read_payloads(payload_path, instances_per_request)
+        if len(payloads) == 0:
+            questionary.print(f"'{payload_path}' has no instances", style="fg:ansired")
+            sys.exit(1)
+        if not concurrency and not qps:
+            concurrency = [1, 4, 16]
+        max_concurrency = max((concurrency or []) + [64 if qps else 1])
+
+        serving = None
+        fake_server = None
+        if fake_endpoint:
+            try:
+                # Every request is answered on its own, like by a replica of a deployed model
+                fake_server = LocalPredictionServer(FakePredictor(fake_latency_ms, error_rate=fake_error_rate),
+                                                    max_batch_size=1, workers=max_concurrency)
+            except EdgeException as exc:
+                questionary.print(str(exc), style="fg:ansired")
+                sys.exit(1)
+            fake_server.start()
+            url = fake_server.predict_url
+            serving = f"fake endpoint, {fake_latency_ms:g}ms latency, {fake_error_rate:.0%} errors"
+
+        # Retries would hide errors and inflate latencies, so every request is sent exactly once
+        client_options = dict(max_concurrency=max_concurrency, max_retries=0)
+        if url is not None:
+            client = PredictionClient(url, **client_options)
+            target = url
+        else:
+            with EdgeState.context(config, silent=True) as state:
+                model_state = state.models[model_name]
+                target = model_state.endpoint_resource_name
+                if model_state.deployed_serving is not None:
+                    serving = describe_serving(model_state.deployed_serving)
+                client = PredictionClient.for_endpoint(target, **client_options)
+
+        model_resource_name = None
+        if os.path.exists(get_vertex_model_json(model_name)):
+            with open(get_vertex_model_json(model_name)) as file:
+                model_resource_name = from_json(TrainedModel, file.read()).model_name
+
+        started_at = datetime.datetime.now(datetime.timezone.utc)
+        levels = [("concurrency", level) for level in concurrency or []] + [("qps", level) for level in qps or []]
+        results = []
+        try:
+            with client:
+                if warmup_seconds > 0:
+                    print(f"Warming up {target} for {warmup_seconds:g}s", file=sys.stderr)
+                    run_concurrency_level(client.predict_batch, payloads, max_concurrency, warmup_seconds)
+                print(f"{'mode':>11} {'level':>7} | {'requests':>8} {'req/s':>9} | "
+                      f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} | {'errors':>7}")
+                for mode, level in levels:
+                    if mode == "concurrency":
+                        result = run_concurrency_level(client.predict_batch, payloads, int(level), duration_seconds)
+                    else:
+                        result = run_qps_level(client.predict_batch, payloads, level, duration_seconds,
+                                               max_concurrency)
+                    results.append(result)
+                    print_level(result)
+                    for error in result.errors:
+                        questionary.print(f"  {error}", style="fg:ansired")
+        except EdgeException as exc:
+            questionary.print(str(exc), style="fg:ansired")
+            sys.exit(1)
+        finally:
+            if fake_server is not None:
+                fake_server.stop()
+
+        report = BenchmarkReport(
+            model_name=model_name,
+            target=target,
+            started_at=started_at.isoformat(),
+            instances_per_request=instances_per_request,
+            levels=results,
+            model_resource_name=model_resource_name,
+            serving=serving,
+        )
+        os.makedirs(get_benchmarks_path(model_name), exist_ok=True)
+        report_path = os.path.join(get_benchmarks_path(model_name),
+                                   f"benchmark-{started_at.strftime('%Y%m%dT%H%M%SZ')}.json")
+        with open(report_path, "w") as f:
+            f.write(to_json(report))
+        print(f"Results are written to {report_path}", file=sys.stderr)
+        sys.exit(0)
@@ -1,17 +1,77 @@
 import os
+import threading
+from typing import List, Callable, Optional
 
 from serde.json import from_json
+from edge.canary import load_metrics_source
 from edge.command.common.precommand_check import precommand_checks
 from edge.config import EdgeConfig
 from edge.exception import EdgeException
 from edge.state import EdgeState
 from edge.train import TrainedModel
-from edge.tui import TUI, StepTUI, SubStepTUI
-from edge.vertex_deploy import vertex_deploy
+from edge.tui import TUI, StepTUI, SubStepTUI, ParallelTUI, report_failures
+from edge.vertex_deploy import vertex_deploy, start_deploy, finish_deploy
 from edge.path import get_model_dvc_pipeline, get_vertex_model_json
 
 
-def model_deploy(model_name: str):
+def check_model_deployable(config: EdgeConfig, state: EdgeState, model_name: str) -> (str, str):
+    """
+    Check that [model_name] is initialised and has been trained on Vertex AI
+
+    :return: endpoint resource name and model resource name
+    """
+    with SubStepTUI("Checking that the model is initialised"):
+        if model_name not in config.models:
+            raise EdgeException("Model has not been initialised. "
+                                f"Run `./edge.sh model init {model_name}` to initialise.")
+        if state.models is None or state.models.get(model_name) is None:
+            raise EdgeException("Model is missing from vertex:edge state. "
+                                "This might mean that the model has not been initialised. "
+                                f"Run `./edge.sh model init {model_name}` to initialise.")
+        endpoint_resource_name = state.models[model_name].endpoint_resource_name
+        pending = state.models[model_name].pending_deployment
+        if pending is not None:
+            raise EdgeException(f"A deployment of '{pending.model_resource_name}' started at {pending.started_at} "
+                                f"is in progress. Run `./edge.sh model wait {model_name}` to complete it first.")
+    with SubStepTUI("Checking that the model has been trained"):
+        if not os.path.exists(get_vertex_model_json(model_name)):
+            raise EdgeException(f"{get_vertex_model_json(model_name)} does not exist. "
+                                "This means that the model has not been trained")
+        with open(get_vertex_model_json(model_name)) as file:
+            model = from_json(TrainedModel, file.read())
+        if model.is_local:
+            raise EdgeException("This model was trained locally, and hence cannot be deployed "
+                                "on Vertex AI. Serve it locally with "
+                                f"`./edge.sh model serve {model_name}` instead")
+    return endpoint_resource_name, model.model_name
+
+
+def deploy(
+    config: EdgeConfig,
+    state: EdgeState,
+    model_name: str,
+    model_resource_name: str,
+    blue_green: bool,
+    canary: bool,
+    checkpoint: Optional[Callable[[], None]] = None,
+):
+    canary_config = config.models[model_name].canary if canary else None
+    vertex_deploy(
+        state.models[model_name].endpoint_resource_name,
+        model_resource_name,
+        model_name,
+        state.models[model_name],
+        config.models[model_name].serving,
+        blue_green=blue_green,
+        canary=canary_config,
+        metrics_source=load_metrics_source(canary_config.metrics_source) if canary else None,
+        checkpoint=checkpoint,
+        shared=len(state.models_sharing_endpoint(model_name)) > 0,
+    )
+    state.models[model_name].deployed_model_resource_name = model_resource_name
+
+
+def model_deploy(model_name: str, blue_green: bool = False, canary: bool = False, wait: bool = True):
     intro = f"Deploying model '{model_name}' on Vertex AI"
     success_title = "Model deployed successfully"
     success_message = "Success"
@@ -28,29 +88,30 @@ def model_deploy(model_name: str):
             precommand_checks(config)
             with EdgeState.context(config, to_lock=True, to_save=True) as state:
                 with StepTUI("Checking model configuration", emoji="🐏"):
-                    with SubStepTUI("Checking that the model is initialised"):
-                        if model_name not in config.models:
-                            raise EdgeException("Model has not been initialised. "
-                                                f"Run `./edge.sh model init {model_name}` to initialise.")
-                        if state.models is None or state.models[model_name] is None:
-                            raise EdgeException("Model is missing from vertex:edge state. "
-                                                "This might mean that the model has not been initialised. "
-                                                f"Run `./edge.sh model init {model_name}` to initialise.")
-                        endpoint_resource_name = state.models[model_name].endpoint_resource_name
-                    with SubStepTUI("Checking that the model has been trained"):
-                        if not os.path.exists(get_vertex_model_json(model_name)):
-                           raise EdgeException(f"{get_vertex_model_json(model_name)} does not exist. "
-                                               "This means that the model has not been trained")
-                        with open(get_vertex_model_json(model_name)) as file:
-                           model = from_json(TrainedModel, file.read())
-                        if model.is_local:
-                           raise EdgeException("This model was trained locally, and hence cannot be deployed "
-                                               "on Vertex AI")
-                        model_resource_name = model.model_name
-
-                vertex_deploy(endpoint_resource_name, model_resource_name, model_name)
-
-                state.models[model_name].deployed_model_resource_name = model_resource_name
+                    endpoint_resource_name, model_resource_name = check_model_deployable(config, state, model_name)
+
+                if not wait:
+                    if canary:
+                        raise EdgeException("Canary rollouts cannot be started without waiting")
+                    with StepTUI(f"Starting deployment of model '{model_name}'", emoji="🐏"):
+                        start_deploy(
+                            endpoint_resource_name,
+                            model_resource_name,
+                            state.models[model_name],
+                            config.models[model_name].serving,
+                            shared=len(state.models_sharing_endpoint(model_name)) > 0,
+                        )
+                    tui.success_title = "Model deployment started"
+                    tui.success_message = (
+                        "The model is deployed alongside the current deployment, which keeps serving meanwhile. "
+                        f"Check progress with `./edge.sh model status {model_name}`, and complete the deployment "
+                        f"with `./edge.sh model wait {model_name}`.\n\n"
+                        "Happy herding! 🐏"
+                    )
+                    return
+
+                deploy(config, state, model_name, model_resource_name, blue_green, canary,
+                       checkpoint=lambda: state.save(config))
 
                 short_endpoint_resource_name = "/".join(endpoint_resource_name.split("/")[2:])
                 tui.success_message = (
@@ -60,3 +121,88 @@ def model_deploy(model_name: str):
                     "Happy herding! 🐏"
                 )
 
+
+def model_deploy_many(
+    model_names: List[str],
+    blue_green: bool = False,
+    canary: bool = False,
+    max_workers: int = 4,
+    wait: bool = True,
+):
+    """
+    Deploy several models concurrently, with a single precommand check and state transaction
+
+    :param model_names: names of the models, or an empty list for all initialised models
+    :param blue_green:
+    :param canary:
+    :param max_workers: maximum number of models deployed at the same time
+    :param wait: whether to wait for the deployments, or only start them
+    :return:
+    """
+    intro = "Deploying models on Vertex AI"
+    success_title = "Models deployed successfully"
+    success_message = "Success"
+    failure_title = "Some models failed to deploy"
+    failure_message = "See the errors above. Models that are not listed were deployed successfully."
+    with EdgeConfig.context() as config:
+        with TUI(
+                intro,
+                success_title,
+                success_message,
+                failure_title,
+                failure_message
+        ) as tui:
+            precommand_checks(config)
+            model_names = model_names or sorted(config.models or {})
+            if len(model_names) == 0:
+                raise EdgeException("No models are initialised. Run `./edge.sh model init` to initialise one.")
+            if canary and not wait:
+                raise EdgeException("Canary rollouts cannot be started without waiting")
+            with EdgeState.context(config, to_lock=True, to_save=True) as state:
+                save_lock = threading.Lock()
+
+                def checkpoint():
+                    with save_lock:
+                        state.save(config)
+
+                def deploy_one(model_name: str):
+                    endpoint_resource_name, model_resource_name = check_model_deployable(config, state, model_name)
+                    if wait:
+                        deploy(config, state, model_name, model_resource_name, blue_green, canary, checkpoint)
+                    else:
+                        start_deploy(
+                            endpoint_resource_name,
+                            model_resource_name,
+                            state.models[model_name],
+                            config.models[model_name].serving,
+                            shared=len(state.models_sharing_endpoint(model_name)) > 0,
+                        )
+
+                with StepTUI(f"Deploying {len(model_names)} models", emoji="🐏"):
+                    errors = ParallelTUI(model_names, max_workers).run(deploy_one)
+                report_failures(errors, len(model_names), "deploy")
+                if wait:
+                    tui.success_message = f"Deployed {', '.join(model_names)}\n\nHappy herding! 🐏"
+                else:
+                    tui.success_title = "Model deployments started"
+                    tui.success_message = (f"Complete the deployments with `./edge.sh model wait <model-name>`."
+                                           "\n\nHappy herding! 🐏")
+
+
+def complete_pending_deployment(config: EdgeConfig, model_name: str, operation: dict):
+    """
+    Record the outcome of a deployment started with `--no-wait`, once its operation is done
+
+    :param config:
+    :param model_name:
+    :param operation: the finished operation
+    :return:
+    """
+    with EdgeState.context(config, to_lock=True, to_save=True) as state:
+        model_state = state.models[model_name]
+        pending = model_state.pending_deployment
+        if pending is None or pending.operation_name != operation["name"]:
+            # Another command has completed the deployment in the meantime
+            return
+        with StepTUI(f"Completing deployment of model '{model_name}'", emoji="🐏"):
+            finish_deploy(model_name, model_state, operation)
@@ -2,8 +2,10 @@ import sys
 from dataclasses import dataclass
 from serde import serialize
 from serde.yaml import to_yaml
+from typing import Optional
 from edge.config import EdgeConfig, ModelConfig
 from edge.state import ModelState, EdgeState
+from edge.vertex_deploy import describe_serving
 
 
 @serialize
@@ -11,6 +13,8 @@ from edge.state import ModelState, EdgeState
 class Description:
     config: ModelConfig
     state: ModelState
+    # Effective serving footprint of the deployed model
+    serving: Optional[str] = None
 
 
 def describe_model(model_name):
@@ -21,9 +25,12 @@ def describe_model(model_name):
             sys.exit(1)
         else:
             with EdgeState.context(config, silent=True) as state:
+                model_state = state.models[model_name]
                 description = Description(
                     config.models[model_name],
-                    state.models[model_name]
+                    model_state,
+                    describe_serving(model_state.deployed_serving) if model_state.deployed_serving is not None
+                    else "not deployed"
                 )
                 print(to_yaml(description))
                 sys.exit(0)
@@ -0,0 +1,108 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List
+
+from google.cloud import storage
+
+from edge.command.common.precommand_check import precommand_checks
+from edge.config import EdgeConfig
+from edge.exception import EdgeException
+from edge.registry import list_vertex_model_versions, select_expired, delete_model_version
+from edge.state import EdgeState
+from edge.tui import TUI, StepTUI, SubStepTUI, TUIStatus, format_size
+
+
+def model_gc(model_names: List[str], dry_run: bool = False, max_workers: int = 8):
+    """
+    Delete model versions that are outside of their retention policy from Vertex AI and Google Storage
+
+    :param model_names: names of the models, or an empty list for all initialised models
+    :param dry_run: only show what would be deleted
+    :param max_workers: maximum number of versions deleted at the same time
+    :return:
+    """
+    intro = "Garbage collecting model versions" + (" (dry run)" if dry_run else "")
+    success_title = "Model versions garbage collected successfully"
+    success_message = "Success"
+    failure_title = "Garbage collection failed"
+    failure_message = "See the errors above. See README for more details."
+    with EdgeConfig.context() as config:
+        with TUI(
+                intro,
+                success_title,
+                success_message,
+                failure_title,
+                failure_message
+        ) as tui:
+            precommand_checks(config)
+            model_names = model_names or sorted(config.models or {})
+            with EdgeState.context(config, to_lock=True, to_save=not dry_run) as state:
+                expired = []
+                with StepTUI("Applying retention policies", emoji="🗑️"):
+                    for model_name in model_names:
+                        with SubStepTUI(f"Listing versions of '{model_name}'") as sub_step:
+                            if model_name not in config.models or state.models.get(model_name) is None:
+                                raise EdgeException(f"Model '{model_name}' has not been initialised")
+                            keep_last = config.models[model_name].retention.keep_last
+                            versions = list_vertex_model_versions(config, model_name)
+                            model_expired = select_expired(
+                                versions, keep_last, state.models[model_name].versions_in_use()
+                            )
+                            sub_step.update(f"'{model_name}' has {len(versions)} versions, {len(model_expired)} "
+                                            f"beyond the last {keep_last} and not in use")
+                            expired += [(model_name, version) for version in model_expired]
+
+                if len(expired) == 0:
+                    tui.success_message = "Nothing to delete"
+                    return
+
+                # Google Storage batches are tracked per client, so every thread needs its own client
+                clients = threading.local()
+
+                def delete(version):
+                    if not hasattr(clients, "client"):
+                        clients.client = storage.Client(config.google_cloud_project.project_id)
+                    return delete_model_version(clients.client, version, dry_run=dry_run)
+
+                deleted = []
+                total_blobs, total_size = 0, 0
+                verb = "Would delete" if dry_run else "Deleting"
+                with StepTUI(f"{verb} {len(expired)} model versions", emoji="🗑️"):
+                    with SubStepTUI(f"{verb} model versions and their artifacts") as sub_step:
+                        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                            futures = {
+                                executor.submit(delete, version): (model_name, version)
+                                for model_name, version in expired
+                            }
+                            errors = []
+                            for future in as_completed(futures):
+                                model_name, version = futures[future]
+                                try:
+                                    blobs, size = future.result()
+                                except Exception as exc:
+                                    errors.append(f"{version.resource_name}: {exc}")
+                                    continue
+                                deleted.append((model_name, version))
+                                total_blobs += blobs
+                                total_size += size
+                                sub_step.update(f"{verb} model versions: {len(deleted)}/{len(expired)}, "
+                                                f"{total_blobs} artifacts ({format_size(total_size)})")
+                        if dry_run:
+                            sub_step.update(status=TUIStatus.NEUTRAL)
+                            for model_name, version in deleted:
+                                sub_step.add_explanation(f"{model_name}: {version.resource_name} "
+                                                         f"({version.create_time:%Y-%m-%d %H:%M})")
+                        else:
+                            deleted_names = {version.resource_name for _, version in deleted}
+                            for model_name in model_names:
+                                state.models[model_name].versions = [
+                                    version for version in state.models[model_name].versions
+                                    if version.resource_name not in deleted_names
+                                ]
+                        if errors:
+                            raise EdgeException("Some model versions could not be deleted:\n" + "\n".join(errors))
+
+                tui.success_message = (
+                    f"{'Would reclaim' if dry_run else 'Reclaimed'} {format_size(total_size)} from {len(deleted)} "
+                    f"model versions"
+                )
@@ -1,17 +1,19 @@
 import os
-import time
+import threading
+from typing import List, Optional
 from edge.command.common.precommand_check import precommand_checks
 from edge.config import EdgeConfig, ModelConfig
 from edge.enable_api import enable_service_api
 from edge.endpoint import setup_endpoint
 from edge.exception import EdgeException
-from edge.state import EdgeState
-from edge.tui import TUI, StepTUI, SubStepTUI, TUIStatus, qmark
+from edge.state import EdgeState, ModelState
+from edge.steps import Step, StepGraph
+from edge.tui import TUI, StepTUI, SubStepTUI, TUIStatus, qmark, ParallelTUI, report_failures
 from edge.path import get_model_dvc_pipeline
 import questionary
 
 
-def model_init(model_name: str):
+def model_init(model_name: str, endpoint_name: Optional[str] = None):
     intro = f"Initialising model '{model_name}' on Vertex AI"
     success_title = "Model initialised successfully"
     success_message = f"""
@@ -35,10 +37,6 @@ Happy herding! 🐏
         with EdgeConfig.context(to_save=True) as config:
             precommand_checks(config)
             with EdgeState.context(config, to_lock=True, to_save=True) as state:
-                with StepTUI("Enabling required Google Cloud APIs", emoji="☁️"):
-                    with SubStepTUI("Enabling Vertex AI API for model training and deployment"):
-                        enable_service_api("aiplatform.googleapis.com", config.google_cloud_project.project_id)
-
                 with StepTUI(f"Configuring model '{model_name}'", emoji="⚙️"):
                     with SubStepTUI(f"Checking if model '{model_name}' is configured") as sub_step:
                         if model_name in config.models:
@@ -57,42 +55,165 @@ Happy herding! 🐏
                     with SubStepTUI(f"Creating model '{model_name}' configuration"):
                         model_config = ModelConfig(
                             name=model_name,
-                            endpoint_name=f"{model_name}-endpoint"
+                            endpoint_name=endpoint_name or f"{model_name}-endpoint"
                         )
                         config.models[model_name] = model_config
 
                 endpoint_name = config.models[model_name].endpoint_name
 
-                model_state = setup_endpoint(
-                    config.google_cloud_project.project_id,
-                    config.google_cloud_project.region,
-                    endpoint_name
-                )
-
-                directory_exists = False
-                pipeline_exists = False
-                with StepTUI("Checking project directory structure", emoji="📁"):
-                    with SubStepTUI(f"Checking that 'models/{model_name}' directory exists") as sub_step:
-                        if not (os.path.exists(f"models/{model_name}") and os.path.isdir(f"models/{model_name}")):
-                            sub_step.update(
-                                message="'models/{model_name}' directory does not exist",
-                                status=TUIStatus.NEUTRAL
-                            )
-                        else:
-                            directory_exists = True
-                    if directory_exists:
-                        with SubStepTUI(f"Checking that 'models/{model_name}/dvc.yaml' pipeline exists") as sub_step:
-                            if not os.path.exists(f"models/{model_name}/dvc.yaml"):
-                                sub_step.update(
-                                    message=f"'models/{model_name}/dvc.yaml' pipeline does not exist",
-                                    status=TUIStatus.NEUTRAL
-                                )
+                # The endpoint is created while the project directory is checked
+                with StepTUI(f"Setting up model '{model_name}'", emoji="🚀"):
+                    values = StepGraph([
+                        Step(
+                            "Vertex AI API",
+                            lambda: enable_vertex_api(config.google_cloud_project.project_id),
+                            outputs=["vertex_api"],
+                        ),
+                        Step(
+                            "Endpoint",
+                            lambda vertex_api: setup_endpoint(
+                                config.google_cloud_project.project_id,
+                                config.google_cloud_project.region,
+                                endpoint_name
+                            ),
+                            inputs=["vertex_api"],
+                            outputs=["model_state"],
+                        ),
+                        Step(
+                            "Project directory",
+                            lambda: check_model_directory(model_name),
+                            outputs=["directory_complete"],
+                        ),
+                    ]).run()
+
+                if state.models is None:
+                    state.models = {}
+                state.models[model_name] = merge_model_state(state.models.get(model_name), values["model_state"])
+
+                if not values["directory_complete"]:
+                    tui.success_message = f"Note that the 'models/{model_name}" + tui.success_message
+
+
+def merge_model_state(previous_state: Optional[ModelState], model_state: ModelState) -> ModelState:
+    """
+    Merge the state of a model that is initialised again into its previous state. What is deployed is kept track
+    of if the endpoint has not changed, and the registered versions are always kept.
+
+    :param previous_state: state before the model was initialised again, if any
+    :param model_state: state of the newly set up endpoint
+    :return:
+    """
+    if previous_state is None:
+        return model_state
+    if previous_state.endpoint_resource_name == model_state.endpoint_resource_name:
+        return previous_state
+    model_state.versions = previous_state.versions
+    return model_state
+
+
+def enable_vertex_api(project_id: str):
+    with SubStepTUI("Enabling Vertex AI API for model training and deployment"):
+        enable_service_api("aiplatform.googleapis.com", project_id)
+
+
+def check_model_directory(model_name: str) -> bool:
+    """
+    Check that the model has a directory with a DVC pipeline
+
+    :param model_name:
+    :return: whether both exist
+    """
+    with SubStepTUI(f"Checking that 'models/{model_name}' directory exists") as sub_step:
+        if not (os.path.exists(f"models/{model_name}") and os.path.isdir(f"models/{model_name}")):
+            sub_step.update(
+                message=f"'models/{model_name}' directory does not exist",
+                status=TUIStatus.NEUTRAL
+            )
+            return False
+    with SubStepTUI(f"Checking that 'models/{model_name}/dvc.yaml' pipeline exists") as sub_step:
+        if not os.path.exists(f"models/{model_name}/dvc.yaml"):
+            sub_step.update(
+                message=f"'models/{model_name}/dvc.yaml' pipeline does not exist",
+                status=TUIStatus.NEUTRAL
+            )
+            return False
+    return True
+
+
+def discover_models() -> List[str]:
+    """
+    Find model directories, i.e. directories in `models/` with a DVC pipeline or a training script
+    """
+    if not os.path.isdir("models"):
+        return []
+    return sorted(
+        name for name in os.listdir("models")
+        if os.path.exists(f"models/{name}/dvc.yaml") or os.path.exists(f"models/{name}/train.py")
+    )
+
+
+def model_init_many(model_names: List[str], max_workers: int = 4, endpoint_name: Optional[str] = None):
+    """
+    Initialise several models concurrently, with a single precommand check and state transaction.
+    Models that are already configured keep their configuration.
+
+    :param model_names: names of the models, or an empty list for every model directory in `models/`
+    :param max_workers: maximum number of models initialised at the same time
+    :param endpoint_name: endpoint shared by the models, instead of one endpoint per model
+    :return:
+    """
+    intro = "Initialising models on Vertex AI"
+    success_title = "Models initialised successfully"
+    success_message = "Success"
+    failure_title = "Some models failed to initialise"
+    failure_message = "See the errors above. Models that are not listed were initialised successfully."
+    with TUI(
+            intro,
+            success_title,
+            success_message,
+            failure_title,
+            failure_message
+    ) as tui:
+        with EdgeConfig.context(to_save=True) as config:
+            precommand_checks(config)
+            model_names = model_names or discover_models()
+            if len(model_names) == 0:
+                raise EdgeException("No models found in 'models/'. Create one with `./edge.sh model template`.")
+            with EdgeState.context(config, to_lock=True, to_save=True) as state:
+                with StepTUI("Enabling required Google Cloud APIs", emoji="☁️"):
+                    enable_vertex_api(config.google_cloud_project.project_id)
+
+                with StepTUI("Configuring models", emoji="⚙️"):
+                    for model_name in model_names:
+                        with SubStepTUI(f"Configuring model '{model_name}'") as sub_step:
+                            if model_name in config.models:
+                                sub_step.update(f"Model '{model_name}' is already configured",
+                                                status=TUIStatus.NEUTRAL)
+                                if endpoint_name is not None:
+                                    config.models[model_name].endpoint_name = endpoint_name
                             else:
-                                pipeline_exists = True
+                                config.models[model_name] = ModelConfig(
+                                    name=model_name,
+                                    endpoint_name=endpoint_name or f"{model_name}-endpoint"
+                                )
+                if state.models is None:
+                    state.models = {}
 
-                state.models = {
-                    model_name: model_state
+                # Models sharing an endpoint must not create it twice
+                endpoint_locks = {
+                    config.models[model_name].endpoint_name: threading.Lock() for model_name in model_names
                 }
 
-                if not directory_exists or not pipeline_exists:
-                    tui.success_message = f"Note that the 'models/{model_name}" + tui.success_message
+                def init_one(model_name: str):
+                    with endpoint_locks[config.models[model_name].endpoint_name]:
+                        model_state = setup_endpoint(
+                            config.google_cloud_project.project_id,
+                            config.google_cloud_project.region,
+                            config.models[model_name].endpoint_name
+                        )
+                    state.models[model_name] = merge_model_state(state.models.get(model_name), model_state)
+
+                with StepTUI(f"Configuring Vertex AI endpoints of {len(model_names)} models", emoji="☁️"):
+                    errors = ParallelTUI(model_names, max_workers).run(init_one)
+                report_failures(errors, len(model_names), "initialise")
+                tui.success_message = f"Initialised {', '.join(model_names)}\n\nHappy herding! 🐏"
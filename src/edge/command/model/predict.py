@@ -0,0 +1,57 @@
+import json
+import sys
+import time
+from typing import Optional
+
+import questionary
+
+from edge.config import EdgeConfig
+from edge.exception import EdgeException
+from edge.predict import PredictionClient
+from edge.state import EdgeState
+
+
+def read_instances(path: str):
+    with (sys.stdin if path == "-" else open(path)) as f:
+        for line in f:
+            if line.strip() != "":
+                yield json.loads(line)
+
+
+def model_predict(
+    model_name: str,
+    input_path: str,
+    output_path: Optional[str] = None,
+    url: Optional[str] = None,
+    batch_size: int = 32,
+    concurrency: int = 8,
+):
+    with EdgeConfig.context(silent=True) as config:
+        if config.models is None or model_name not in config.models:
+            questionary.print("Model is not initialised. Initialise it by running `./edge.sh model init`.",
+                              style="fg:ansired")
+            sys.exit(1)
+        if url is not None:
+            client = PredictionClient(url, max_batch_size=batch_size, max_concurrency=concurrency)
+        else:
+            with EdgeState.context(config, silent=True) as state:
+                client = PredictionClient.for_endpoint(
+                    state.models[model_name].endpoint_resource_name,
+                    max_batch_size=batch_size,
+                    max_concurrency=concurrency
+                )
+
+        started = time.monotonic()
+        count = 0
+        try:
+            with client, (sys.stdout if output_path is None else open(output_path, "w")) as output:
+                for prediction in client.predict_stream(read_instances(input_path)):
+                    output.write(json.dumps(prediction) + "\n")
+                    count += 1
+        except EdgeException as exc:
+            questionary.print(str(exc), style="fg:ansired")
+            sys.exit(1)
+        elapsed = time.monotonic() - started
+        print(f"{count} predictions in {elapsed:.1f}s ({count / elapsed if elapsed > 0 else 0:.1f} predictions/s)",
+              file=sys.stderr)
+        sys.exit(0)
@@ -0,0 +1,79 @@
+import os
+
+from google.cloud import storage
+from serde.json import from_json
+
+from edge.batch_predict import (
+    shard_input, submit_batch_prediction, wait_for_batch_prediction, staging_uri_for, get_instances_format
+)
+from edge.command.common.precommand_check import precommand_checks
+from edge.config import EdgeConfig
+from edge.exception import EdgeException
+from edge.path import get_vertex_model_json
+from edge.train import TrainedModel
+from edge.tui import TUI, StepTUI, SubStepTUI
+
+
+def model_predict_batch(model_name: str, input_uri: str, output_uri: str, shard_size: int = 100000):
+    intro = f"Running batch prediction with model '{model_name}' on Vertex AI"
+    success_title = "Batch prediction finished successfully"
+    success_message = "Success"
+    failure_title = "Batch prediction failed"
+    failure_message = "See the errors above. See README for more details."
+    with EdgeConfig.context() as config:
+        with TUI(
+                intro,
+                success_title,
+                success_message,
+                failure_title,
+                failure_message
+        ) as tui:
+            precommand_checks(config)
+            with StepTUI("Checking model configuration", emoji="🐏"):
+                with SubStepTUI("Checking that the model is initialised"):
+                    if model_name not in config.models:
+                        raise EdgeException("Model has not been initialised. "
+                                            f"Run `./edge.sh model init {model_name}` to initialise.")
+                    serving = config.models[model_name].serving
+                with SubStepTUI("Checking that the model has been trained"):
+                    if not os.path.exists(get_vertex_model_json(model_name)):
+                        raise EdgeException(f"{get_vertex_model_json(model_name)} does not exist. "
+                                            "This means that the model has not been trained")
+                    with open(get_vertex_model_json(model_name)) as file:
+                        model = from_json(TrainedModel, file.read())
+                    if model.is_local:
+                        raise EdgeException("This model was trained locally, and hence cannot be used for batch "
+                                            "prediction on Vertex AI")
+
+            with StepTUI("Preparing input", emoji="✂️"):
+                with SubStepTUI(f"Checking input '{input_uri}'"):
+                    get_instances_format(input_uri)
+                input_uris = [input_uri]
+                if "*" not in input_uri:
+                    with SubStepTUI(f"Sharding input into files of {shard_size} instances") as sub_step:
+                        staging_uri = staging_uri_for(
+                            config.storage_bucket.bucket_name,
+                            config.storage_bucket.vertex_jobs_directory
+                        )
+                        input_uris = shard_input(
+                            storage.Client(config.google_cloud_project.project_id),
+                            input_uri,
+                            staging_uri,
+                            shard_size
+                        )
+                        if len(input_uris) == 0:
+                            raise EdgeException(f"Input '{input_uri}' has no instances")
+                        sub_step.update(f"Input is split into {len(input_uris)} shards under {staging_uri}")
+
+            with StepTUI("Running batch prediction", emoji="🔮"):
+                with SubStepTUI(f"Submitting batch prediction job ({serving.machine_type}, "
+                                f"{serving.min_replica_count}-{serving.max_replica_count} replicas)"):
+                    job = submit_batch_prediction(model.model_name, model_name, input_uris, output_uri, serving)
+                with SubStepTUI("Waiting for batch prediction to finish") as sub_step:
+                    report = wait_for_batch_prediction(job, sub_step)
+                    sub_step.add_explanation(
+                        f"{report.successful_count} predictions in {report.elapsed_seconds:.0f}s "
+                        f"({report.throughput:.1f} predictions/s), {report.failed_count} failed"
+                    )
+
+            tui.success_message = f"Predictions are written to {output_uri}\n\nHappy herding! 🐏"
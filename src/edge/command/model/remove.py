@@ -1,11 +1,14 @@
+import threading
+from typing import List
+
 import questionary
 
 from edge.command.common.precommand_check import precommand_checks
 from edge.config import EdgeConfig
-from edge.endpoint import tear_down_endpoint
+from edge.endpoint import remove_model_from_endpoint
 from edge.exception import EdgeException
 from edge.state import EdgeState
-from edge.tui import TUI, StepTUI, SubStepTUI, TUIStatus, qmark
+from edge.tui import TUI, StepTUI, SubStepTUI, TUIStatus, qmark, ParallelTUI, report_failures
 
 
 def remove_model(model_name):
@@ -33,18 +36,111 @@ def remove_model(model_name):
                         if model_name not in state.models:
                             raise EdgeException(f"'{model_name}' is not in vertex:edge state, which suggests that "
                                                 f"it has not been initialised. Cannot be removed")
+                    shared_with = state.models_sharing_endpoint(model_name)
                     with SubStepTUI("Confirming action", status=TUIStatus.WARNING) as sub_step:
+                        if shared_with:
+                            endpoint_action = (f"keep the Vertex AI endpoint, which is shared with "
+                                               f"{', '.join(shared_with)}")
+                        else:
+                            endpoint_action = f"delete the Vertex AI endpoint associated with '{model_name}' model"
                         sub_step.add_explanation(f"This action will undeploy '{model_name}' model from Vertex AI, "
-                                                 f"delete the Vertex AI endpoint associated with '{model_name}' model, "
+                                                 f"{endpoint_action}, "
                                                  f"and remove '{model_name}' model from vertex:edge config and "
                                                  f"state.")
                         if not questionary.confirm("Do you want to continue?", qmark=qmark, default=False).ask():
                             raise EdgeException("Canceled by user")
 
                 with StepTUI(f"Removing '{model_name}' model"):
-                    with SubStepTUI(f"Deleting '{state.models[model_name].endpoint_resource_name}' endpoint"):
-                        tear_down_endpoint(state.models[model_name].endpoint_resource_name)
+                    if shared_with:
+                        message = f"Undeploying '{model_name}' from the shared endpoint"
+                    else:
+                        message = f"Deleting '{state.models[model_name].endpoint_resource_name}' endpoint"
+                    with SubStepTUI(message):
+                        remove_model_from_endpoint(state.models[model_name], shared_with)
                     with SubStepTUI(f"Removing '{model_name}' model from config and state"):
                         del config.models[model_name]
                         del state.models[model_name]
 
+
+def remove_models(model_names: List[str], max_workers: int = 4):
+    """
+    Remove several models concurrently, with a single precommand check and state transaction
+
+    :param model_names: names of the models, or an empty list for all initialised models
+    :param max_workers: maximum number of models removed at the same time
+    :return:
+    """
+    intro = "Removing models from vertex:edge"
+    success_title = "Models removed successfully"
+    success_message = "Success"
+    failure_title = "Some models could not be removed"
+    failure_message = "See the errors above. Models that are not listed were removed successfully."
+    with TUI(
+        intro,
+        success_title,
+        success_message,
+        failure_title,
+        failure_message
+    ) as tui:
+        with EdgeConfig.context(to_save=True) as config:
+            precommand_checks(config)
+            with EdgeState.context(config, to_save=True, to_lock=True) as state:
+                model_names = model_names or sorted(config.models or {})
+                with StepTUI("Checking models configuration and state", emoji="🐏"):
+                    for model_name in model_names:
+                        with SubStepTUI(f"Checking model '{model_name}'"):
+                            if model_name not in config.models:
+                                raise EdgeException(f"'{model_name}' model is not in `edge.yaml` configuration, "
+                                                    f"so it cannot be removed.")
+                            if state.models is None or model_name not in state.models:
+                                raise EdgeException(f"'{model_name}' is not in vertex:edge state, which suggests "
+                                                    f"that it has not been initialised. Cannot be removed")
+                    with SubStepTUI("Confirming action", status=TUIStatus.WARNING) as sub_step:
+                        sub_step.add_explanation(f"This action will undeploy {', '.join(model_names)} from Vertex AI, "
+                                                 f"delete their Vertex AI endpoints unless other models share them, "
+                                                 f"and remove them from vertex:edge config and state.")
+                        if not questionary.confirm("Do you want to continue?", qmark=qmark, default=False).ask():
+                            raise EdgeException("Canceled by user")
+
+                shared_with = {
+                    model_name: [name for name in state.models_sharing_endpoint(model_name) if name not in model_names]
+                    for model_name in model_names
+                }
+                # An endpoint left without models is deleted once, when removing the first of its models
+                deleted_by = {}
+                for model_name in model_names:
+                    if not shared_with[model_name]:
+                        deleted_by.setdefault(state.models[model_name].endpoint_resource_name, model_name)
+
+                # The other models of a deleted endpoint are only removed once it is deleted. Their deleting model
+                # comes first in [model_names], so it is always started before them
+                endpoint_done = {endpoint: threading.Event() for endpoint in deleted_by}
+                endpoint_errors = {}
+
+                def remove_one(model_name: str):
+                    model_state = state.models[model_name]
+                    endpoint = model_state.endpoint_resource_name
+                    if shared_with[model_name]:
+                        with SubStepTUI(f"Removing '{model_name}' from '{endpoint}'"):
+                            remove_model_from_endpoint(model_state, shared_with[model_name])
+                    elif deleted_by[endpoint] == model_name:
+                        try:
+                            with SubStepTUI(f"Removing '{model_name}' from '{endpoint}'"):
+                                remove_model_from_endpoint(model_state, shared_with[model_name])
+                        except Exception as exc:
+                            endpoint_errors[endpoint] = exc
+                            raise
+                        finally:
+                            endpoint_done[endpoint].set()
+                    else:
+                        with SubStepTUI(f"Waiting for '{deleted_by[endpoint]}' to delete '{endpoint}'"):
+                            endpoint_done[endpoint].wait()
+                            if endpoint in endpoint_errors:
+                                raise EdgeException(f"'{endpoint}' endpoint could not be deleted while removing "
+                                                    f"'{deleted_by[endpoint]}', so '{model_name}' is kept")
+                    del config.models[model_name]
+                    del state.models[model_name]
+
+                with StepTUI(f"Removing {len(model_names)} models"):
+                    errors = ParallelTUI(model_names, max_workers).run(remove_one)
+                report_failures(errors, len(model_names), "be removed")
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import questionary
+from serde.json import from_json
+
+from edge.exception import EdgeException
+from edge.path import get_vertex_model_json
+from edge.serve import LocalPredictionServer, load_predictor
+from edge.train import TrainedModel
+
+
+def model_serve(
+    model_name: str,
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    batch_size: int = 32,
+    max_latency_ms: float = 5,
+    workers: int = 4,
+):
+    model_json = get_vertex_model_json(model_name)
+    if not os.path.exists(model_json):
+        questionary.print(f"{model_json} does not exist. This means that the model has not been trained. "
+                          f"Train it locally by running `python models/{model_name}/train.py`.", style="fg:ansired")
+        sys.exit(1)
+    with open(model_json) as file:
+        model = from_json(TrainedModel, file.read())
+    if not model.is_local or model.local_path is None:
+        questionary.print("Only locally trained models can be served locally. Deploy models trained on Vertex AI "
+                          f"with `./edge.sh model deploy {model_name}`.", style="fg:ansired")
+        sys.exit(1)
+
+    try:
+        server = LocalPredictionServer(
+            load_predictor(model.local_path),
+            host=host,
+            port=port,
+            max_batch_size=batch_size,
+            max_latency_ms=max_latency_ms,
+            workers=workers,
+            verbose=True,
+        )
+    except (EdgeException, OSError) as exc:
+        questionary.print(str(exc), style="fg:ansired")
+        sys.exit(1)
+
+    questionary.print(f"Serving '{model_name}' from {model.local_path}", style="fg:ansigreen")
+    print(f"Send predictions to {server.predict_url}, e.g. "
+          f"`./edge.sh model predict {model_name} --url {server.predict_url} -i instances.jsonl`")
+    print("Press Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    sys.exit(0)
@@ -0,0 +1,61 @@
+import datetime
+import sys
+
+import questionary
+
+from edge.command.model.deploy import complete_pending_deployment
+from edge.config import EdgeConfig
+from edge.exception import EdgeException
+from edge.operations import get_operation
+from edge.state import EdgeState
+from edge.vertex_deploy import describe_serving
+
+
+def model_status(model_name: str):
+    with EdgeConfig.context(silent=True) as config:
+        if config.models is None or model_name not in config.models:
+            questionary.print("Model is not initialised. Initialise it by running `./edge.sh model init`.",
+                              style="fg:ansired")
+            sys.exit(1)
+        try:
+            with EdgeState.context(config, silent=True) as state:
+                if state.models is None or state.models.get(model_name) is None:
+                    raise EdgeException("Model has not been initialised. "
+                                        f"Run `./edge.sh model init {model_name}` to initialise.")
+                model_state = state.models[model_name]
+        except EdgeException as exc:
+            questionary.print(str(exc), style="fg:ansired")
+            sys.exit(1)
+
+        print(f"Model:    {model_name}")
+        print(f"Endpoint: {model_state.endpoint_resource_name}")
+        if model_state.deployed_model_resource_name is not None:
+            serving = (
+                f" ({describe_serving(model_state.deployed_serving)})"
+                if model_state.deployed_serving is not None else ""
+            )
+            print(f"Deployed: {model_state.deployed_model_resource_name}{serving}")
+        else:
+            print("Deployed: nothing")
+
+        pending = model_state.pending_deployment
+        if pending is None:
+            print("Pending:  nothing")
+            sys.exit(0)
+        elapsed = datetime.datetime.now(datetime.timezone.utc) - datetime.datetime.fromisoformat(pending.started_at)
+        print(f"Pending:  {pending.model_resource_name} ({describe_serving(pending.serving)}), "
+              f"started {int(elapsed.total_seconds() // 60)} minutes ago")
+        print(f"          {pending.operation_name}")
+        try:
+            operation = get_operation(pending.operation_name)
+            if not operation.get("done", False):
+                print("Status:   deploying")
+                sys.exit(0)
+            print(f"Status:   {'failed' if 'error' in operation else 'ready'}")
+            print()
+            complete_pending_deployment(config, model_name, operation)
+        except EdgeException as exc:
+            questionary.print(str(exc), style="fg:ansired")
+            sys.exit(1)
+        questionary.print(f"Model '{model_name}' is deployed", style="fg:ansigreen")
+        sys.exit(0)
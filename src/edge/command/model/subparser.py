@@ -1,24 +1,145 @@
 import argparse
+import sys
+from typing import List
 
-from edge.command.model.deploy import model_deploy
+import questionary
+
+from edge.command.model.benchmark import model_benchmark
+from edge.command.model.deploy import model_deploy, model_deploy_many
 from edge.command.model.describe import describe_model
+from edge.command.model.gc import model_gc
 from edge.command.model.get_endpoint import get_model_endpoint
-from edge.command.model.init import model_init
+from edge.command.model.init import model_init, model_init_many
 from edge.command.model.list import list_models
-from edge.command.model.remove import remove_model
+from edge.command.model.predict import model_predict
+from edge.command.model.predict_batch import model_predict_batch
+from edge.command.model.remove import remove_model, remove_models
+from edge.command.model.serve import model_serve
+from edge.command.model.status import model_status
 from edge.command.model.template import create_model_from_template
+from edge.command.model.wait import model_wait
 from edge.exception import EdgeException
 
 
+def add_model_names_argument(parser: argparse.ArgumentParser, all_help: str):
+    parser.add_argument("model_names", metavar="model-name", nargs="*",
+                        help="Model name. Several models are processed concurrently")
+    parser.add_argument("--all", action="store_true", help=f"Process {all_help} concurrently")
+    parser.add_argument("--parallel", type=int, default=4,
+                        help="Maximum number of models processed at the same time (default: 4)")
+
+
+def get_model_names(args: argparse.Namespace) -> (List[str], bool):
+    """
+    :return: the model names, and whether they should be processed as a group
+    """
+    if args.all:
+        if args.model_names:
+            questionary.print("Either specify model names or --all, not both", style="fg:ansired")
+            sys.exit(1)
+        return [], True
+    if len(args.model_names) == 0:
+        questionary.print("Specify a model name, or --all", style="fg:ansired")
+        sys.exit(1)
+    return args.model_names, len(args.model_names) > 1
+
+
 def add_model_parser(subparsers):
     parser = subparsers.add_parser("model", help="Model related actions")
     actions = parser.add_subparsers(title="action", dest="action", required=True)
 
     init_parser = actions.add_parser("init", help="Initialise model on Vertex AI")
-    init_parser.add_argument("model_name", metavar="model-name", help="Model name")
+    add_model_names_argument(init_parser, "every model directory in models/")
+    init_parser.add_argument("--endpoint",
+                             help="Serve the models from this shared endpoint instead of one endpoint per model. "
+                                  "Each model routes traffic to its own deployed models")
 
     deploy_parser = actions.add_parser("deploy", help="Deploy model on Vertex AI")
-    deploy_parser.add_argument("model_name", metavar="model-name", help="Model name")
+    add_model_names_argument(deploy_parser, "all initialised models")
+    deploy_parser.add_argument("--blue-green", action="store_true",
+                               help="Deploy the new model next to the current one and switch traffic once it is "
+                                    "ready, so that the endpoint keeps serving during the deployment")
+    deploy_parser.add_argument("--canary", action="store_true",
+                               help="Shift traffic to the new model progressively, as configured in the model's "
+                                    "`canary` settings, rolling back automatically if latency or error rate gates "
+                                    "fail. Resumes an interrupted canary rollout")
+    deploy_parser.add_argument("--no-wait", action="store_true",
+                               help="Start the deployment and return without waiting for it, releasing the state "
+                                    "lock. Complete it later with `model status` or `model wait`")
+
+    gc_parser = actions.add_parser("gc", help="Delete old model versions from Vertex AI and Google Storage, keeping "
+                                              "the versions in use and the most recent ones")
+    gc_parser.add_argument("model_names", metavar="model-name", nargs="*",
+                           help="Model name (default: all initialised models)")
+    gc_parser.add_argument("--dry-run", action="store_true", help="Only show what would be deleted")
+    gc_parser.add_argument("--parallel", type=int, default=8,
+                           help="Maximum number of versions deleted at the same time (default: 8)")
+
+    status_parser = actions.add_parser("status", help="Show the deployment status of a model, and complete a "
+                                                      "deployment started with --no-wait if it is done")
+    status_parser.add_argument("model_name", metavar="model-name", help="Model name")
+
+    wait_parser = actions.add_parser("wait", help="Wait for a deployment started with --no-wait, and complete it")
+    wait_parser.add_argument("model_name", metavar="model-name", help="Model name")
+    wait_parser.add_argument("--timeout", type=float, help="Give up after this many seconds")
+
+    predict_parser = actions.add_parser("predict", help="Get online predictions from a deployed model")
+    predict_parser.add_argument("model_name", metavar="model-name", help="Model name")
+    predict_parser.add_argument("-i", "--input", required=True,
+                                help="JSONL file with one instance per line, or - for standard input")
+    predict_parser.add_argument("-o", "--output", help="File to write predictions to (default: standard output)")
+    predict_parser.add_argument("--url", help="Send requests to this :predict URL instead of the model's endpoint")
+    predict_parser.add_argument("--batch-size", type=int, default=32,
+                                help="Maximum number of instances per request (default: 32)")
+    predict_parser.add_argument("--concurrency", type=int, default=8,
+                                help="Maximum number of concurrent requests (default: 8)")
+
+    predict_batch_parser = actions.add_parser("predict-batch", help="Run batch prediction on Vertex AI")
+    predict_batch_parser.add_argument("model_name", metavar="model-name", help="Model name")
+    predict_batch_parser.add_argument("--input", required=True,
+                                      help="Google Storage URI of a .jsonl or .csv input file (or a wildcard pattern)")
+    predict_batch_parser.add_argument("--output", required=True,
+                                      help="Google Storage URI prefix to write predictions to")
+    predict_batch_parser.add_argument("--shard-size", type=int, default=100000,
+                                      help="Number of instances per input shard (default: 100000)")
+
+    benchmark_parser = actions.add_parser("benchmark", help="Measure the latency and throughput of a deployed model")
+    benchmark_parser.add_argument("model_name", metavar="model-name", help="Model name")
+    benchmark_parser.add_argument("-i", "--input", required=True,
+                                  help="JSONL file with sample instances, replayed during the benchmark")
+    benchmark_parser.add_argument("--concurrency", type=int, nargs="+",
+                                  help="Numbers of concurrent requests to benchmark (default: 1 4 16)")
+    benchmark_parser.add_argument("--qps", type=float, nargs="+",
+                                  help="Request rates to benchmark, in requests per second")
+    benchmark_parser.add_argument("--duration", type=float, default=30,
+                                  help="Duration of each level in seconds (default: 30)")
+    benchmark_parser.add_argument("--warmup", type=float, default=5,
+                                  help="Warm-up duration in seconds, not included in results (default: 5)")
+    benchmark_parser.add_argument("--instances-per-request", type=int, default=1,
+                                  help="Number of instances sent in each request (default: 1)")
+    benchmark_target = benchmark_parser.add_mutually_exclusive_group()
+    benchmark_target.add_argument("--url",
+                                  help="Send requests to this :predict URL instead of the model's endpoint, "
+                                       "e.g. one started by `model serve`")
+    benchmark_target.add_argument("--fake-endpoint", action="store_true",
+                                  help="Send requests to a local fake endpoint instead of the model's endpoint, "
+                                       "e.g. to check the benchmark setup")
+    benchmark_parser.add_argument("--fake-latency-ms", type=float, default=20,
+                                  help="Latency of every request to the fake endpoint (default: 20)")
+    benchmark_parser.add_argument("--fake-error-rate", type=float, default=0,
+                                  help="Fraction of requests to the fake endpoint that fail (default: 0)")
+
+    serve_parser = actions.add_parser("serve", help="Serve a locally trained model with a Vertex AI compatible "
+                                                    "prediction API")
+    serve_parser.add_argument("model_name", metavar="model-name", help="Model name")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    serve_parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080)")
+    serve_parser.add_argument("--batch-size", type=int, default=32,
+                              help="Maximum number of instances passed to the model at once (default: 32)")
+    serve_parser.add_argument("--max-latency-ms", type=float, default=5,
+                              help="How long a request may wait to be batched with other requests (default: 5)")
+    serve_parser.add_argument("--workers", type=int, default=4,
+                              help="Number of batches predicted concurrently (default: 4)")
 
     get_endpoint_parser = actions.add_parser("get-endpoint", help="Get Vertex AI endpoint URI")
     get_endpoint_parser.add_argument("model_name", metavar="model-name", help="Model name")
@@ -29,7 +150,7 @@ def add_model_parser(subparsers):
     describe_parser.add_argument("model_name", metavar="model-name", help="Model name")
 
     remove_parser = actions.add_parser("remove", help="Remove an initialised model from vertex:edge")
-    remove_parser.add_argument("model_name", metavar="model-name", help="Model name")
+    add_model_names_argument(remove_parser, "all initialised models")
 
     template_parser = actions.add_parser("template", help="Create a model pipeline from a template")
     template_parser.add_argument("model_name", metavar="model-name", help="Model name")
@@ -38,10 +159,34 @@ def add_model_parser(subparsers):
 
 
 def run_model_actions(args: argparse.Namespace):
+    if args.action in ["init", "deploy", "remove"]:
+        model_names, many = get_model_names(args)
     if args.action == "init":
-        model_init(args.model_name)
+        if many:
+            model_init_many(model_names, args.parallel, args.endpoint)
+        else:
+            model_init(model_names[0], args.endpoint)
     elif args.action == "deploy":
-        model_deploy(args.model_name)
+        if many:
+            model_deploy_many(model_names, args.blue_green, args.canary, args.parallel, wait=not args.no_wait)
+        else:
+            model_deploy(model_names[0], args.blue_green, args.canary, wait=not args.no_wait)
+    elif args.action == "predict":
+        model_predict(args.model_name, args.input, args.output, args.url, args.batch_size, args.concurrency)
+    elif args.action == "predict-batch":
+        model_predict_batch(args.model_name, args.input, args.output, args.shard_size)
+    elif args.action == "gc":
+        model_gc(args.model_names, args.dry_run, args.parallel)
+    elif args.action == "status":
+        model_status(args.model_name)
+    elif args.action == "wait":
+        model_wait(args.model_name, args.timeout)
+    elif args.action == "benchmark":
+        model_benchmark(args.model_name, args.input, args.concurrency, args.qps, args.duration, args.warmup,
+                        args.instances_per_request, args.url, args.fake_endpoint, args.fake_latency_ms,
+                        args.fake_error_rate)
+    elif args.action == "serve":
+        model_serve(args.model_name, args.host, args.port, args.batch_size, args.max_latency_ms, args.workers)
     elif args.action == "get-endpoint":
         get_model_endpoint(args.model_name)
     elif args.action == "list":
@@ -49,7 +194,10 @@ def run_model_actions(args: argparse.Namespace):
     elif args.action == "describe":
         describe_model(args.model_name)
     elif args.action == "remove":
-        remove_model(args.model_name)
+        if many:
+            remove_models(model_names, args.parallel)
+        else:
+            remove_model(model_names[0])
     elif args.action == "template":
         create_model_from_template(args.model_name, args.f)
     else:
@@ -0,0 +1,52 @@
+import datetime
+from typing import Optional
+
+from edge.command.common.precommand_check import precommand_checks
+from edge.command.model.deploy import complete_pending_deployment
+from edge.config import EdgeConfig
+from edge.exception import EdgeException
+from edge.operations import wait_for_operation
+from edge.state import EdgeState
+from edge.tui import TUI, StepTUI, SubStepTUI, TUIStatus
+
+
+def model_wait(model_name: str, timeout: Optional[float] = None):
+    intro = f"Waiting for the deployment of model '{model_name}'"
+    success_title = "Model deployed successfully"
+    success_message = "Success"
+    failure_title = "Model deployment failed"
+    failure_message = "See the errors above. See README for more details."
+    with EdgeConfig.context() as config:
+        with TUI(
+                intro,
+                success_title,
+                success_message,
+                failure_title,
+                failure_message
+        ) as tui:
+            precommand_checks(config)
+            # The state is not locked while waiting, so that other commands can run meanwhile
+            with EdgeState.context(config) as state:
+                with StepTUI("Checking model state", emoji="🐏"):
+                    with SubStepTUI("Checking for a deployment in progress") as sub_step:
+                        if (model_name not in config.models or state.models is None
+                                or state.models.get(model_name) is None):
+                            raise EdgeException("Model has not been initialised. "
+                                                f"Run `./edge.sh model init {model_name}` to initialise.")
+                        pending = state.models[model_name].pending_deployment
+                        if pending is None:
+                            sub_step.update("No deployment is in progress", status=TUIStatus.NEUTRAL)
+                            tui.success_title = "Nothing to wait for"
+                            return
+
+            with StepTUI(f"Waiting for '{pending.model_resource_name}' to be deployed", emoji="⏳"):
+                with SubStepTUI("Deploying") as sub_step:
+                    started_at = datetime.datetime.fromisoformat(pending.started_at)
+
+                    def on_poll(_):
+                        elapsed = datetime.datetime.now(datetime.timezone.utc) - started_at
+                        sub_step.update(f"Deploying ({int(elapsed.total_seconds() // 60)} minutes elapsed)")
+
+                    operation = wait_for_operation(pending.operation_name, on_poll=on_poll, timeout=timeout)
+
+            complete_pending_deployment(config, model_name, operation)
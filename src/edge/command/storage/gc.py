@@ -0,0 +1,84 @@
+import datetime
+
+from google.cloud import storage
+
+from edge.command.common.precommand_check import precommand_checks
+from edge.config import EdgeConfig
+from edge.exception import EdgeException
+from edge.registry import list_vertex_artifact_uris
+from edge.state import EdgeState
+from edge.storage_gc import collect_garbage, find_live_prefixes
+from edge.tui import TUI, StepTUI, SubStepTUI, TUIStatus, format_size
+
+
+def storage_gc(dry_run: bool = False, min_age_hours: float = 24, max_workers: int = 8):
+    """
+    Delete prefixes of the Vertex AI jobs directory that no model refers to
+
+    :param dry_run: only show what would be deleted
+    :param min_age_hours: keep prefixes written more recently than this, as they may belong to a running job
+    :param max_workers: maximum number of prefixes processed at the same time
+    :return:
+    """
+    intro = "Garbage collecting the Vertex AI jobs directory" + (" (dry run)" if dry_run else "")
+    success_title = "Storage garbage collected successfully"
+    success_message = "Success"
+    failure_title = "Storage garbage collection failed"
+    failure_message = "See the errors above. See README for more details."
+    with EdgeConfig.context() as config:
+        with TUI(
+                intro,
+                success_title,
+                success_message,
+                failure_title,
+                failure_message
+        ) as tui:
+            precommand_checks(config)
+            bucket_name = config.storage_bucket.bucket_name
+            directory = config.storage_bucket.vertex_jobs_directory
+            # The state is locked, so that no model is registered or deployed while its artifacts are checked
+            with EdgeState.context(config, to_lock=True) as state:
+                artifact_uris = []
+                with StepTUI("Finding model artifacts in use", emoji="🔍"):
+                    with SubStepTUI("Reading the model registry"):
+                        for model_state in (state.models or {}).values():
+                            artifact_uris += [version.artifact_uri for version in model_state.versions]
+                    # Models that are not configured, e.g. of removed models, may still refer to the directory
+                    with SubStepTUI(f"Listing Vertex AI models in project '{config.google_cloud_project.project_id}'"):
+                        artifact_uris += list_vertex_artifact_uris(config)
+                    live_prefixes = find_live_prefixes(artifact_uris, bucket_name, directory)
+
+                with StepTUI(f"Collecting garbage in gs://{bucket_name}/{directory}", emoji="🗑️"):
+                    with SubStepTUI("Listing and deleting orphaned prefixes") as sub_step:
+                        def on_progress(report, candidates):
+                            done = len(report.deleted) + report.recent + len(report.errors)
+                            sub_step.update(f"{'Checked' if dry_run else 'Processed'} {done}/{candidates} "
+                                            f"orphaned prefixes, {format_size(report.bytes_reclaimed)} "
+                                            f"{'to reclaim' if dry_run else 'reclaimed'}")
+
+                        report = collect_garbage(
+                            lambda: storage.Client(config.google_cloud_project.project_id),
+                            bucket_name,
+                            directory,
+                            live_prefixes,
+                            datetime.timedelta(hours=min_age_hours),
+                            dry_run=dry_run,
+                            max_workers=max_workers,
+                            on_progress=on_progress,
+                        )
+                        sub_step.update(
+                            f"{report.scanned} prefixes: {report.live} in use, {report.recent} recent, "
+                            f"{len(report.deleted)} orphaned"
+                        )
+                        if dry_run:
+                            sub_step.update(status=TUIStatus.NEUTRAL)
+                            for usage in report.deleted:
+                                sub_step.add_explanation(f"{usage.prefix} ({usage.blob_count} files, "
+                                                         f"{format_size(usage.size)})")
+                        if report.errors:
+                            raise EdgeException("Some prefixes could not be deleted:\n" + "\n".join(report.errors))
+
+                tui.success_message = (
+                    f"{'Would reclaim' if dry_run else 'Reclaimed'} {format_size(report.bytes_reclaimed)} from "
+                    f"{len(report.deleted)} prefixes ({report.blobs_deleted} files)"
+                )
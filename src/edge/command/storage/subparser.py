@@ -0,0 +1,31 @@
+import argparse
+
+from edge.command.storage.gc import storage_gc
+from edge.command.storage.tune import storage_tune
+from edge.exception import EdgeException
+
+
+def add_storage_parser(subparsers):
+    parser = subparsers.add_parser("storage", help="Storage bucket related actions")
+    actions = parser.add_subparsers(title="action", dest="action", required=True)
+
+    gc_parser = actions.add_parser("gc", help="Delete training job outputs and staging files that no model refers to")
+    gc_parser.add_argument("--dry-run", action="store_true", help="Only show what would be deleted")
+    gc_parser.add_argument("--min-age-hours", type=float, default=24,
+                           help="Keep files written more recently than this, as they may belong to a running "
+                                "training job (default: 24)")
+    gc_parser.add_argument("--parallel", type=int, default=8,
+                           help="Maximum number of prefixes processed at the same time (default: 8)")
+
+    tune_parser = actions.add_parser("tune", help="Apply the storage class and lifecycle rules in edge.yaml to the "
+                                                  "storage bucket")
+    tune_parser.add_argument("--dry-run", action="store_true", help="Only show how the lifecycle rules would change")
+
+
+def run_storage_actions(args: argparse.Namespace):
+    if args.action == "gc":
+        storage_gc(args.dry_run, args.min_age_hours, args.parallel)
+    elif args.action == "tune":
+        storage_tune(args.dry_run)
+    else:
+        raise EdgeException("Unexpected storage command")
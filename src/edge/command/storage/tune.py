@@ -0,0 +1,44 @@
+from edge.command.common.precommand_check import precommand_checks
+from edge.config import EdgeConfig
+from edge.storage import setup_lifecycle_rules, default_lifecycle_rules, managed_lifecycle_prefixes
+from edge.tui import TUI, StepTUI
+
+
+def storage_tune(dry_run: bool = False):
+    """
+    Apply the lifecycle rules in vertex:edge config to the storage bucket, after showing how they change
+
+    :param dry_run: only show the changes
+    :return:
+    """
+    intro = "Tuning the storage bucket" + (" (dry run)" if dry_run else "")
+    success_title = "Storage bucket tuned successfully"
+    success_message = "Lifecycle rules of the bucket match vertex:edge config"
+    failure_title = "Storage bucket tuning failed"
+    failure_message = "See the errors above. See README for more details."
+    with TUI(
+            intro,
+            success_title,
+            success_message,
+            failure_title,
+            failure_message
+    ) as tui:
+        with EdgeConfig.context(to_save=not dry_run) as config:
+            precommand_checks(config)
+            with StepTUI("Configuring lifecycle rules", emoji="🧊"):
+                if config.storage_bucket.lifecycle_rules is None:
+                    # Recorded in config, so that the rules can be reviewed and changed in edge.yaml
+                    config.storage_bucket.lifecycle_rules = default_lifecycle_rules(config.storage_bucket)
+                is_applied = setup_lifecycle_rules(
+                    config.google_cloud_project.project_id,
+                    config.storage_bucket.bucket_name,
+                    config.storage_bucket.lifecycle_rules,
+                    managed_lifecycle_prefixes(config.storage_bucket),
+                    dry_run=dry_run,
+                )
+            if not is_applied:
+                tui.success_title = "Storage bucket left unchanged"
+                tui.success_message = (
+                    "Run `./edge.sh storage tune` to apply the changes above" if dry_run
+                    else "The changes above were not applied"
+                )
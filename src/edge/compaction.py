@@ -0,0 +1,167 @@
+"""
+Compacting metric series of old experiment runs
+"""
+import datetime
+import gzip
+import json
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any
+
+import bson
+import numpy as np
+from google.cloud import storage
+from pymongo import UpdateOne
+from pymongo.database import Database
+
+from edge.experiments import BATCH_SIZE
+
+# Number of metric documents rewritten per bulk write
+BULK_WRITE_SIZE = 500
+# Every bucket of a downsampled series keeps 3 points, so series cannot be downsampled to fewer
+MIN_MAX_POINTS = 3
+
+
+@dataclass
+class CompactionReport:
+    series: int = 0
+    points_before: int = 0
+    points_after: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+    archived: int = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+
+def downsample_indices(values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Choose points to keep from a metric series, so that at most [max_points] remain.
+
+    The series is split into equal buckets, and the minimum, maximum and last point of every bucket are kept,
+    which preserves the envelope of the series when it is plotted.
+
+    :param values:
+    :param max_points: at least [MIN_MAX_POINTS]
+    :return: sorted indices of the points to keep
+    """
+    if max_points < MIN_MAX_POINTS:
+        raise ValueError(f"Metric series cannot be downsampled to fewer than {MIN_MAX_POINTS} points")
+    n = len(values)
+    buckets = max_points // 3
+    if n <= max_points:
+        return np.arange(n)
+
+    size = -(-n // buckets)
+    rows = -(-n // size)
+    pad = rows * size - n
+    nan = np.isnan(values)
+    lows = np.pad(np.where(nan, np.inf, values), (0, pad), constant_values=np.inf).reshape(rows, size)
+    highs = np.pad(np.where(nan, -np.inf, values), (0, pad), constant_values=-np.inf).reshape(rows, size)
+
+    offsets = np.arange(rows) * size
+    minimums = offsets + lows.argmin(axis=1)
+    maximums = offsets + highs.argmax(axis=1)
+    lasts = np.minimum(offsets + size - 1, n - 1)
+    return np.unique(np.concatenate([minimums, maximums, lasts]))
+
+
+def _compacted(metric: Dict[str, Any], indices: np.ndarray) -> Dict[str, Any]:
+    compacted = dict(metric)
+    for field in ["steps", "values", "timestamps"]:
+        if field in metric:
+            series = metric[field]
+            compacted[field] = [series[i] for i in indices]
+    return compacted
+
+
+def _archive(bucket: storage.Bucket, directory: str, metric: Dict[str, Any]) -> str:
+    blob_name = f"{directory}/metrics/{metric['run_id']}/{metric['_id']}.json.gz"
+    blob = storage.Blob(blob_name, bucket)
+    blob.content_encoding = "gzip"
+    data = json.dumps(
+        {
+            "run_id": metric["run_id"],
+            "name": metric["name"],
+            "steps": metric.get("steps", []),
+            "values": metric.get("values", []),
+            "timestamps": [str(t) for t in metric.get("timestamps", [])],
+        }
+    )
+    blob.upload_from_string(gzip.compress(data.encode("utf-8")), content_type="application/json")
+    return f"gs://{bucket.name}/{blob_name}"
+
+
+def compact_metrics(
+    database: Database,
+    older_than_days: int,
+    max_points: int,
+    archive_bucket: Optional[storage.Bucket] = None,
+    archive_directory: str = "experiments",
+    dry_run: bool = False,
+) -> CompactionReport:
+    """
+    Downsample metric series of runs that started more than [older_than_days] ago to at most [max_points] points
+
+    :param database:
+    :param older_than_days:
+    :param max_points:
+    :param archive_bucket: if given, raw series are uploaded to this bucket before being rewritten
+    :param archive_directory:
+    :param dry_run: only report the expected savings, without changing anything
+    :return:
+    """
+    report = CompactionReport()
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=older_than_days)
+    run_ids = [
+        run["_id"]
+        for run in database.runs.find(
+            {"start_time": {"$lt": cutoff}, "status": {"$ne": "RUNNING"}},
+            projection={"_id": 1},
+            batch_size=BATCH_SIZE,
+        )
+    ]
+
+    operations: List[UpdateOne] = []
+    for start in range(0, len(run_ids), BATCH_SIZE):
+        # Series longer than [max_points] are matched on the server by checking that the element at that index exists
+        metrics = database.metrics.find(
+            {
+                "run_id": {"$in": run_ids[start:start + BATCH_SIZE]},
+                f"values.{max_points}": {"$exists": True},
+            },
+            batch_size=BULK_WRITE_SIZE,
+        )
+        for metric in metrics:
+            try:
+                values = np.asarray(metric["values"], dtype=float)
+            except (TypeError, ValueError):
+                continue  # Only numeric series can be downsampled
+            indices = downsample_indices(values, max_points)
+            compacted = _compacted(metric, indices)
+
+            report.series += 1
+            report.points_before += len(values)
+            report.points_after += len(indices)
+            report.bytes_before += len(bson.BSON.encode(metric))
+            report.bytes_after += len(bson.BSON.encode(compacted))
+
+            if dry_run:
+                continue
+
+            update = {field: compacted[field] for field in ["steps", "values", "timestamps"] if field in compacted}
+            update["edge_compacted_at"] = datetime.datetime.utcnow()
+            if archive_bucket is not None:
+                update["edge_archive_uri"] = _archive(archive_bucket, archive_directory, metric)
+                report.archived += 1
+            operations.append(UpdateOne({"_id": metric["_id"]}, {"$set": update}))
+
+            if len(operations) >= BULK_WRITE_SIZE:
+                database.metrics.bulk_write(operations, ordered=False)
+                operations = []
+
+    if operations:
+        database.metrics.bulk_write(operations, ordered=False)
+
+    return report
@@ -1,7 +1,7 @@
 import inspect
 import sys
 from dataclasses import dataclass, field
-from typing import TypeVar, Type, Optional, Dict
+from typing import TypeVar, Type, Optional, Dict, List
 from serde import serialize, deserialize
 from serde.yaml import from_yaml, to_yaml
 from contextlib import contextmanager
@@ -18,6 +18,31 @@ class GCProjectConfig:
     region: str
 
 
+@deserialize
+@serialize
+@dataclass
+class DvcPerformanceConfig:
+    # DVC cache link types in order of preference. DVC uses the first one that works on the machine it runs on
+    cache_type: str = "reflink,copy"
+    # Number of parallel transfers to and from the DVC remote
+    jobs: int = 16
+    # Cache directory shared by all clones on a machine, if any
+    shared_cache_dir: Optional[str] = None
+
+
+@deserialize
+@serialize
+@dataclass
+class LifecycleRuleConfig:
+    # Prefix of the objects in the bucket that the rule applies to, e.g. "dvcstore/"
+    prefix: str
+    # Days after an object is created to move it to Nearline storage, which is cheaper but charges for reads
+    nearline_after_days: Optional[int] = None
+    # Days after an object is created to move it to Coldline storage, which is cheaper still
+    coldline_after_days: Optional[int] = None
+    delete_after_days: Optional[int] = None
+
+
 @deserialize
 @serialize
 @dataclass
@@ -25,6 +50,12 @@ class StorageBucketConfig:
     bucket_name: str
     dvc_store_directory: str
     vertex_jobs_directory: str
+    experiments_archive_directory: str = "experiments"
+    # DVC cache and remote settings applied by `dvc init`, so that every clone gets the same settings
+    dvc_performance: Optional[DvcPerformanceConfig] = None
+    # Lifecycle rules of the bucket, applied by `init` and `storage tune`. If not set, the bucket lifecycle is not
+    # managed by vertex:edge
+    lifecycle_rules: Optional[List[LifecycleRuleConfig]] = None
 
 
 @deserialize
@@ -35,6 +66,44 @@ class SacredConfig:
     mongodb_connection_string_secret: str
 
 
+@deserialize
+@serialize
+@dataclass
+class ServingConfig:
+    machine_type: str = "n1-standard-2"
+    min_replica_count: int = 1
+    max_replica_count: int = 1
+    # Target CPU utilisation (percent) that Vertex AI autoscales replicas towards, when max > min replicas
+    autoscaling_target_cpu_utilization: Optional[int] = None
+
+
+@deserialize
+@serialize
+@dataclass
+class CanaryConfig:
+    # Percentages of traffic sent to the new model at each step of a canary rollout, ending with 100
+    steps: List[int] = field(default_factory=lambda: [5, 25, 100])
+    step_wait_seconds: int = 600
+    # Gates evaluated on the new model before each step; the rollout is rolled back if any of them fails
+    max_latency_ms: float = 500.0
+    max_error_rate: float = 0.01
+    # Gates are only evaluated once the new model has served at least this many requests in a step. Until then, the
+    # step is extended by [step_wait_seconds] at a time
+    min_requests: int = 100
+    # Longest a step is extended for to serve [min_requests], after which the rollout is rolled back
+    max_step_wait_seconds: int = 1800
+    # "cloud-monitoring", or a "module:Class" path to a custom metrics source
+    metrics_source: str = "cloud-monitoring"
+
+
+@deserialize
+@serialize
+@dataclass
+class RetentionConfig:
+    # Number of most recent model versions kept by `model gc`, in addition to the ones in use
+    keep_last: int = 5
+
+
 @deserialize
 @serialize
 @dataclass
@@ -43,6 +112,9 @@ class ModelConfig:
     endpoint_name: str
     training_container_image_uri: str = "europe-docker.pkg.dev/vertex-ai/training/tf-cpu.2-6:latest"
     serving_container_image_uri: str = "europe-docker.pkg.dev/vertex-ai/prediction/tf2-cpu.2-6:latest"
+    serving: ServingConfig = field(default_factory=ServingConfig)
+    canary: CanaryConfig = field(default_factory=CanaryConfig)
+    retention: RetentionConfig = field(default_factory=RetentionConfig)
 
 
 T = TypeVar("T", bound="EdgeConfig")
@@ -0,0 +1,413 @@
+"""
+Transfer of DVC-tracked data between the DVC cache and the vertex:edge DVC remote
+
+DVC stores every file under its MD5 hash, as `<hash[:2]>/<hash[2:]>`, both in the cache and in the remote. A tracked
+directory is stored as a `.dir` object listing the hashes of its files. Objects are transferred on a pool of worker
+threads:
+
+- objects that are already in the cache (when pulling) or in the remote (when pushing) are skipped, so an
+  interrupted transfer picks up where it left off;
+- downloads are written to a `.partial` file next to the cache object, and resumed from its current size;
+- downloaded objects are checked against their hash before they are moved into the cache.
+"""
+import abc
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import BinaryIO, Callable, List, Optional, Set
+
+import yaml
+from google.api_core.exceptions import NotFound
+from google.cloud import storage
+
+from edge.exception import EdgeException
+
+# Directories searched for `.dvc` files and pipeline lock files
+DATA_ROOTS = ["data", "models"]
+PARTIAL_SUFFIX = ".partial"
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class DvcOutput:
+    # Path of the data, relative to the repository root
+    path: str
+    md5: str
+    # `.dvc` or `dvc.lock` file that tracks the data
+    dvc_file: str
+
+    @property
+    def is_dir(self) -> bool:
+        return self.md5.endswith(".dir")
+
+
+def find_dvc_files(roots: List[str] = DATA_ROOTS) -> List[str]:
+    """
+    Find `.dvc` files and pipeline lock files
+
+    :param roots:
+    :return:
+    """
+    dvc_files = []
+    for root in roots:
+        for directory, subdirectories, files in os.walk(root):
+            subdirectories[:] = [subdirectory for subdirectory in subdirectories if not subdirectory.startswith(".")]
+            dvc_files += [
+                os.path.join(directory, file) for file in files if file.endswith(".dvc") or file == "dvc.lock"
+            ]
+    return sorted(dvc_files)
+
+
+def read_outputs(dvc_file: str) -> List[DvcOutput]:
+    """
+    Read the outputs tracked by a `.dvc` file, or by the stages of a pipeline lock file
+
+    :param dvc_file:
+    :return: outputs that have been committed to the cache
+    """
+    with open(dvc_file) as f:
+        content = yaml.safe_load(f) or {}
+    if os.path.basename(dvc_file) == "dvc.lock":
+        outs = [out for stage in (content.get("stages") or {}).values() for out in stage.get("outs", [])]
+    else:
+        outs = content.get("outs", [])
+    directory = os.path.dirname(dvc_file)
+    return [
+        DvcOutput(path=os.path.normpath(os.path.join(directory, out["path"])), md5=out["md5"], dvc_file=dvc_file)
+        for out in outs if out.get("md5") is not None
+    ]
+
+
+def discover_outputs(roots: List[str] = DATA_ROOTS) -> List[DvcOutput]:
+    return [output for dvc_file in find_dvc_files(roots) for output in read_outputs(dvc_file)]
+
+
+def object_name(md5: str) -> str:
+    return f"{md5[:2]}/{md5[2:]}"
+
+
+def read_dir_object(path: str) -> List[str]:
+    """
+    Read the hashes of the files of a tracked directory from its `.dir` object
+
+    :param path:
+    :return:
+    """
+    with open(path) as f:
+        return [entry["md5"] for entry in json.load(f)]
+
+
+def file_md5(path: str) -> Set[str]:
+    """
+    Hash a file the way DVC does. DVC hashes text files with Windows line endings converted to Unix ones, and a file
+    is accepted if either hash matches, so that binary files need not be sniffed.
+
+    :param path:
+    :return: raw MD5, and MD5 with line endings converted
+    """
+    raw, converted = hashlib.md5(), hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            raw.update(chunk)
+            converted.update(chunk.replace(b"\r\n", b"\n"))
+    return {raw.hexdigest(), converted.hexdigest()}
+
+
+class Remote(abc.ABC):
+    """
+    DVC remote storage. Methods are called from several threads at once.
+    """
+
+    @abc.abstractmethod
+    def exists(self, name: str) -> bool:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def size(self, name: str) -> int:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def download(self, name: str, file: BinaryIO, start: int = 0):
+        """
+        Write object [name] to [file], from byte [start]. Raises FileNotFoundError if there is no such object.
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def upload(self, path: str, name: str):
+        raise NotImplementedError()
+
+
+class LocalRemote(Remote):
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self._path(name))
+
+    def size(self, name: str) -> int:
+        return os.path.getsize(self._path(name))
+
+    def download(self, name: str, file: BinaryIO, start: int = 0):
+        with open(self._path(name), "rb") as source:
+            source.seek(start)
+            shutil.copyfileobj(source, file, CHUNK_SIZE)
+
+    def upload(self, path: str, name: str):
+        target = self._path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(path, target + PARTIAL_SUFFIX)
+        os.replace(target + PARTIAL_SUFFIX, target)
+
+
+class GoogleStorageRemote(Remote):
+    def __init__(self, uri: str, client_factory: Callable[[], storage.Client]):
+        """
+        :param uri: gs://bucket/prefix
+        :param client_factory: creates a storage client. Every worker thread gets its own client, as clients are not
+                               thread-safe.
+        """
+        self.bucket_name, _, prefix = uri[len("gs://"):].partition("/")
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.client_factory = client_factory
+        self._clients = threading.local()
+
+    def _blob(self, name: str) -> (storage.Client, storage.Blob):
+        if not hasattr(self._clients, "client"):
+            self._clients.client = self.client_factory()
+        client = self._clients.client
+        return client, client.bucket(self.bucket_name).blob(self.prefix + name)
+
+    def exists(self, name: str) -> bool:
+        client, blob = self._blob(name)
+        return blob.exists(client)
+
+    def size(self, name: str) -> int:
+        client, blob = self._blob(name)
+        blob.reload(client)
+        return blob.size
+
+    def download(self, name: str, file: BinaryIO, start: int = 0):
+        client, blob = self._blob(name)
+        try:
+            blob.download_to_file(file, client=client, start=start or None)
+        except NotFound:
+            raise FileNotFoundError(f"gs://{self.bucket_name}/{self.prefix}{name}")
+
+    def upload(self, path: str, name: str):
+        client, blob = self._blob(name)
+        blob.upload_from_filename(path, client=client)
+
+
+def get_remote(url: str, project_id: Optional[str] = None) -> Remote:
+    """
+    :param url: a gs:// URI, or a local directory, as configured for DVC
+    :param project_id:
+    :return:
+    """
+    if url.startswith("gs://"):
+        return GoogleStorageRemote(url, lambda: storage.Client(project_id))
+    # DVC resolves local remotes relative to the `.dvc` directory
+    return LocalRemote(os.path.abspath(os.path.join(".dvc", url)))
+
+
+@dataclass
+class TransferReport:
+    total: int = 0
+    transferred: int = 0
+    # Objects that were already at the destination
+    skipped: int = 0
+    # Objects that are not at the source
+    missing: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    bytes_transferred: int = 0
+    seconds: float = 0
+
+    @property
+    def done(self) -> int:
+        return self.transferred + self.skipped + len(self.missing) + len(self.errors)
+
+    @property
+    def throughput(self) -> float:
+        """
+        Bytes transferred per second
+        """
+        return self.bytes_transferred / self.seconds if self.seconds > 0 else 0
+
+    def merge(self, other: "TransferReport"):
+        self.total += other.total
+        self.transferred += other.transferred
+        self.skipped += other.skipped
+        self.missing += other.missing
+        self.errors += other.errors
+        self.bytes_transferred += other.bytes_transferred
+        self.seconds += other.seconds
+
+
+def _transfer(
+    names: List[str],
+    operation: Callable[[str], Optional[int]],
+    jobs: int,
+    on_progress: Optional[Callable[[TransferReport], None]],
+) -> TransferReport:
+    """
+    Run [operation] on every object on a thread pool
+
+    :param names:
+    :param operation: transfers an object, and returns the number of bytes transferred, or None if it was skipped.
+                      Raises FileNotFoundError if the object is missing at the source.
+    :param jobs:
+    :param on_progress: called with the report so far, from the calling thread
+    :return:
+    """
+    report = TransferReport(total=len(names))
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="edge-data") as executor:
+        futures = {executor.submit(operation, name): name for name in names}
+        for future in as_completed(futures):
+            try:
+                transferred = future.result()
+            except FileNotFoundError:
+                report.missing.append(futures[future])
+            except Exception as exc:
+                report.errors.append(f"{futures[future]}: {exc}")
+            else:
+                if transferred is None:
+                    report.skipped += 1
+                else:
+                    report.transferred += 1
+                    report.bytes_transferred += transferred
+            report.seconds = time.monotonic() - started
+            if on_progress is not None:
+                on_progress(report)
+    report.seconds = time.monotonic() - started
+    return report
+
+
+def _fetch(remote: Remote, cache_dir: str, name: str) -> Optional[int]:
+    target = os.path.join(cache_dir, name)
+    if os.path.exists(target):
+        return None
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    partial = target + PARTIAL_SUFFIX
+    start = os.path.getsize(partial) if os.path.exists(partial) else 0
+    if start > 0 and start >= remote.size(name):
+        start = 0
+    with open(partial, "ab" if start > 0 else "wb") as f:
+        remote.download(name, f, start)
+    md5 = name.replace("/", "")
+    if md5.endswith(".dir"):
+        md5 = md5[:-len(".dir")]
+    if md5 not in file_md5(partial):
+        os.remove(partial)
+        raise EdgeException("Downloaded data does not match its hash")
+    size = os.path.getsize(partial)
+    os.replace(partial, target)
+    return size - start
+
+
+def _send(remote: Remote, cache_dir: str, name: str) -> Optional[int]:
+    source = os.path.join(cache_dir, name)
+    if not os.path.exists(source):
+        raise FileNotFoundError(source)
+    if remote.exists(name):
+        return None
+    remote.upload(source, name)
+    return os.path.getsize(source)
+
+
+def _dir_objects(outputs: List[DvcOutput]) -> List[str]:
+    return sorted({object_name(output.md5) for output in outputs if output.is_dir})
+
+
+def _file_objects(outputs: List[DvcOutput], cache_dir: str) -> List[str]:
+    names = set()
+    for output in outputs:
+        if not output.is_dir:
+            names.add(object_name(output.md5))
+        elif os.path.exists(os.path.join(cache_dir, object_name(output.md5))):
+            names.update(object_name(md5) for md5 in read_dir_object(os.path.join(cache_dir, object_name(output.md5))))
+    return sorted(names)
+
+
+def _merged(first: TransferReport, second: TransferReport) -> TransferReport:
+    merged = TransferReport()
+    merged.merge(first)
+    merged.merge(second)
+    return merged
+
+
+def pull(
+    outputs: List[DvcOutput],
+    remote: Remote,
+    cache_dir: str,
+    jobs: int = 16,
+    on_progress: Optional[Callable[[TransferReport], None]] = None,
+) -> TransferReport:
+    """
+    Download the objects of [outputs] that are not in the cache yet. Directory listings are downloaded first, to
+    find out which files they contain.
+
+    :param outputs:
+    :param remote:
+    :param cache_dir:
+    :param jobs: number of parallel transfers
+    :param on_progress:
+    :return:
+    """
+    fetch = lambda name: _fetch(remote, cache_dir, name)  # noqa: E731
+    dirs = _transfer(_dir_objects(outputs), fetch, jobs, on_progress)
+    files = _transfer(
+        _file_objects(outputs, cache_dir),
+        fetch,
+        jobs,
+        None if on_progress is None else lambda report: on_progress(_merged(dirs, report)),
+    )
+    return _merged(dirs, files)
+
+
+def push(
+    outputs: List[DvcOutput],
+    remote: Remote,
+    cache_dir: str,
+    jobs: int = 16,
+    on_progress: Optional[Callable[[TransferReport], None]] = None,
+) -> TransferReport:
+    """
+    Upload the objects of [outputs] that are not in the remote yet
+
+    :param outputs:
+    :param remote:
+    :param cache_dir:
+    :param jobs: number of parallel transfers
+    :param on_progress:
+    :return:
+    """
+    names = _dir_objects(outputs) + _file_objects(outputs, cache_dir)
+    return _transfer(names, lambda name: _send(remote, cache_dir, name), jobs, on_progress)
+
+
+def checkout(outputs: List[DvcOutput]):
+    """
+    Link pulled data from the cache into the workspace, using the cache types configured for DVC
+
+    :param outputs:
+    :return:
+    """
+    targets = sorted({
+        output.dvc_file if output.dvc_file.endswith(".dvc")
+        else os.path.join(os.path.dirname(output.dvc_file), "dvc.yaml")
+        for output in outputs
+    })
+    result = subprocess.run(["dvc", "checkout"] + targets, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise EdgeException(f"Unable to check out data:\n{result.stderr.decode('utf-8', errors='replace')}")
@@ -1,13 +1,22 @@
-import glob
+import configparser
 import subprocess
-from typing import Optional
+import tempfile
+from typing import Optional, List
 
 import os
 import shutil
+from edge.config import DvcPerformanceConfig
+from edge.data import DATA_ROOTS, find_dvc_files
 from edge.exception import EdgeException
 from edge.tui import StepTUI, SubStepTUI, TUIStatus, qmark
 import questionary
 
+DVC_CONFIG_PATH = os.path.join(".dvc", "config")
+# Settings of this clone only, which DVC ignores in git
+DVC_LOCAL_CONFIG_PATH = os.path.join(".dvc", "config.local")
+# Name of the DVC remote that points to the vertex:edge storage bucket
+REMOTE_NAME = "storage"
+
 
 def dvc_exists() -> bool:
     return os.path.exists(".dvc") and os.path.isdir(".dvc")
@@ -17,7 +26,7 @@ def dvc_init():
     with StepTUI("Initialising DVC", emoji="🔨"):
         with SubStepTUI("Initialising DVC"):
             try:
-                subprocess.check_output("dvc init", shell=True, stderr=subprocess.DEVNULL)
+                subprocess.check_output(["dvc", "init"], stderr=subprocess.DEVNULL)
             except subprocess.CalledProcessError as e:
                 raise EdgeException(f"Unexpected error occurred while initialising DVC:\n{str(e)}")
 
@@ -26,60 +35,281 @@ def dvc_destroy():
     with StepTUI("Destroying DVC", emoji="🔥"):
         with SubStepTUI("Deleting DVC configuration [.dvc]"):
             shutil.rmtree(".dvc")
-        with SubStepTUI("Deleting DVC data [data/fashion-mnist/*.dvc]"):
-            for f in glob.glob("data/fashion-mnist/*.dvc"):
-                os.remove(f)
-        with SubStepTUI("Deleting pipeline lock file [models/pipelines/fashion/dvc.lock]"):
-            if os.path.exists("models/pipelines/fashion/dvc.lock"):
-                os.remove("models/pipelines/fashion/dvc.lock")
+        dvc_files = find_dvc_files()
+        with SubStepTUI(f"Deleting DVC data [{', '.join(DATA_ROOTS)}/**/*.dvc]"):
+            for f in dvc_files:
+                if f.endswith(".dvc"):
+                    os.remove(f)
+        with SubStepTUI("Deleting pipeline lock files [models/*/dvc.lock]"):
+            for f in dvc_files:
+                if os.path.basename(f) == "dvc.lock":
+                    os.remove(f)
 
 
-def dvc_remote_exists(path: str) -> (bool, bool):
-    try:
-        remotes_raw = subprocess.check_output("dvc remote list", shell=True, stderr=subprocess.DEVNULL).decode("utf-8")
-        remotes = [x.split("\t") for x in remotes_raw.strip().split("\n") if len(x.split("\t")) == 2]
-        for remote in remotes:
-            if remote[0] == "storage":
-                if remote[1] == path:
-                    return True, True
-                else:
-                    return True, False
-        return False, False
-    except subprocess.CalledProcessError as e:
-        raise EdgeException(f"Unexpected error occurred while adding remote storage to DVC:\n{str(e)}")
-
-
-def get_dvc_storage_path() -> Optional[str]:
+def remote_section(name: str) -> str:
+    """
+    Name of the section of a DVC remote in `.dvc/config`, which is written as ['remote "name"']
+    """
+    return f"'remote \"{name}\"'"
+
+
+def read_dvc_config(path: str = DVC_CONFIG_PATH, local: bool = False) -> configparser.ConfigParser:
+    """
+    Read the DVC repository config, without invoking DVC
+
+    :param path:
+    :param local: whether to apply the overrides of this clone in `config.local`, as DVC does. The result must not be
+                  written back to [path] then, as it would share them with other clones.
+    :return:
+    """
+    config = configparser.ConfigParser(interpolation=None)
+    # DVC option names are case sensitive
+    config.optionxform = str
     try:
-        remotes_raw = subprocess.check_output("dvc remote list", shell=True, stderr=subprocess.DEVNULL).decode("utf-8")
-        remotes = [x.split("\t") for x in remotes_raw.strip().split("\n") if len(x.split("\t")) == 2]
-        for remote in remotes:
-            if remote[0] == "storage":
-                return remote[1].strip()
+        config.read([path, f"{path}.local"] if local else [path])
+    except configparser.Error as e:
+        raise EdgeException(f"Unable to parse DVC config '{path}':\n{str(e)}")
+    return config
+
+
+def quote_value(value: str) -> str:
+    """
+    Quote a value for DVC, which would otherwise read a value with a comma as a list, and drop everything after `#`
+    """
+    if any(character in value for character in ",#") or value != value.strip():
+        return f"'{value}'" if '"' in value else f'"{value}"'
+    return value
+
+
+def unquote_value(value: str) -> str:
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def write_dvc_config(config: configparser.ConfigParser, path: str = DVC_CONFIG_PATH):
+    """
+    Write the DVC repository config atomically, so that DVC never sees a partially written file
+
+    :param config:
+    :param path:
+    :return:
+    """
+    directory = os.path.dirname(path) or "."
+    with tempfile.NamedTemporaryFile("w", dir=directory, prefix=".config.", delete=False) as f:
+        config.write(f)
+        temporary_path = f.name
+    os.replace(temporary_path, path)
+
+
+def dvc_remote_exists(path: str, config: Optional[configparser.ConfigParser] = None) -> (bool, bool):
+    """
+    :return: whether the vertex:edge remote exists, and whether it points to [path]
+    """
+    configured_path = get_dvc_storage_path(config)
+    return configured_path is not None, configured_path == path
+
+
+def get_dvc_storage_path(config: Optional[configparser.ConfigParser] = None) -> Optional[str]:
+    config = config if config is not None else read_dvc_config()
+    section = remote_section(REMOTE_NAME)
+    if not config.has_option(section, "url"):
         return None
-    except subprocess.CalledProcessError as e:
-        raise EdgeException(f"Unexpected error occurred while getting DVC remote storage path:\n{str(e)}")
+    return unquote_value(config.get(section, "url"))
+
+
+def get_dvc_cache_dir(config: Optional[configparser.ConfigParser] = None) -> str:
+    """
+    Get the DVC cache directory, which DVC resolves relative to the `.dvc` directory
+    """
+    config = config if config is not None else read_dvc_config(local=True)
+    return os.path.normpath(os.path.join(".dvc", unquote_value(config.get("cache", "dir", fallback="cache"))))
+
+
+def get_dvc_remote_jobs(config: Optional[configparser.ConfigParser] = None) -> Optional[int]:
+    """
+    Get the number of parallel transfers configured for the vertex:edge remote, if any
+    """
+    config = config if config is not None else read_dvc_config()
+    jobs = config.get(remote_section(REMOTE_NAME), "jobs", fallback=None)
+    return int(unquote_value(jobs)) if jobs is not None else None
 
 
 def dvc_add_remote(path: str):
     with StepTUI("Configuring DVC remote storage", emoji="⚙️"):
         with SubStepTUI(f"Adding '{path}' as DVC remote storage URI") as sub_step:
-            try:
-                storage_exists, correct_path = dvc_remote_exists(path)
-                if storage_exists:
-                    if correct_path:
-                        return
-                    else:
-                        sub_step.update(f"Modifying existing storage URI to '{path}'")
-                        subprocess.check_output(
-                            f"dvc remote modify storage url {path} && dvc remote default storage", shell=True,
-                            stderr=subprocess.DEVNULL
-                        )
-                else:
-                    subprocess.check_output(f"dvc remote add storage {path} && dvc remote default storage", shell=True,
-                                            stderr=subprocess.DEVNULL)
-            except subprocess.CalledProcessError as e:
-                raise EdgeException(f"Unexpected error occurred while adding remote storage to DVC:\n{str(e)}")
+            config = read_dvc_config()
+            storage_exists, correct_path = dvc_remote_exists(path, config)
+            if storage_exists and correct_path and config.get("core", "remote", fallback=None) == REMOTE_NAME:
+                return
+            if storage_exists and not correct_path:
+                sub_step.update(f"Modifying existing storage URI to '{path}'")
+            section = remote_section(REMOTE_NAME)
+            if not config.has_section(section):
+                config.add_section(section)
+            config.set(section, "url", quote_value(path))
+            if not config.has_section("core"):
+                config.add_section("core")
+            config.set("core", "remote", REMOTE_NAME)
+            write_dvc_config(config)
+
+
+# ioctl that clones a file on copy-on-write filesystems (Btrfs, XFS), see ioctl_ficlone(2)
+FICLONE = 0x40049409
+
+
+def _probe_reflink(source_path: str, target_path: str) -> bool:
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    with open(source_path, "rb") as source, open(target_path, "wb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except OSError:
+            return False
+    return True
+
+
+def detect_cache_types(cache_dir: str, workspace_dir: str = ".") -> List[str]:
+    """
+    Find out which kinds of links can be made from the DVC cache to the workspace, fastest first
+
+    Reflinks are copy-on-write copies, which are as fast as links but leave workspace files editable. Hardlinks and
+    symlinks are nearly as fast, but DVC makes linked files read-only, so they must be unprotected before editing.
+
+    :param cache_dir:
+    :param workspace_dir:
+    :return: supported cache types, out of "reflink", "hardlink" and "symlink"
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    supported = []
+    with tempfile.TemporaryDirectory(dir=workspace_dir, prefix=".edge-link-probe-") as workspace_probe_dir:
+        with tempfile.NamedTemporaryFile(dir=cache_dir, prefix=".edge-link-probe-") as source:
+            source.write(b"vertex:edge")
+            source.flush()
+            probes = {
+                "reflink": lambda target: _probe_reflink(source.name, target),
+                "hardlink": lambda target: os.link(source.name, target),
+                "symlink": lambda target: os.symlink(os.path.abspath(source.name), target),
+            }
+            for cache_type, probe in probes.items():
+                target = os.path.join(workspace_probe_dir, cache_type)
+                try:
+                    if probe(target) is not False:
+                        supported.append(cache_type)
+                except OSError:
+                    pass
+    return supported
+
+
+def get_default_jobs() -> int:
+    """
+    Number of parallel transfers to and from the remote. Transfers mostly wait on the network rather than the CPU,
+    so this is a multiple of the CPU count.
+    """
+    return min(8 * (os.cpu_count() or 1), 64)
+
+
+def get_performance_profile(shared_cache_dir: Optional[str] = None) -> DvcPerformanceConfig:
+    """
+    Choose DVC cache and remote settings for this machine
+
+    :param shared_cache_dir: cache directory shared by all clones on the machine, if any
+    :return:
+    """
+    cache_dir = shared_cache_dir or os.path.join(".dvc", "cache")
+    supported = detect_cache_types(cache_dir)
+    if "reflink" in supported:
+        # Nothing is faster, and files stay editable
+        cache_types = ["reflink"]
+    else:
+        cache_types = [cache_type for cache_type in ["hardlink", "symlink"] if cache_type in supported]
+    # Other clones may be on filesystems where none of these links work
+    cache_types.append("copy")
+    return DvcPerformanceConfig(
+        cache_type=",".join(cache_types),
+        jobs=get_default_jobs(),
+        shared_cache_dir=shared_cache_dir,
+    )
+
+
+def dvc_configure_performance(performance: DvcPerformanceConfig):
+    """
+    Write a performance profile to the DVC config. Cache settings depend on this machine, so they are written to the
+    config of this clone, like `dvc cache dir --local` does, rather than to the config shared through git. Settings
+    that are not part of the profile are left as they are.
+
+    :param performance:
+    :return:
+    """
+    config = read_dvc_config()
+    section = remote_section(REMOTE_NAME)
+    if not config.has_section(section):
+        raise EdgeException(f"DVC remote '{REMOTE_NAME}' is not configured")
+    config.set(section, "jobs", str(performance.jobs))
+    write_dvc_config(config)
+
+    local_config = read_dvc_config(DVC_LOCAL_CONFIG_PATH)
+    if not local_config.has_section("cache"):
+        local_config.add_section("cache")
+    local_config.set("cache", "type", performance.cache_type)
+    if performance.shared_cache_dir is not None:
+        os.makedirs(performance.shared_cache_dir, exist_ok=True)
+        local_config.set("cache", "dir", quote_value(performance.shared_cache_dir))
+        # Let every member of the group read and write cache files added by the others
+        local_config.set("cache", "shared", "group")
+    write_dvc_config(local_config, DVC_LOCAL_CONFIG_PATH)
+
+
+def setup_dvc_performance(performance: Optional[DvcPerformanceConfig]) -> Optional[DvcPerformanceConfig]:
+    """
+    Apply the DVC performance profile recorded in vertex:edge config, or offer to choose one if there is none
+
+    :param performance: profile recorded in vertex:edge config, if any
+    :return: profile to record in vertex:edge config
+    """
+    with StepTUI("Configuring DVC performance", emoji="🚀"):
+        if performance is None:
+            with SubStepTUI("Choosing DVC performance profile", status=TUIStatus.NEUTRAL) as sub_step:
+                sub_step.add_explanation(
+                    "By default, DVC copies files between its cache and the workspace, which is slow and doubles "
+                    "disk usage for large datasets. vertex:edge can link them instead, using the fastest kind "
+                    "of link this filesystem supports, and transfer more files to and from the bucket in parallel. "
+                    "Optionally, a cache directory can be shared by all clones on this machine."
+                )
+                to_tune = questionary.confirm(
+                    "Do you want to configure DVC for performance?",
+                    default=True,
+                    qmark=qmark
+                ).ask()
+                if to_tune is None:
+                    raise EdgeException("Canceled by user")
+                if not to_tune:
+                    sub_step.update("Keeping DVC defaults", status=TUIStatus.NEUTRAL)
+                    return None
+                shared_cache_dir = questionary.text(
+                    "Shared cache directory (leave empty to keep the cache in this clone):",
+                    default="",
+                    qmark=qmark
+                ).ask()
+                if shared_cache_dir is None:
+                    raise EdgeException("Canceled by user")
+                shared_cache_dir = shared_cache_dir.strip()
+                shared_cache_dir = os.path.abspath(os.path.expanduser(shared_cache_dir)) if shared_cache_dir else None
+            with SubStepTUI("Detecting supported cache link types") as sub_step:
+                performance = get_performance_profile(shared_cache_dir)
+                sub_step.update(f"Using cache types '{performance.cache_type}', with {performance.jobs} "
+                                f"parallel transfers")
+        with SubStepTUI("Writing DVC cache and remote configuration") as sub_step:
+            dvc_configure_performance(performance)
+            if performance.cache_type.split(",")[0] in ["hardlink", "symlink"]:
+                sub_step.add_explanation(
+                    "DVC makes linked files read-only. Run `dvc unprotect <path>` before editing a tracked file, "
+                    "and `dvc checkout --relink` to link files that were checked out before."
+                )
+    return performance
 
 
 def setup_dvc(bucket_path: str, dvc_store_directory: str):
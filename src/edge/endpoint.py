@@ -2,12 +2,14 @@
 Performing operations on Vertex AI endpoints
 """
 import re
-from typing import Optional
+import threading
+from typing import Optional, Dict, Set, List
 from google.cloud import aiplatform
+from google.cloud.aiplatform.compat.types import endpoint as gca_endpoint
 from google.api_core.exceptions import PermissionDenied
-from .config import EdgeConfig
+from google.protobuf import field_mask_pb2
 from .exception import EdgeException
-from .state import ModelState, EdgeState
+from .state import ModelState
 from .tui import StepTUI, SubStepTUI, TUIStatus
 
 
@@ -83,7 +85,141 @@ def setup_endpoint(project_id: str, region: str, endpoint_name: str) -> ModelSta
             return ModelState(endpoint_resource_name=endpoint_resource_name)
 
 
+_endpoint_locks: Dict[str, threading.RLock] = {}
+_endpoint_locks_lock = threading.Lock()
+
+
+def endpoint_lock(endpoint_resource_name: str) -> threading.RLock:
+    """
+    Lock serialising changes to an endpoint from this process. Vertex AI rejects concurrent deployments on the same
+    endpoint, and traffic splits must be computed from the latest state of the endpoint.
+
+    :param endpoint_resource_name:
+    :return:
+    """
+    with _endpoint_locks_lock:
+        return _endpoint_locks.setdefault(endpoint_resource_name, threading.RLock())
+
+
+def apportion(total: int, weights: Dict[str, float]) -> Dict[str, int]:
+    """
+    Split [total] percent in proportion to [weights], in whole percentages that add up to [total]
+
+    :param total:
+    :param weights:
+    :return:
+    """
+    weight_sum = sum(weights.values())
+    if weight_sum <= 0:
+        return {}
+    exact = {key: total * weight / weight_sum for key, weight in weights.items()}
+    result = {key: int(value) for key, value in exact.items()}
+    # Hand the percentages lost to rounding down to the largest remainders
+    for key in sorted(exact, key=lambda k: exact[k] - result[k], reverse=True)[:total - sum(result.values())]:
+        result[key] += 1
+    return {key: value for key, value in result.items() if value > 0}
+
+
+def count_models(endpoint: aiplatform.Endpoint, deployed_model_ids: Set[str]) -> int:
+    """
+    Count the models that deployed models belong to. A deployed model has the display name of the Vertex AI model it
+    was deployed from, which is the vertex:edge model name, so the versions of a model that are deployed at the same
+    time, e.g. during a canary rollout, count once.
+
+    :param endpoint:
+    :param deployed_model_ids:
+    :return:
+    """
+    display_names = {deployed_model.id: deployed_model.display_name for deployed_model in endpoint.list_models()}
+    return len({display_names.get(deployed_model_id) or deployed_model_id for deployed_model_id in deployed_model_ids})
+
+
+def set_model_traffic(endpoint: aiplatform.Endpoint, owned_ids: Set[str], weights: Dict[str, float]):
+    """
+    Route the traffic of one model to its deployed models in proportion to [weights], without changing the traffic
+    of other models co-hosted on the same endpoint. A model that receives no traffic yet gets an equal part of the
+    endpoint's traffic with each of the other models, taken proportionally from their deployed models. With no
+    weights, the model's traffic is handed to the other models.
+
+    :param endpoint:
+    :param owned_ids: ids of the deployed models that belong to the model
+    :param weights: deployed model id -> weight within the model's traffic
+    :return:
+    """
+    with endpoint_lock(endpoint.resource_name):
+        endpoint._sync_gca_resource()
+        others = {
+            deployed_model_id: percentage
+            for deployed_model_id, percentage in endpoint._gca_resource.traffic_split.items()
+            if deployed_model_id not in owned_ids and deployed_model_id not in weights and percentage > 0
+        }
+        if sum(weights.values()) <= 0:
+            set_traffic_split(endpoint, apportion(100, others))
+            return
+        share = 100 - sum(others.values())
+        if share <= 0:
+            share = 100 // (count_models(endpoint, set(others)) + 1)
+            others = apportion(100 - share, others)
+        set_traffic_split(endpoint, {**others, **apportion(share, weights)})
+
+
+def set_traffic_split(endpoint: aiplatform.Endpoint, traffic_split: Dict[str, int]):
+    """
+    Replace the traffic split of an endpoint in a single update, so that requests move between deployed models
+    atomically
+
+    :param endpoint:
+    :param traffic_split: deployed model id -> percentage of traffic, adding up to 100
+    :return:
+    """
+    endpoint.api_client.update_endpoint(
+        endpoint=gca_endpoint.Endpoint(name=endpoint.resource_name, traffic_split=traffic_split),
+        update_mask=field_mask_pb2.FieldMask(paths=["traffic_split"]),
+    )
+    endpoint._sync_gca_resource()
+
+
 def tear_down_endpoint(endpoint_resource_name: str):
     endpoint = aiplatform.Endpoint(endpoint_resource_name)
     endpoint.undeploy_all()
     endpoint.delete()
+
+
+def get_owned_deployed_model_ids(endpoint: aiplatform.Endpoint, model_state: ModelState, shared: bool) -> Set[str]:
+    """
+    Get the deployed models on [endpoint] that belong to a model. On a dedicated endpoint these are all deployed
+    models, while on a shared endpoint they are the ones recorded in the model's state.
+
+    :param endpoint:
+    :param model_state:
+    :param shared: whether other models are co-hosted on the endpoint
+    :return:
+    """
+    deployed_model_ids = set(deployed_model.id for deployed_model in endpoint.list_models())
+    if not shared:
+        return deployed_model_ids
+    recorded = {model_state.deployed_model_id, model_state.standby_deployed_model_id}
+    if model_state.rollout is not None:
+        recorded |= {model_state.rollout.candidate_deployed_model_id, model_state.rollout.baseline_deployed_model_id}
+    return deployed_model_ids & recorded
+
+
+def remove_model_from_endpoint(model_state: ModelState, shared_with: List[str]):
+    """
+    Remove a model from its endpoint. A dedicated endpoint is deleted, while on a shared endpoint only the model's
+    own deployed models are undeployed, after handing their traffic to the other models.
+
+    :param model_state:
+    :param shared_with: names of the other models on the endpoint
+    :return:
+    """
+    if not shared_with:
+        tear_down_endpoint(model_state.endpoint_resource_name)
+        return
+    endpoint = aiplatform.Endpoint(model_state.endpoint_resource_name)
+    with endpoint_lock(endpoint.resource_name):
+        owned_ids = get_owned_deployed_model_ids(endpoint, model_state, shared=True)
+        if owned_ids:
+            set_model_traffic(endpoint, owned_ids, {})
+        for deployed_model_id in owned_ids:
+            endpoint.undeploy(deployed_model_id)
@@ -0,0 +1,329 @@
+"""
+Querying experiments recorded by Sacred, either in the experiment tracker database or in the local experiment store
+"""
+import datetime
+import json
+import os
+import sqlite3
+from typing import Optional, Dict, Any, List, Iterable
+
+import pymongo
+from pymongo.database import Database
+
+from edge.config import EdgeConfig
+from edge.exception import EdgeException
+from edge.local_experiments import connect
+from edge.path import get_default_config_path, get_local_experiments_path
+from edge.sacred import get_connection_string, get_mongo_database
+
+# Number of documents fetched from the server per cursor round trip
+BATCH_SIZE = 500
+
+RUN_SUMMARY_PROJECTION = {
+    "_id": 1,
+    "experiment.name": 1,
+    "status": 1,
+    "start_time": 1,
+    "stop_time": 1,
+    "result": 1,
+}
+
+SORT_FIELDS = {
+    "start_time": "start_time",
+    "result": "result",
+}
+
+
+def get_experiment_store(config: EdgeConfig, local: bool = False):
+    """
+    Get the store to query experiments from: the experiment tracker if it has been initialised,
+    or the local experiment store otherwise
+
+    :param config:
+    :param local: query the local experiment store even if the experiment tracker has been initialised. Runs are
+                  tracked locally when the tracker cannot be reached.
+    :return:
+    """
+    if local or config.experiments is None:
+        local_store_path = get_local_experiments_path(os.path.dirname(os.path.abspath(get_default_config_path())))
+        if os.path.exists(local_store_path):
+            return SQLiteExperimentStore(local_store_path)
+        if local:
+            raise EdgeException("No experiments have been tracked locally")
+    return MongoExperimentStore(get_tracker_database(config))
+
+
+def get_tracker_database(config: EdgeConfig) -> Database:
+    """
+    Get the experiment tracker database configured in vertex:edge
+
+    :param config:
+    :return:
+    """
+    if config.experiments is None:
+        raise EdgeException("Experiment tracker has not been initialised. "
+                            "Initialise it by running `./edge.sh experiments init`")
+    connection_string = get_connection_string(
+        config.google_cloud_project.project_id,
+        config.experiments.mongodb_connection_string_secret
+    )
+    return get_mongo_database(connection_string)
+
+
+def parse_config_filters(filters: Optional[List[str]]) -> Dict[str, Any]:
+    """
+    Parse `key=value` filters on run configuration. Values are parsed as JSON where possible, e.g. `epochs=10`
+    matches an integer, and `optimizer=adam` matches a string.
+
+    :param filters:
+    :return:
+    """
+    query = {}
+    for config_filter in filters or []:
+        if "=" not in config_filter:
+            raise EdgeException(f"Config filter '{config_filter}' must be in the form key=value")
+        key, value = config_filter.split("=", 1)
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+        query[f"config.{key.strip()}"] = value
+    return query
+
+
+class MongoExperimentStore:
+    """
+    Experiments recorded by Sacred's MongoObserver in the experiment tracker
+    """
+
+    name = "experiment tracker"
+
+    def __init__(self, database: Database):
+        self.database = database
+
+    def find_runs(
+        self,
+        experiment_name: Optional[str] = None,
+        status: Optional[str] = None,
+        config_filters: Optional[List[str]] = None,
+        sort_by: str = "start_time",
+        ascending: bool = False,
+        limit: int = 20,
+    ) -> Iterable[Dict[str, Any]]:
+        """
+        Find runs matching the filters, returning only summary fields
+
+        :return: an iterable over run documents
+        """
+        if sort_by not in SORT_FIELDS:
+            raise EdgeException(f"Runs can only be sorted by one of: {', '.join(SORT_FIELDS.keys())}")
+
+        query = parse_config_filters(config_filters)
+        if experiment_name is not None:
+            query["experiment.name"] = experiment_name
+        if status is not None:
+            query["status"] = status.upper()
+
+        return self.database.runs.find(
+            query,
+            projection=RUN_SUMMARY_PROJECTION,
+            sort=[(SORT_FIELDS[sort_by], pymongo.ASCENDING if ascending else pymongo.DESCENDING)],
+            limit=limit,
+            batch_size=min(limit, BATCH_SIZE) if limit > 0 else BATCH_SIZE,
+        )
+
+    def get_run(self, run_id: int) -> Dict[str, Any]:
+        run = self.database.runs.find_one(
+            {"_id": run_id},
+            projection={"_id": 1, "experiment.name": 1, "status": 1, "start_time": 1, "stop_time": 1, "result": 1,
+                        "config": 1, "info": 1, "host.hostname": 1, "fail_trace": 1},
+        )
+        if run is None:
+            raise EdgeException(f"Run {run_id} is not found in the {self.name}")
+        return run
+
+    def get_runs(self, run_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Get status, result and config of [run_ids]
+
+        :param run_ids:
+        :return: run id -> run document
+        """
+        return {
+            run["_id"]: run
+            for run in self.database.runs.find(
+                {"_id": {"$in": run_ids}},
+                projection={"_id": 1, "config": 1, "result": 1, "status": 1},
+                batch_size=BATCH_SIZE,
+            )
+        }
+
+    def get_last_metric_values(self, run_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Get the last logged value of every metric for each of [run_ids]
+
+        :param run_ids:
+        :return: run id -> metric name -> last value
+        """
+        metrics = {run_id: {} for run_id in run_ids}
+        cursor = self.database.metrics.find(
+            {"run_id": {"$in": run_ids}},
+            projection={"_id": 0, "run_id": 1, "name": 1, "values": {"$slice": -1}},
+            batch_size=BATCH_SIZE,
+        )
+        for metric in cursor:
+            if metric.get("values"):
+                metrics[metric["run_id"]][metric["name"]] = metric["values"][-1]
+        return metrics
+
+
+class SQLiteExperimentStore:
+    """
+    Experiments recorded by SQLiteObserver in the local experiment store.
+    Runs are returned in the same shape as Sacred's MongoDB documents.
+    """
+
+    name = "local experiment store"
+
+    def __init__(self, path: str):
+        self.connection = connect(path)
+
+    @staticmethod
+    def _document(row: sqlite3.Row) -> Dict[str, Any]:
+        def parse_time(value: Optional[str]) -> Optional[datetime.datetime]:
+            return datetime.datetime.fromisoformat(value) if value is not None else None
+
+        def parse_json(value: Optional[str]) -> Any:
+            return json.loads(value) if value is not None else None
+
+        document = {"_id": row["id"]}
+        keys = row.keys()
+        if "experiment_name" in keys:
+            document["experiment"] = {"name": row["experiment_name"]}
+        for key in ["status"]:
+            if key in keys:
+                document[key] = row[key]
+        for key in ["start_time", "stop_time"]:
+            if key in keys:
+                document[key] = parse_time(row[key])
+        for key in ["result", "config", "info", "fail_trace"]:
+            if key in keys:
+                document[key] = parse_json(row[key])
+        if "host" in keys:
+            document["host"] = {"hostname": (parse_json(row["host"]) or {}).get("hostname")}
+        return document
+
+    def find_runs(
+        self,
+        experiment_name: Optional[str] = None,
+        status: Optional[str] = None,
+        config_filters: Optional[List[str]] = None,
+        sort_by: str = "start_time",
+        ascending: bool = False,
+        limit: int = 20,
+    ) -> Iterable[Dict[str, Any]]:
+        if sort_by not in SORT_FIELDS:
+            raise EdgeException(f"Runs can only be sorted by one of: {', '.join(SORT_FIELDS.keys())}")
+
+        conditions, parameters = [], []
+        if experiment_name is not None:
+            conditions.append("experiment_name = ?")
+            parameters.append(experiment_name)
+        if status is not None:
+            conditions.append("status = ?")
+            parameters.append(status.upper())
+        for key, value in parse_config_filters(config_filters).items():
+            path = f"$.{key[len('config.'):]}"
+            if value is None:
+                # Like MongoDB, null also matches runs without the key
+                conditions.append("json_extract(config, ?) IS NULL")
+                parameters.append(path)
+            elif isinstance(value, (list, dict)):
+                # Arrays and objects are extracted as minified JSON text
+                conditions.append("json_extract(config, ?) = json(?)")
+                parameters.extend([path, json.dumps(value)])
+            else:
+                conditions.append("json_extract(config, ?) = ?")
+                parameters.extend([path, value])
+
+        order = {"start_time": "start_time", "result": "json_extract(result, '$')"}[sort_by]
+        cursor = self.connection.execute(
+            "SELECT id, experiment_name, status, start_time, stop_time, result FROM runs "
+            f"{'WHERE ' + ' AND '.join(conditions) if conditions else ''} "
+            f"ORDER BY {order} {'ASC' if ascending else 'DESC'} "
+            f"{'LIMIT ' + str(int(limit)) if limit > 0 else ''}",
+            parameters,
+        )
+        return (self._document(row) for row in cursor)
+
+    def get_run(self, run_id: int) -> Dict[str, Any]:
+        row = self.connection.execute(
+            "SELECT id, experiment_name, status, start_time, stop_time, result, config, info, host, fail_trace "
+            "FROM runs WHERE id = ?",
+            (run_id,),
+        ).fetchone()
+        if row is None:
+            raise EdgeException(f"Run {run_id} is not found in the {self.name}")
+        return self._document(row)
+
+    def get_runs(self, run_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        cursor = self.connection.execute(
+            f"SELECT id, status, result, config FROM runs WHERE id IN ({', '.join('?' * len(run_ids))})",
+            run_ids,
+        )
+        return {row["id"]: self._document(row) for row in cursor}
+
+    def get_last_metric_values(self, run_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        metrics = {run_id: {} for run_id in run_ids}
+        # SQLite returns the value from the row holding MAX(step) when the aggregate is used on its own
+        cursor = self.connection.execute(
+            "SELECT run_id, name, value, MAX(step) FROM metrics "
+            f"WHERE run_id IN ({', '.join('?' * len(run_ids))}) GROUP BY run_id, name",
+            run_ids,
+        )
+        for row in cursor:
+            metrics[row["run_id"]][row["name"]] = row["value"]
+        return metrics
+
+
+def flatten(document: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    flat = {}
+    for key, value in document.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare_runs(store, run_ids: List[int]) -> Dict[str, Dict[int, Any]]:
+    """
+    Compare config, result and last metric values of [run_ids]. Config values that are the same for all runs
+    are left out.
+
+    :param store: MongoExperimentStore or SQLiteExperimentStore
+    :param run_ids:
+    :return: field -> run id -> value
+    """
+    runs = store.get_runs(run_ids)
+    missing = [str(run_id) for run_id in run_ids if run_id not in runs]
+    if missing:
+        raise EdgeException(f"Runs {', '.join(missing)} are not found in the {store.name}")
+
+    configs = {run_id: flatten(runs[run_id].get("config", {})) for run_id in run_ids}
+    keys = sorted(set(key for config in configs.values() for key in config.keys()))
+
+    comparison = {
+        "status": {run_id: runs[run_id].get("status") for run_id in run_ids},
+        "result": {run_id: runs[run_id].get("result") for run_id in run_ids},
+    }
+    for key in keys:
+        values = {run_id: configs[run_id].get(key) for run_id in run_ids}
+        if len(set(json.dumps(v, sort_keys=True, default=str) for v in values.values())) > 1:
+            comparison[f"config.{key}"] = values
+
+    metrics = store.get_last_metric_values(run_ids)
+    for name in sorted(set(name for run_metrics in metrics.values() for name in run_metrics.keys())):
+        comparison[f"metrics.{name}"] = {run_id: metrics[run_id].get(name) for run_id in run_ids}
+
+    return comparison
@@ -0,0 +1,210 @@
+"""
+Exporting experiment runs and metrics into columnar NumPy shards for offline analysis
+
+Exports are incremental. For every filter an export has been run with, the manifest records the highest run id the
+export has got to, and the runs up to it that had not finished yet. The next export picks up runs after that id, and
+the unfinished runs once they finish.
+"""
+import datetime
+import json
+import numbers
+import os
+import re
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any
+
+import numpy as np
+from pymongo.database import Database
+
+from edge.experiments import BATCH_SIZE, flatten
+
+MANIFEST_FILE = "manifest.json"
+# Statuses of runs that have not finished yet, and may still log metrics
+UNFINISHED_STATUSES = ["QUEUED", "RUNNING"]
+# Manifest key of exports of every experiment
+ALL_EXPERIMENTS = "*"
+
+
+@dataclass
+class ExportReport:
+    runs: int = 0
+    metric_points: int = 0
+    shards: int = 0
+    last_run_id: Optional[int] = None
+    # Runs that have not finished yet, and will be exported once they do
+    unfinished_runs: int = 0
+    # Metric values that are not numbers, which are exported as NaN
+    non_numeric_values: int = 0
+
+
+def _load_manifest(output_dir: str) -> Dict[str, Any]:
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"exports": {}, "shards": []}
+
+
+def _save_manifest(output_dir: str, manifest: Dict[str, Any]):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def _column(values: List[Any]) -> np.ndarray:
+    """
+    Convert a list of values into a typed column. Numeric columns use NaN for missing values,
+    anything else is stored as strings.
+    """
+    present = [v for v in values if v is not None]
+    if all(isinstance(v, bool) for v in present) and present:
+        return np.array([np.nan if v is None else float(v) for v in values])
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return np.array([np.nan if v is None else v for v in values], dtype=float)
+    if all(isinstance(v, datetime.datetime) for v in present):
+        return np.array([np.datetime64("NaT") if v is None else np.datetime64(v, "ms") for v in values],
+                        dtype="datetime64[ms]")
+    return np.array(["" if v is None else (v if isinstance(v, str) else json.dumps(v, default=str))
+                     for v in values], dtype=str)
+
+
+def _run_columns(runs: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    rows = []
+    for run in runs:
+        row = {
+            "run_id": run["_id"],
+            "experiment": run.get("experiment", {}).get("name"),
+            "status": run.get("status"),
+            "start_time": run.get("start_time"),
+            "stop_time": run.get("stop_time"),
+            "result": run.get("result"),
+        }
+        row.update(flatten(run.get("config", {}), "config."))
+        rows.append(row)
+    keys = list(dict.fromkeys(key for row in rows for key in row.keys()))
+    return {key: _column([row.get(key) for row in rows]) for key in keys}
+
+
+def _metric_value(value: Any) -> float:
+    """
+    Convert a logged metric value into a float. Sacred logs whatever it is given, so values that are not numbers,
+    e.g. strings or lists, are converted into NaN.
+    """
+    if isinstance(value, numbers.Real):
+        return float(value)
+    return np.nan
+
+
+def _metric_columns(database: Database, run_ids: List[int], report: ExportReport) -> Dict[str, np.ndarray]:
+    """
+    Metrics are exported in long format: one element per logged point, with all arrays aligned
+    """
+    run_id, name, step, value, timestamp = [], [], [], [], []
+    for metric in database.metrics.find({"run_id": {"$in": run_ids}}, batch_size=BATCH_SIZE):
+        values = metric.get("values", [])
+        run_id.append(np.full(len(values), metric["run_id"], dtype=np.int64))
+        name.extend([metric["name"]] * len(values))
+        step.append(np.asarray(metric.get("steps", range(len(values))), dtype=np.int64))
+        value.append(np.array([_metric_value(v) for v in values], dtype=float))
+        report.non_numeric_values += sum(1 for v in values if v is not None and not isinstance(v, numbers.Real))
+        timestamp.append(np.asarray(metric.get("timestamps", [None] * len(values)), dtype="datetime64[ms]"))
+
+    def concat(arrays: List[np.ndarray], dtype) -> np.ndarray:
+        return np.concatenate(arrays) if arrays else np.array([], dtype=dtype)
+
+    return {
+        "metric.run_id": concat(run_id, np.int64),
+        "metric.name": np.array(name, dtype=str),
+        "metric.step": concat(step, np.int64),
+        "metric.value": concat(value, float),
+        "metric.timestamp": concat(timestamp, "datetime64[ms]"),
+    }
+
+
+def export_experiments(
+    database: Database,
+    output_dir: str,
+    shard_size: int = 1000,
+    experiment_name: Optional[str] = None,
+) -> ExportReport:
+    """
+    Export finished runs that have not been exported yet into [output_dir], [shard_size] runs per `.npz` shard.
+
+    Progress is recorded in a manifest after every shard, so an interrupted export resumes where it stopped, and only
+    one shard is held in memory at a time.
+
+    :param database:
+    :param output_dir:
+    :param shard_size:
+    :param experiment_name: only export runs of this experiment
+    :return:
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _load_manifest(output_dir)
+    export = manifest["exports"].setdefault(
+        ALL_EXPERIMENTS if experiment_name is None else experiment_name,
+        {"last_run_id": None, "unfinished_run_ids": []},
+    )
+    report = ExportReport(last_run_id=export["last_run_id"])
+
+    query = {}
+    if export["last_run_id"] is not None:
+        query["$or"] = [
+            {"_id": {"$gt": export["last_run_id"]}},
+            {"_id": {"$in": export["unfinished_run_ids"]}},
+        ]
+    if experiment_name is not None:
+        query["experiment.name"] = experiment_name
+
+    cursor = database.runs.find(
+        query,
+        projection={"_id": 1, "experiment.name": 1, "status": 1, "start_time": 1, "stop_time": 1, "result": 1,
+                    "config": 1},
+        sort=[("_id", 1)],
+        batch_size=min(shard_size, BATCH_SIZE),
+    )
+    # Shards exported with a filter are named after it, so that exports with different filters do not collide
+    suffix = "" if experiment_name is None else "-" + re.sub(r"[^A-Za-z0-9_.-]", "_", experiment_name)
+    unfinished = set(export["unfinished_run_ids"])
+
+    def save_progress(last_run_id: Optional[int]):
+        if last_run_id is not None and (export["last_run_id"] is None or last_run_id > export["last_run_id"]):
+            export["last_run_id"] = last_run_id
+        export["unfinished_run_ids"] = sorted(unfinished)
+        _save_manifest(output_dir, manifest)
+        report.last_run_id = export["last_run_id"]
+
+    def write_shard(runs: List[Dict[str, Any]], last_run_id: int):
+        run_ids = [run["_id"] for run in runs]
+        columns = _run_columns(runs)
+        metrics = _metric_columns(database, run_ids, report)
+        file_name = f"runs-{run_ids[0]:08d}-{run_ids[-1]:08d}{suffix}.npz"
+        np.savez_compressed(os.path.join(output_dir, file_name), **columns, **metrics)
+
+        manifest["shards"].append(file_name)
+        save_progress(last_run_id)
+
+        report.runs += len(runs)
+        report.metric_points += len(metrics["metric.value"])
+        report.shards += 1
+
+    shard = []
+    last_seen = None
+    for run in cursor:
+        last_seen = run["_id"]
+        if run.get("status") in UNFINISHED_STATUSES:
+            unfinished.add(run["_id"])
+            continue
+        unfinished.discard(run["_id"])
+        shard.append(run)
+        if len(shard) >= shard_size:
+            write_shard(shard, last_seen)
+            shard = []
+    if shard:
+        write_shard(shard, last_seen)
+    else:
+        save_progress(last_seen)
+
+    report.unfinished_runs = len(unfinished)
+    return report
@@ -0,0 +1,138 @@
+"""
+Local experiment store, used when the experiment tracker has not been initialised.
+
+Runs and metrics are recorded by a Sacred observer into a SQLite database under `.edge/experiments/`
+"""
+import datetime
+import json
+import os
+import sqlite3
+import threading
+from typing import Optional, Any, Dict
+
+from sacred.observers import RunObserver
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    experiment_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    start_time TEXT,
+    stop_time TEXT,
+    heartbeat TEXT,
+    command TEXT,
+    host TEXT,
+    config TEXT,
+    info TEXT,
+    result TEXT,
+    fail_trace TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_experiment_name ON runs (experiment_name);
+CREATE INDEX IF NOT EXISTS runs_status ON runs (status);
+CREATE INDEX IF NOT EXISTS runs_start_time ON runs (start_time);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    step INTEGER,
+    value REAL,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS metrics_run_id ON metrics (run_id, name, step);
+"""
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Open the local experiment store at [path], creating it if needed
+
+    :param path:
+    :return:
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    # WAL lets queries run while a training script is writing, and makes frequent small commits cheap
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def to_json(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return json.dumps(value, default=str)
+
+
+def to_time(value: Optional[datetime.datetime]) -> Optional[str]:
+    if value is None:
+        return None
+    return value.isoformat()
+
+
+class SQLiteObserver(RunObserver):
+    """
+    Sacred observer that records runs into the local experiment store
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = connect(path)
+        self.run_id = None
+        # Sacred reports heartbeats and metrics from a background thread
+        self.lock = threading.Lock()
+
+    def _execute(self, sql: str, parameters: tuple = ()):
+        with self.lock, self.connection:
+            return self.connection.execute(sql, parameters)
+
+    def started_event(self, ex_info, command, host_info, start_time, config, meta_info, _id):
+        cursor = self._execute(
+            "INSERT INTO runs (id, experiment_name, status, start_time, heartbeat, command, host, config, info) "
+            "VALUES (?, ?, 'RUNNING', ?, ?, ?, ?, ?, '{}')",
+            (_id, ex_info["name"], to_time(start_time), to_time(start_time), command, to_json(host_info),
+             to_json(config)),
+        )
+        self.run_id = cursor.lastrowid if _id is None else _id
+        return self.run_id
+
+    def heartbeat_event(self, info, captured_out, beat_time, result):
+        self._execute(
+            "UPDATE runs SET info = ?, heartbeat = ?, result = ? WHERE id = ?",
+            (to_json(info), to_time(beat_time), to_json(result), self.run_id),
+        )
+
+    def completed_event(self, stop_time, result):
+        self._execute(
+            "UPDATE runs SET status = 'COMPLETED', stop_time = ?, result = ? WHERE id = ?",
+            (to_time(stop_time), to_json(result), self.run_id),
+        )
+
+    def interrupted_event(self, interrupt_time, status):
+        self._execute(
+            "UPDATE runs SET status = ?, stop_time = ? WHERE id = ?",
+            (status, to_time(interrupt_time), self.run_id),
+        )
+
+    def failed_event(self, fail_time, fail_trace):
+        self._execute(
+            "UPDATE runs SET status = 'FAILED', stop_time = ?, fail_trace = ? WHERE id = ?",
+            (to_time(fail_time), to_json(fail_trace), self.run_id),
+        )
+
+    def log_metrics(self, metrics_by_name: Dict[str, Dict[str, list]], info):
+        rows = [
+            (self.run_id, name, step, value, to_time(timestamp))
+            for name, metric in metrics_by_name.items()
+            for step, value, timestamp in zip(metric["steps"], metric["values"], metric["timestamps"])
+        ]
+        if rows:
+            with self.lock, self.connection:
+                self.connection.executemany(
+                    "INSERT INTO metrics (run_id, name, step, value, timestamp) VALUES (?, ?, ?, ?, ?)", rows
+                )
+
+    def __eq__(self, other):
+        if isinstance(other, SQLiteObserver):
+            return self.path == other.path
+        return False
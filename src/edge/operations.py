@@ -0,0 +1,63 @@
+"""
+Tracking Vertex AI long-running operations across CLI invocations
+"""
+import time
+from typing import Callable, Optional
+
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
+
+from edge.exception import EdgeException
+
+
+def get_operation(operation_name: str, session: Optional[AuthorizedSession] = None) -> dict:
+    """
+    Get the current status of a Vertex AI long-running operation
+
+    :param operation_name: projects/{project}/locations/{location}/.../operations/{operation_id}
+    :param session:
+    :return: the operation resource, with `done`, and `response` or `error` once done
+    """
+    if session is None:
+        credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+        session = AuthorizedSession(credentials)
+    location = operation_name.split("/")[3]
+    response = session.get(f"https://{location}-aiplatform.googleapis.com/v1/{operation_name}", timeout=60)
+    if response.status_code == 404:
+        raise EdgeException(f"Operation '{operation_name}' is not found. Operations are kept for a limited time "
+                            f"after they finish.")
+    if response.status_code != 200:
+        raise EdgeException(f"Unable to get operation '{operation_name}': HTTP {response.status_code} "
+                            f"{response.text[:200]}")
+    return response.json()
+
+
+def wait_for_operation(
+    operation_name: str,
+    on_poll: Optional[Callable[[dict], None]] = None,
+    poll_interval: float = 15,
+    timeout: Optional[float] = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> dict:
+    """
+    Poll an operation until it is done
+
+    :param operation_name:
+    :param on_poll: called with the operation after every poll
+    :param poll_interval:
+    :param timeout: give up after this many seconds
+    :param sleep:
+    :return: the finished operation
+    """
+    credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+    session = AuthorizedSession(credentials)
+    started = time.monotonic()
+    while True:
+        operation = get_operation(operation_name, session)
+        if on_poll is not None:
+            on_poll(operation)
+        if operation.get("done", False):
+            return operation
+        if timeout is not None and time.monotonic() - started > timeout:
+            raise EdgeException(f"Operation '{operation_name}' did not finish within {timeout:.0f}s")
+        sleep(poll_interval)
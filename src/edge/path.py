@@ -28,3 +28,15 @@ def get_model_dvc_pipeline(model_name: str):
 def get_vertex_model_json(model_name: str):
     return os.path.join(get_model_path(model_name), "trained_model.json")
 
+
+
+def get_cache_path():
+    # TODO: Document env var
+    path = os.environ.get("EDGE_CACHE_PATH")
+    if path is None:
+        path = os.path.join(os.path.expanduser("~"), ".cache", "vertex-edge")
+    return path
+
+
+def get_local_experiments_path(project_path: str):
+    return os.path.join(project_path, ".edge", "experiments", "experiments.db")
@@ -0,0 +1,210 @@
+"""
+Online prediction client for Vertex AI endpoints (and vertex:edge local serving)
+
+Individual instances are coalesced into micro-batches, which are sent concurrently over a pooled HTTP session,
+retried with exponential backoff, and returned in the order the instances were submitted.
+
+Example:
+
+    with PredictionClient.for_endpoint(endpoint_resource_name) as client:
+        for prediction in client.predict_stream(instances):
+            ...
+"""
+import collections
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, List, Iterable, Iterator, Optional
+
+import google.auth
+import requests
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+
+from edge.exception import EdgeException
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class PredictionError(EdgeException):
+    pass
+
+
+class PredictionClient:
+    def __init__(
+        self,
+        predict_url: str,
+        session: Optional[requests.Session] = None,
+        max_batch_size: int = 32,
+        max_latency_ms: float = 10,
+        max_concurrency: int = 8,
+        max_retries: int = 5,
+        backoff_seconds: float = 0.5,
+        timeout_seconds: float = 60,
+    ):
+        """
+        :param predict_url: URL of the `:predict` method
+        :param session: HTTP session to use, e.g. an authorised session for Vertex AI
+        :param max_batch_size: maximum number of instances sent in one request
+        :param max_latency_ms: how long an instance may wait for a batch to fill up before the batch is sent
+        :param max_concurrency: maximum number of requests in flight
+        :param max_retries: number of retries for failed requests
+        :param backoff_seconds: initial delay between retries, doubled after every attempt
+        :param timeout_seconds: timeout of a single request
+        """
+        self.predict_url = predict_url
+        self.session = session if session is not None else requests.Session()
+        # One connection per concurrent request, reused across batches
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout_seconds = timeout_seconds
+
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="edge-predict")
+        # Bound the number of batches waiting for a worker, and the number of instances waiting to be batched, so
+        # that callers of `predict` are blocked rather than queueing an unbounded number of instances
+        self._in_flight = threading.BoundedSemaphore(max_concurrency * 2)
+        self._pending = queue.Queue(maxsize=max_batch_size * max_concurrency * 2)
+        self._closed = False
+        self._batcher = threading.Thread(target=self._run_batcher, name="edge-predict-batcher", daemon=True)
+        self._batcher.start()
+
+    @classmethod
+    def for_endpoint(cls, endpoint_resource_name: str, **kwargs) -> "PredictionClient":
+        """
+        Create a client for a Vertex AI endpoint, authenticated with application default credentials
+
+        :param endpoint_resource_name: projects/{project}/locations/{location}/endpoints/{endpoint_id}
+        :param kwargs: see `PredictionClient.__init__`
+        :return:
+        """
+        location = endpoint_resource_name.split("/")[3]
+        credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+        return cls(
+            f"https://{location}-aiplatform.googleapis.com/v1/{endpoint_resource_name}:predict",
+            session=AuthorizedSession(credentials),
+            **kwargs,
+        )
+
+    def predict_batch(self, instances: List[Any]) -> List[Any]:
+        """
+        Send [instances] in a single request, retrying transient failures
+
+        :param instances:
+        :return: predictions, in the same order as [instances]
+        """
+        delay = self.backoff_seconds
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(
+                    self.predict_url, json={"instances": instances}, timeout=self.timeout_seconds
+                )
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    break
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                response = None
+                error = str(exc)
+            if attempt == self.max_retries:
+                raise PredictionError(f"Prediction request failed after {self.max_retries} retries: {error}")
+            time.sleep(delay * (0.5 + random.random()))
+            delay *= 2
+
+        if response.status_code != 200:
+            raise PredictionError(f"Prediction request failed with HTTP {response.status_code}: {response.text}")
+        predictions = response.json()["predictions"]
+        if len(predictions) != len(instances):
+            raise PredictionError(f"Expected {len(instances)} predictions, but received {len(predictions)}")
+        return predictions
+
+    def predict(self, instance: Any) -> Future:
+        """
+        Submit a single instance, to be sent with other instances in a micro-batch. Blocks while the client is
+        saturated, i.e. while as many instances as fill every concurrent request twice over are waiting.
+
+        :param instance:
+        :return: a future resolving to the prediction for [instance]
+        """
+        if self._closed:
+            raise PredictionError("Prediction client is closed")
+        future = Future()
+        self._pending.put((instance, future))
+        return future
+
+    def predict_stream(self, instances: Iterable[Any]) -> Iterator[Any]:
+        """
+        Predict a stream of instances, yielding predictions in input order. Only a bounded number of instances
+        is held in memory at a time.
+
+        :param instances:
+        :return:
+        """
+        window = collections.deque()
+        max_window = self.max_batch_size * self.max_concurrency * 2
+        for instance in instances:
+            window.append(self.predict(instance))
+            if len(window) >= max_window:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+    def _run_batcher(self):
+        stopping = False
+        while not stopping:
+            item = self._pending.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    # Stop after this batch. The queue may be full, so the marker is not put back.
+                    stopping = True
+                    break
+                batch.append(item)
+            self._in_flight.acquire()
+            self._executor.submit(self._send, batch)
+
+    def _send(self, batch):
+        try:
+            predictions = self.predict_batch([instance for instance, _ in batch])
+            for (_, future), prediction in zip(batch, predictions):
+                future.set_result(prediction)
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+        finally:
+            self._in_flight.release()
+
+    def close(self):
+        """
+        Send any pending instances, wait for requests in flight, and release connections
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._pending.put(None)
+        self._batcher.join()
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
@@ -0,0 +1,178 @@
+"""
+Waiting for Kubernetes resources to become ready, by watching them through the API server
+
+Each wait lists the resource once, then watches it from the resource version of that list. The API server pushes
+every change as it happens, instead of the resource being polled. Watches that fail with transient errors are
+retried with exponential backoff. Every wait gives up at an overall deadline, which concurrent waits can share.
+Waits take an API client, so they can be pointed at any API server.
+"""
+import time
+from typing import Any, Callable, Optional
+
+import urllib3
+from kubernetes import client, config, watch
+from kubernetes.client.rest import ApiException
+
+from edge.exception import EdgeException
+
+# Longest time a single watch request is kept open, after which the resource is listed again
+WATCH_TIMEOUT_SECONDS = 60
+INITIAL_BACKOFF_SECONDS = 1
+MAX_BACKOFF_SECONDS = 30
+# Statuses worth retrying: the resource version of a watch expired, throttling, and server errors
+RETRIABLE_STATUSES = {410, 429, 500, 502, 503, 504}
+
+
+def get_api_client(context: Optional[str] = None) -> client.ApiClient:
+    """
+    Create an API client from the kubeconfig written by `gcloud container clusters get-credentials`
+
+    :param context: kubeconfig context to use, or the current context
+    :return:
+    """
+    return config.new_client_from_config(context=context)
+
+
+def get_load_balancer_address(service: client.V1Service) -> Optional[str]:
+    """
+    :param service:
+    :return: external IP address, or host name, of a LoadBalancer service, once it is provisioned
+    """
+    if service.status is None or service.status.load_balancer is None:
+        return None
+    for ingress in service.status.load_balancer.ingress or []:
+        if ingress.ip or ingress.hostname:
+            return ingress.ip or ingress.hostname
+    return None
+
+
+def is_deployment_available(deployment: client.V1Deployment) -> bool:
+    """
+    Check if the latest revision of a deployment is rolled out, like `kubectl rollout status` or `helm --wait`
+
+    :param deployment:
+    :return:
+    """
+    replicas = deployment.spec.replicas if deployment.spec.replicas is not None else 1
+    status = deployment.status
+    if status is None or (status.observed_generation or 0) < (deployment.metadata.generation or 0):
+        return False
+    return (status.updated_replicas or 0) >= replicas and (status.available_replicas or 0) >= replicas
+
+
+def wait_for(
+    list_function: Callable,
+    name: str,
+    namespace: str,
+    is_ready: Callable[[Any], bool],
+    deadline: float,
+    on_retry: Optional[Callable[[Exception, float], None]] = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Any:
+    """
+    Wait for a namespaced resource to be ready
+
+    :param list_function: lists the kind of resource in a namespace, e.g. `CoreV1Api.list_namespaced_service`
+    :param name:
+    :param namespace:
+    :param is_ready:
+    :param deadline: `time.monotonic()` time to give up at
+    :param on_retry: called with the error and the backoff before a failed watch is retried
+    :param sleep:
+    :return: the ready resource
+    """
+    field_selector = f"metadata.name={name}"
+    backoff = INITIAL_BACKOFF_SECONDS
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise EdgeException(f"Timed out waiting for '{name}' to be ready")
+        timeout = max(1, int(min(remaining, WATCH_TIMEOUT_SECONDS)))
+        try:
+            resources = list_function(namespace, field_selector=field_selector, _request_timeout=timeout)
+            for resource in resources.items:
+                if is_ready(resource):
+                    return resource
+            stream = watch.Watch()
+            for event in stream.stream(
+                list_function,
+                namespace,
+                field_selector=field_selector,
+                resource_version=resources.metadata.resource_version,
+                timeout_seconds=timeout,
+                _request_timeout=timeout + 5,
+            ):
+                if event["type"] in ("ADDED", "MODIFIED") and is_ready(event["object"]):
+                    stream.stop()
+                    return event["object"]
+            # The watch timed out without the resource getting ready, so the resource is listed again
+            backoff = INITIAL_BACKOFF_SECONDS
+            continue
+        except ApiException as exc:
+            if exc.status not in RETRIABLE_STATUSES:
+                raise EdgeException(f"Error occurred while waiting for '{name}': {exc.status} {exc.reason}")
+            if exc.status == 410:
+                # The resource version is too old to watch from, which only needs a new list
+                continue
+            error = exc
+        except (urllib3.exceptions.HTTPError, OSError) as exc:
+            error = exc
+        if on_retry is not None:
+            on_retry(error, backoff)
+        sleep(max(0, min(backoff, deadline - time.monotonic())))
+        backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+
+
+def wait_for_load_balancer(
+    api_client: client.ApiClient,
+    name: str,
+    deadline: float,
+    namespace: str = "default",
+    on_retry: Optional[Callable[[Exception, float], None]] = None,
+) -> str:
+    """
+    Wait for a LoadBalancer service to get an external address
+
+    :param api_client:
+    :param name:
+    :param deadline: `time.monotonic()` time to give up at
+    :param namespace:
+    :param on_retry:
+    :return: external IP address or host name
+    """
+    service = wait_for(
+        client.CoreV1Api(api_client).list_namespaced_service,
+        name,
+        namespace,
+        lambda resource: get_load_balancer_address(resource) is not None,
+        deadline,
+        on_retry=on_retry,
+    )
+    return get_load_balancer_address(service)
+
+
+def wait_for_deployment(
+    api_client: client.ApiClient,
+    name: str,
+    deadline: float,
+    namespace: str = "default",
+    on_retry: Optional[Callable[[Exception, float], None]] = None,
+):
+    """
+    Wait for a deployment to be rolled out
+
+    :param api_client:
+    :param name:
+    :param deadline: `time.monotonic()` time to give up at
+    :param namespace:
+    :param on_retry:
+    :return:
+    """
+    wait_for(
+        client.AppsV1Api(api_client).list_namespaced_deployment,
+        name,
+        namespace,
+        is_deployment_available,
+        deadline,
+        on_retry=on_retry,
+    )
@@ -0,0 +1,214 @@
+"""
+Registry of model versions uploaded to Vertex AI, and retention-based garbage collection of old versions
+"""
+import datetime
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, List, Dict, Optional, Set
+
+from google.api_core.exceptions import NotFound
+from google.cloud import storage
+from google.cloud.aiplatform import Model
+
+from edge.config import EdgeConfig
+from edge.exception import EdgeException
+from edge.state import EdgeState, ModelVersion, StateLockedError
+from edge.storage import delete_prefix
+
+# Written next to the model artifacts by training runs on Vertex AI, and read when the model is registered
+METRICS_FILE_NAME = "edge_metrics.json"
+# Phases timed inside the training job, which are merged into the trace of the training run
+TRACE_FILE_NAME = "training_trace.json"
+
+
+def split_uri(uri: str) -> (str, str):
+    bucket_name, _, prefix = uri[len("gs://"):].partition("/")
+    return bucket_name, prefix.rstrip("/") + "/"
+
+
+def fingerprint_artifacts(client: storage.Client, artifact_uri: str) -> Optional[str]:
+    """
+    Fingerprint model artifacts from the checksums Google Storage keeps for every blob, without downloading them
+
+    :param client:
+    :param artifact_uri:
+    :return: SHA-256 over blob names and checksums, or None if there are no artifacts
+    """
+    bucket_name, prefix = split_uri(artifact_uri)
+    digest = hashlib.sha256()
+    found = False
+    for blob in client.list_blobs(bucket_name, prefix=prefix, fields="items(name,crc32c),nextPageToken"):
+        if blob.name.endswith((METRICS_FILE_NAME, TRACE_FILE_NAME)):
+            continue
+        digest.update(f"{blob.name[len(prefix):]}:{blob.crc32c}\n".encode("utf-8"))
+        found = True
+    return digest.hexdigest() if found else None
+
+
+def write_metrics(artifact_uri: str, metrics: Dict[str, float]):
+    client = storage.Client()
+    bucket_name, prefix = split_uri(artifact_uri)
+    client.bucket(bucket_name).blob(prefix + METRICS_FILE_NAME).upload_from_string(
+        json.dumps(metrics), content_type="application/json"
+    )
+
+
+def read_metrics(client: storage.Client, artifact_uri: str) -> Dict[str, float]:
+    bucket_name, prefix = split_uri(artifact_uri)
+    try:
+        return json.loads(client.bucket(bucket_name).blob(prefix + METRICS_FILE_NAME).download_as_bytes())
+    except NotFound:
+        return {}
+
+
+def write_trace(artifact_uri: str, trace: Dict[str, Any]):
+    client = storage.Client()
+    bucket_name, prefix = split_uri(artifact_uri)
+    client.bucket(bucket_name).blob(prefix + TRACE_FILE_NAME).upload_from_string(
+        json.dumps(trace), content_type="application/json"
+    )
+
+
+def read_trace(client: storage.Client, artifact_uri: str) -> Optional[Dict[str, Any]]:
+    bucket_name, prefix = split_uri(artifact_uri)
+    try:
+        return json.loads(client.bucket(bucket_name).blob(prefix + TRACE_FILE_NAME).download_as_bytes())
+    except NotFound:
+        return None
+
+
+def register_model_version(
+    config: EdgeConfig,
+    model_name: str,
+    model: Model,
+    artifact_uri: str,
+    lock_timeout_seconds: float = 600,
+    sleep: Callable[[float], None] = time.sleep,
+) -> ModelVersion:
+    """
+    Record a model uploaded to Vertex AI in the registry kept in vertex:edge state. Training runs finish while other
+    commands may hold the state lock, so the lock is retried with backoff for up to [lock_timeout_seconds].
+
+    :param config:
+    :param model_name:
+    :param model:
+    :param artifact_uri:
+    :param lock_timeout_seconds: how long to wait for the state lock before giving up
+    :param sleep:
+    :return:
+    """
+    client = storage.Client(config.google_cloud_project.project_id)
+    version = ModelVersion(
+        resource_name=model.resource_name,
+        artifact_uri=artifact_uri,
+        fingerprint=fingerprint_artifacts(client, artifact_uri),
+        created_at=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        metrics=read_metrics(client, artifact_uri),
+    )
+    waited, delay = 0.0, 5.0
+    while True:
+        try:
+            with EdgeState.context(config, to_lock=True, to_save=True, silent=True) as state:
+                if state.models is not None and model_name in state.models:
+                    state.models[model_name].versions.append(version)
+                else:
+                    logging.warning(f"Model '{model_name}' is not in vertex:edge state, so its version is not "
+                                    f"registered")
+            return version
+        except StateLockedError:
+            if waited >= lock_timeout_seconds:
+                raise EdgeException(f"vertex:edge state was locked for {waited:g}s, so '{model.resource_name}' "
+                                    f"is not registered. If no other command is running, unlock the state with "
+                                    f"`./edge.sh force-unlock` and train again.")
+            delay = min(delay, lock_timeout_seconds - waited)
+            logging.info(f"vertex:edge state is locked by another command, retrying in {delay:g}s")
+            sleep(delay)
+            waited += delay
+            delay *= 2
+
+
+@dataclass
+class VertexModelVersion:
+    resource_name: str
+    artifact_uri: str
+    create_time: datetime.datetime
+    # Whether Vertex AI reports the model as deployed on any endpoint
+    is_deployed: bool
+
+
+def list_vertex_model_versions(config: EdgeConfig, model_name: str) -> List[VertexModelVersion]:
+    """
+    List the Vertex AI models uploaded for [model_name], newest first. This includes models uploaded before the
+    registry existed, or whose registration failed.
+
+    :param config:
+    :param model_name:
+    :return:
+    """
+    models = Model.list(
+        filter=f'display_name="{model_name}"',
+        order_by="create_time desc",
+        project=config.google_cloud_project.project_id,
+        location=config.google_cloud_project.region,
+    )
+    return [
+        VertexModelVersion(
+            resource_name=model.resource_name,
+            artifact_uri=model._gca_resource.artifact_uri,
+            create_time=model._gca_resource.create_time,
+            is_deployed=len(model._gca_resource.deployed_models) > 0,
+        )
+        for model in models
+    ]
+
+
+def list_vertex_artifact_uris(config: EdgeConfig) -> List[str]:
+    """
+    List the artifact URIs of every Vertex AI model in the project's region, including models that vertex:edge does
+    not know about, e.g. models of a removed model or uploaded by hand
+
+    :param config:
+    :return:
+    """
+    models = Model.list(
+        project=config.google_cloud_project.project_id,
+        location=config.google_cloud_project.region,
+    )
+    return [model._gca_resource.artifact_uri for model in models if model._gca_resource.artifact_uri]
+
+
+def select_expired(versions: List[VertexModelVersion], keep_last: int, in_use: Set[str]) -> List[VertexModelVersion]:
+    """
+    Apply the retention policy: keep the [keep_last] most recent versions, and any version that is in use
+
+    :param versions: newest first
+    :param keep_last:
+    :param in_use: resource names of versions that are deployed or being deployed
+    :return: versions to delete
+    """
+    return [
+        version for version in versions[keep_last:]
+        if version.resource_name not in in_use and not version.is_deployed
+    ]
+
+
+def delete_model_version(client: storage.Client, version: VertexModelVersion, dry_run: bool = False) -> (int, int):
+    """
+    Delete a model from Vertex AI, and its artifacts from Google Storage
+
+    :param client:
+    :param version:
+    :param dry_run:
+    :return: number of artifact blobs deleted, and their total size in bytes
+    """
+    if not dry_run:
+        try:
+            Model(version.resource_name).delete()
+        except NotFound:
+            pass
+    if not version.artifact_uri.startswith("gs://"):
+        return 0, 0
+    return delete_prefix(client, version.artifact_uri, dry_run=dry_run)
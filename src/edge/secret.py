@@ -0,0 +1,123 @@
+"""
+Resolving secrets from Google Cloud Secret Manager, with a local cache
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+from google.cloud import secretmanager_v1
+
+from edge.path import get_cache_path
+
+# How long a cached secret is trusted before its version is checked again
+DEFAULT_TTL_SECONDS = 3600
+
+
+def _cache_file(secret_name: str) -> str:
+    digest = hashlib.sha256(secret_name.encode("utf-8")).hexdigest()
+    return os.path.join(get_cache_path(), "secrets", f"{digest}.json")
+
+
+def _read_cache(secret_name: str) -> Optional[dict]:
+    try:
+        with open(_cache_file(secret_name)) as f:
+            entry = json.load(f)
+        if entry.get("secret") != secret_name:
+            return None
+        return entry
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(secret_name: str, version: str, value: str):
+    """
+    Cache a secret value. Caching is best-effort: the value has been fetched already, so it is still used if it cannot
+    be cached, e.g. because the home directory is read-only or missing in a training container.
+    """
+    path = _cache_file(secret_name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        # The file is created as owner read/write only, before anything is written into it
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"secret": secret_name, "version": version, "value": value, "fetched_at": time.time()}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Unable to cache secret '{secret_name}': {e}")
+
+
+def invalidate_cached_secret(project_id: str, secret_id: str):
+    """
+    Drop the cached value of a secret, e.g. after a new version has been added
+
+    :param project_id:
+    :param secret_id:
+    :return:
+    """
+    try:
+        os.remove(_cache_file(f"projects/{project_id}/secrets/{secret_id}"))
+    except FileNotFoundError:
+        pass
+
+
+class SecretResolver:
+    """
+    Resolves the latest version of a secret in a background thread, started at construction time.
+
+    Values are cached in a local file readable only by the current user. A cached value is used as is
+    within [ttl] seconds; after that, only the version metadata is fetched, and the value is downloaded
+    again only if the latest version has changed.
+    """
+
+    def __init__(self, project_id: str, secret_id: str, ttl: float = DEFAULT_TTL_SECONDS):
+        self.secret_name = f"projects/{project_id}/secrets/{secret_id}"
+        self.ttl = ttl
+        self._value = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name=f"resolve-{secret_id}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self._value = self._resolve()
+        except Exception as exc:
+            self._error = exc
+
+    def _resolve(self) -> str:
+        cached = _read_cache(self.secret_name)
+        if cached is not None and time.time() - cached["fetched_at"] < self.ttl:
+            return cached["value"]
+
+        client = secretmanager_v1.SecretManagerServiceClient()
+        if cached is not None:
+            latest_version = client.get_secret_version(name=f"{self.secret_name}/versions/latest").name
+            if latest_version == cached["version"]:
+                _write_cache(self.secret_name, cached["version"], cached["value"])
+                return cached["value"]
+
+        version, value = self._access(client)
+        _write_cache(self.secret_name, version, value)
+        return value
+
+    def _access(self, client: secretmanager_v1.SecretManagerServiceClient) -> Tuple[str, str]:
+        response = client.access_secret_version(name=f"{self.secret_name}/versions/latest")
+        return response.name, response.payload.data.decode("UTF-8")
+
+    def get(self, timeout: Optional[float] = None) -> str:
+        """
+        Wait for the secret to be resolved and return its value
+
+        :param timeout: seconds to wait for, or None to wait until the lookup finishes
+        :return:
+        """
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            raise TimeoutError(f"Timed out while resolving secret '{self.secret_name}'")
+        if self._error is not None:
+            raise self._error
+        return self._value
@@ -0,0 +1,296 @@
+"""
+Local serving of locally trained models, through the same `:predict` HTTP API as Vertex AI endpoints
+
+Requests are coalesced into batches on a background thread, so that concurrent callers share model invocations,
+and batches are run on a pool of worker threads. This makes it possible to test prediction clients and to
+benchmark a model without deploying it. Serving a `FakePredictor` gives a fake endpoint with a chosen latency
+and error rate, to benchmark without a model at all.
+
+Example:
+
+    with LocalPredictionServer(load_predictor(model_path), port=8080) as server:
+        client = PredictionClient(server.predict_url)
+"""
+import abc
+import json
+import os
+import pickle
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List, Optional
+
+from edge.exception import EdgeException
+
+
+class Predictor(abc.ABC):
+    """
+    A model loaded in memory
+    """
+
+    @abc.abstractmethod
+    def predict(self, instances: List[Any]) -> List[Any]:
+        """
+        :param instances:
+        :return: predictions, in the same order as [instances]
+        """
+        raise NotImplementedError()
+
+
+class TensorFlowPredictor(Predictor):
+    def __init__(self, path: str):
+        try:
+            import tensorflow as tf
+        except ImportError:
+            raise EdgeException("TensorFlow is required to serve a SavedModel. "
+                                "Install it with `pip install tensorflow`.")
+        self.tf = tf
+        self.model = tf.keras.models.load_model(path)
+
+    def predict(self, instances: List[Any]) -> List[Any]:
+        return self.model(self.tf.constant(instances)).numpy().tolist()
+
+
+class SklearnPredictor(Predictor):
+    def __init__(self, path: str):
+        if path.endswith(".joblib"):
+            try:
+                import joblib
+            except ImportError:
+                raise EdgeException("joblib is required to serve model.joblib. Install it with `pip install joblib`.")
+            self.model = joblib.load(path)
+        else:
+            with open(path, "rb") as f:
+                self.model = pickle.load(f)
+
+    def predict(self, instances: List[Any]) -> List[Any]:
+        predictions = self.model.predict(instances)
+        return predictions.tolist() if hasattr(predictions, "tolist") else list(predictions)
+
+
+class FakePredictor(Predictor):
+    """
+    Stands in for a deployed model, to benchmark and test clients without one: every instance is answered with
+    [prediction] after a simulated latency, and a fraction of calls fail
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 20,
+        latency_per_instance_ms: float = 0,
+        error_rate: float = 0,
+        prediction: Any = 0,
+    ):
+        """
+        :param latency_ms: time taken by every call
+        :param latency_per_instance_ms: additional time taken by every instance of a call
+        :param error_rate: fraction of calls that fail, between 0 and 1
+        :param prediction: prediction returned for every instance
+        """
+        if latency_ms < 0 or latency_per_instance_ms < 0:
+            raise EdgeException("Latency of the fake endpoint must not be negative")
+        if not 0 <= error_rate <= 1:
+            raise EdgeException(f"Error rate of the fake endpoint must be between 0 and 1, got {error_rate}")
+        self.latency = latency_ms / 1000
+        self.latency_per_instance = latency_per_instance_ms / 1000
+        self.error_rate = error_rate
+        self.prediction = prediction
+
+    def predict(self, instances: List[Any]) -> List[Any]:
+        time.sleep(self.latency + self.latency_per_instance * len(instances))
+        if random.random() < self.error_rate:
+            raise RuntimeError("Simulated failure of the fake endpoint")
+        return [self.prediction for _ in instances]
+
+
+def load_predictor(path: str) -> Predictor:
+    """
+    Load a model saved in one of the formats supported by Vertex AI pre-built serving containers:
+    a TensorFlow SavedModel, or a scikit-learn/XGBoost model.joblib or model.pkl
+
+    :param path: directory the model was saved to
+    :return:
+    """
+    if os.path.exists(os.path.join(path, "saved_model.pb")):
+        return TensorFlowPredictor(path)
+    for file_name in ["model.joblib", "model.pkl"]:
+        if os.path.exists(os.path.join(path, file_name)):
+            return SklearnPredictor(os.path.join(path, file_name))
+    raise EdgeException(f"No model found in '{path}'. Expected a TensorFlow SavedModel, model.joblib or model.pkl.")
+
+
+class DynamicBatcher:
+    def __init__(
+        self,
+        predictor: Predictor,
+        max_batch_size: int = 32,
+        max_latency_ms: float = 5,
+        workers: int = 4,
+    ):
+        """
+        :param predictor:
+        :param max_batch_size: maximum number of instances passed to the model at once
+        :param max_latency_ms: how long a request may wait for other requests to batch with
+        :param workers: number of batches run concurrently
+        """
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="edge-serve")
+        self._pending = queue.Queue()
+        self._batcher = threading.Thread(target=self._run_batcher, name="edge-serve-batcher", daemon=True)
+        self._batcher.start()
+
+    def predict(self, instances: List[Any]) -> Future:
+        """
+        Queue [instances] to be predicted, possibly together with instances from other requests
+
+        :param instances:
+        :return: a future resolving to the predictions for [instances]
+        """
+        future = Future()
+        self._pending.put((instances, future))
+        return future
+
+    def _run_batcher(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            batch = [item]
+            size = len(item[0])
+            deadline = time.monotonic() + self.max_latency
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._pending.put(None)  # Stop after this batch
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self._executor.submit(self._run, batch)
+
+    def _run(self, batch):
+        try:
+            predictions = self.predictor.predict([instance for instances, _ in batch for instance in instances])
+            offset = 0
+            for instances, future in batch:
+                future.set_result(predictions[offset:offset + len(instances)])
+                offset += len(instances)
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+
+    def close(self):
+        self._pending.put(None)
+        self._batcher.join()
+        self._executor.shutdown(wait=True)
+
+
+class _PredictionHandler(BaseHTTPRequestHandler):
+    server: "_PredictionHTTPServer"
+
+    def _respond(self, status: int, body: dict):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status: int, message: str):
+        self._respond(status, {"error": {"code": status, "message": message}})
+
+    def do_POST(self):
+        if not self.path.endswith(":predict"):
+            self._error(404, f"Unknown method '{self.path}'. Send predictions to '/v1/{{endpoint}}:predict'.")
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            instances = json.loads(self.rfile.read(length))["instances"]
+            if not isinstance(instances, list):
+                raise ValueError("'instances' must be a list")
+        except (ValueError, KeyError, TypeError) as exc:
+            self._error(400, f"Invalid request: {exc}")
+            return
+        try:
+            predictions = self.server.batcher.predict(instances).result()
+        except Exception as exc:
+            self._error(500, f"Prediction failed: {exc}")
+            return
+        self._respond(200, {"predictions": predictions, "deployedModelId": "local"})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class _PredictionHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    batcher: DynamicBatcher
+    verbose: bool = False
+
+
+class LocalPredictionServer:
+    def __init__(
+        self,
+        predictor: Predictor,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        max_batch_size: int = 32,
+        max_latency_ms: float = 5,
+        workers: int = 4,
+        verbose: bool = False,
+    ):
+        """
+        :param predictor:
+        :param host:
+        :param port: port to listen on, or 0 to pick a free port
+        :param max_batch_size: see `DynamicBatcher`
+        :param max_latency_ms: see `DynamicBatcher`
+        :param workers: see `DynamicBatcher`
+        :param verbose: log every request
+        """
+        self.batcher = DynamicBatcher(predictor, max_batch_size, max_latency_ms, workers)
+        self.httpd = _PredictionHTTPServer((host, port), _PredictionHandler)
+        self.httpd.batcher = self.batcher
+        self.httpd.verbose = verbose
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def predict_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/local:predict"
+
+    def start(self):
+        """
+        Serve requests on a background thread
+        """
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="edge-serve-http", daemon=True)
+        self._thread.start()
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        if self._thread is not None:
+            self.httpd.shutdown()
+            self._thread.join()
+        self.httpd.server_close()
+        self.batcher.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
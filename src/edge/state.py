@@ -1,14 +1,14 @@
 import os.path
 from serde import serialize, deserialize
 from serde.yaml import to_yaml, from_yaml
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from google.cloud import storage
 
 from edge.exception import EdgeException
 from edge.storage import get_bucket, StorageBucketState
-from edge.config import EdgeConfig
+from edge.config import EdgeConfig, ServingConfig
 from edge.tui import StepTUI, SubStepTUI
-from typing import Type, TypeVar, Optional, Dict
+from typing import Type, TypeVar, Optional, Dict, List, Set
 from contextlib import contextmanager
 
 
@@ -19,17 +19,87 @@ class SacredState:
     external_omniboard_string: str
 
 
+@deserialize
+@serialize
+@dataclass
+class RolloutState:
+    model_resource_name: str
+    candidate_deployed_model_id: str
+    baseline_deployed_model_id: str
+    # Index of the next canary step to apply
+    next_step: int = 0
+    traffic_percentage: int = 0
+
+
+@deserialize
+@serialize
+@dataclass
+class ModelVersion:
+    # Vertex AI model resource name
+    resource_name: str
+    artifact_uri: str
+    # Hash of the model artifacts, to tell apart versions that were trained differently
+    fingerprint: Optional[str]
+    created_at: str
+    metrics: Dict[str, float] = field(default_factory=dict)
+
+
+@deserialize
+@serialize
+@dataclass
+class PendingDeploymentState:
+    # Name of the Vertex AI long-running operation deploying the model
+    operation_name: str
+    model_resource_name: str
+    serving: ServingConfig
+    # Deployed models of the model when the deployment started, replaced once it completes
+    previous_deployed_model_ids: List[str]
+    started_at: str
+
+
 @deserialize
 @serialize
 @dataclass
 class ModelState:
+    # Endpoint the model is served from. Several models may share an endpoint, in which case each of them routes
+    # traffic to its own deployed models
     endpoint_resource_name: str
     deployed_model_resource_name: Optional[str] = None
+    # Id of the deployed model that serves traffic on the endpoint
+    deployed_model_id: Optional[str] = None
+    # Id of the other deployed model during a blue/green deployment, i.e. the new model before traffic is switched,
+    # or the previous model before it is undeployed
+    standby_deployed_model_id: Optional[str] = None
+    # Serving resources of the deployed model that serves traffic
+    deployed_serving: Optional[ServingConfig] = None
+    # Canary rollout in progress, if any
+    rollout: Optional[RolloutState] = None
+    # Deployment started with `model deploy --no-wait`, if any
+    pending_deployment: Optional[PendingDeploymentState] = None
+    # Model versions uploaded to Vertex AI by training runs, oldest first
+    versions: List[ModelVersion] = field(default_factory=list)
+
+    def versions_in_use(self) -> Set[str]:
+        """
+        Get the resource names of model versions that are deployed, or being deployed
+        """
+        in_use = {self.deployed_model_resource_name}
+        if self.pending_deployment is not None:
+            in_use.add(self.pending_deployment.model_resource_name)
+        if self.rollout is not None:
+            in_use.add(self.rollout.model_resource_name)
+        return {resource_name for resource_name in in_use if resource_name is not None}
 
 
 T = TypeVar("T", bound="EdgeState")
 
 
+class StateLockedError(EdgeException):
+    """
+    The state is locked by another command
+    """
+
+
 @deserialize
 @serialize
 @dataclass
@@ -38,6 +108,18 @@ class EdgeState:
     sacred: Optional[SacredState] = None
     storage: Optional[StorageBucketState] = None
 
+    def models_sharing_endpoint(self, model_name: str) -> List[str]:
+        """
+        Get the other models served from the same endpoint as [model_name]
+        """
+        if self.models is None or model_name not in self.models:
+            return []
+        endpoint_resource_name = self.models[model_name].endpoint_resource_name
+        return [
+            name for name, model_state in self.models.items()
+            if name != model_name and model_state.endpoint_resource_name == endpoint_resource_name
+        ]
+
     def save(self, _config: EdgeConfig):
         client = storage.Client(project=_config.google_cloud_project.project_id)
         bucket = client.bucket(_config.storage_bucket.bucket_name)
@@ -112,7 +194,7 @@ class EdgeState:
             raise EdgeException("Google Storage Bucket does not exist. Initialise it by running `./edge.py init.`")
         blob = storage.Blob(f"{blob_name}.lock", bucket)
         if blob.exists():
-            raise EdgeException("State file is already locked")
+            raise StateLockedError("State file is already locked")
 
         blob.upload_from_string("locked")
         return True
@@ -0,0 +1,189 @@
+"""
+Running the steps of a command as a dependency graph
+
+Steps declare the values they take as inputs and the values they produce as outputs. A step starts as soon as all of
+its inputs are produced, so independent steps run concurrently on a thread pool, with one live progress line per step.
+Outputs that only order steps, e.g. "an API is enabled", are produced as None.
+
+Steps must not prompt the user, as prompts cannot be shown while progress lines are redrawn. Ask before running the
+graph, and pass answers in as initial values.
+
+Example:
+
+    graph = StepGraph([
+        Step("Enabling Vertex AI API", enable_vertex_api, outputs=["vertex_api"]),
+        Step("Creating endpoint", create_endpoint, inputs=["vertex_api"], outputs=["model_state"]),
+        Step("Checking project directory", check_directory, outputs=["directory_exists"]),
+    ])
+    values = graph.run()
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from edge.exception import EdgeException
+from edge.tui import ParallelTUI, SubStepTUI, TUIStatus, is_reporting_steps, report_failures
+
+
+@dataclass
+class Step:
+    # Shown on the step's progress line
+    name: str
+    # Called with the step's inputs as keyword arguments. Returns the value of its output if it has one, or a tuple
+    # of values if it has several
+    run: Callable[..., Any]
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+
+
+class StepGraph:
+    def __init__(self, steps: List[Step], max_workers: int = 4, show_critical_path: bool = True):
+        """
+        :param steps:
+        :param max_workers: maximum number of steps run at the same time
+        :param show_critical_path: show how long the graph took, and its critical path, once it finishes
+        """
+        self.steps = steps
+        self.max_workers = max_workers
+        self.show_critical_path = show_critical_path
+        self.producers: Dict[str, Step] = {}
+        for step in steps:
+            for output in step.outputs:
+                if output in self.producers:
+                    raise ValueError(f"'{output}' is an output of both '{self.producers[output].name}' and "
+                                     f"'{step.name}'")
+                self.producers[output] = step
+        # Start and end `time.monotonic()` readings of every step that ran
+        self.timings: Dict[str, Tuple[float, float]] = {}
+
+    def _order(self, initial: List[str]) -> List[Step]:
+        """
+        Sort the steps so that every step comes after the steps producing its inputs
+
+        :param initial: names of the values available before any step runs
+        :return:
+        """
+        available = set(initial)
+        ordered = []
+        remaining = list(self.steps)
+        while remaining:
+            ready = [step for step in remaining if all(value in available for value in step.inputs)]
+            if not ready:
+                missing = {value for step in remaining for value in step.inputs if value not in available}
+                raise ValueError(f"Steps {[step.name for step in remaining]} can never run, as nothing produces "
+                                 f"{sorted(missing)}, or they depend on each other")
+            for step in ready:
+                ordered.append(step)
+                remaining.remove(step)
+                available.update(step.outputs)
+        return ordered
+
+    def _run_step(self, step: Step, values: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.monotonic()
+        try:
+            result = step.run(**{value: values[value] for value in step.inputs})
+        finally:
+            self.timings[step.name] = (start, time.monotonic())
+        if len(step.outputs) == 1:
+            result = (result,)
+        elif len(step.outputs) == 0:
+            result = ()
+        return dict(zip(step.outputs, result))
+
+    def run(self, values: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Run every step, as soon as its inputs are available. Once a step fails, no other step is started, and the
+        exception of the first step that failed is raised once the running steps finish.
+
+        If the graph is itself run on behalf of a `ParallelTUI`, steps are run one after another on the calling
+        thread instead, and report to its progress line.
+
+        :param values: values available before any step runs
+        :return: initial values and the outputs of every step
+        """
+        values = dict(values or {})
+        ordered = self._order(list(values))
+        started = time.monotonic()
+        if is_reporting_steps() or self.max_workers == 1:
+            for step in ordered:
+                values.update(self._run_step(step, values))
+        else:
+            self._run_concurrently(ordered, values)
+        if self.show_critical_path:
+            self._report_critical_path(time.monotonic() - started)
+        return values
+
+    def _run_concurrently(self, ordered: List[Step], values: Dict[str, Any]):
+        tui = ParallelTUI([step.name for step in ordered], max_workers=self.max_workers)
+        pending = list(ordered)
+        running = {}
+        # Exceptions of the steps that failed, in the order they failed
+        failures: List[Exception] = []
+
+        def run_step(step: Step, inputs: Dict[str, Any]) -> Dict[str, Any]:
+            outputs = {}
+
+            def operation(_):
+                try:
+                    outputs.update(self._run_step(step, inputs))
+                except Exception as exc:
+                    failures.append(exc)
+                    raise
+
+            tui.run_item(step.name, operation)
+            return outputs
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="edge-step") as executor:
+            while pending or running:
+                if not tui.errors:
+                    for step in [step for step in pending if all(value in values for value in step.inputs)]:
+                        pending.remove(step)
+                        inputs = {value: values[value] for value in step.inputs}
+                        running[executor.submit(run_step, step, inputs)] = step
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running.pop(future)
+                    values.update(future.result())
+        for step in pending:
+            tui.update(step.name, "skipped", TUIStatus.NEUTRAL)
+        try:
+            report_failures(tui.errors, len(ordered), "complete")
+        except EdgeException as exc:
+            # The first failure says what to fix, e.g. that billing is not enabled, unlike the number of failures
+            if isinstance(failures[0], EdgeException):
+                raise failures[0]
+            raise EdgeException(f"{exc}: {failures[0]}") from failures[0]
+
+    def critical_path(self) -> (List[str], float):
+        """
+        Find the chain of dependent steps that took the longest. The graph cannot finish faster than this chain,
+        however many steps run concurrently.
+
+        :return: names of the steps on the critical path, and their total duration in seconds
+        """
+        longest: Dict[str, Tuple[float, List[str]]] = {}
+        for step in self._order([value for value in self._inputs() if value not in self.producers]):
+            if step.name not in self.timings:
+                continue
+            start, end = self.timings[step.name]
+            dependencies = [
+                longest[self.producers[value].name] for value in step.inputs
+                if value in self.producers and self.producers[value].name in longest
+            ]
+            duration, path = max(dependencies, key=lambda dependency: dependency[0], default=(0.0, []))
+            longest[step.name] = (duration + end - start, path + [step.name])
+        duration, path = max(longest.values(), key=lambda entry: entry[0], default=(0.0, []))
+        return path, duration
+
+    def _inputs(self) -> List[str]:
+        return [value for step in self.steps for value in step.inputs]
+
+    def _report_critical_path(self, elapsed: float):
+        path, duration = self.critical_path()
+        if len(path) == 0:
+            return
+        with SubStepTUI(f"Finished {len(self.timings)} steps in {elapsed:.1f}s", status=TUIStatus.NEUTRAL) as sub_step:
+            sub_step.add_explanation(f"Critical path ({duration:.1f}s): {' → '.join(path)}")
@@ -1,15 +1,18 @@
+import itertools
+import json
 import sys
-from typing import Optional
+from typing import Optional, Iterable, List
 from serde import serialize, deserialize
 from dataclasses import dataclass
 from google.api_core.exceptions import NotFound, Forbidden
 from google.cloud import storage
-from .config import EdgeConfig
+from .config import EdgeConfig, StorageBucketConfig, LifecycleRuleConfig
 from .exception import EdgeException
 from .tui import (
     print_substep_not_done, print_substep_success, print_substep_failure, print_failure_explanation, print_substep,
-    clear_last_line, SubStepTUI
+    clear_last_line, SubStepTUI, TUIStatus, qmark
 )
+import questionary
 
 
 @deserialize
@@ -19,6 +22,54 @@ class StorageBucketState:
     bucket_path: str
 
 
+# Maximum number of requests in a Google Storage batch request
+BATCH_SIZE = 100
+
+
+def delete_blobs(client: storage.Client, blobs: Iterable[storage.Blob]) -> (int, int):
+    """
+    Delete [blobs] using batch requests, which is much faster than deleting them one by one
+
+    :param client:
+    :param blobs:
+    :return: number of blobs deleted, and their total size in bytes
+    """
+    count, size = 0, 0
+    batch = []
+    for blob in itertools.chain(blobs, [None]):
+        if blob is not None:
+            batch.append(blob)
+        if len(batch) == BATCH_SIZE or (blob is None and batch):
+            with client.batch():
+                for batched_blob in batch:
+                    batched_blob.delete()
+            count += len(batch)
+            size += sum(batched_blob.size or 0 for batched_blob in batch)
+            batch = []
+    return count, size
+
+
+def delete_prefix(client: storage.Client, uri: str, dry_run: bool = False) -> (int, int):
+    """
+    Delete every blob under a Google Storage URI prefix
+
+    :param client:
+    :param uri: gs://bucket/prefix
+    :param dry_run: only count the blobs that would be deleted
+    :return: number of blobs deleted, and their total size in bytes
+    """
+    bucket_name, _, prefix = uri[len("gs://"):].partition("/")
+    prefix = prefix.rstrip("/") + "/"
+    blobs = client.list_blobs(bucket_name, prefix=prefix, fields="items(name,size),nextPageToken")
+    if dry_run:
+        count, size = 0, 0
+        for blob in blobs:
+            count += 1
+            size += blob.size or 0
+        return count, size
+    return delete_blobs(client, blobs)
+
+
 def get_bucket(project_id: str, bucket_name: str) -> Optional[storage.Bucket]:
     try:
         client = storage.Client(project_id)
@@ -48,6 +99,183 @@ def create_bucket(project_id: str, region: str, bucket_name: str) -> str:
     return f"gs://{bucket.name}/"
 
 
+# Vertex AI training jobs write their source packages, and their outputs by default, under this prefix of the
+# staging directory
+VERTEX_STAGING_PREFIX = "aiplatform-"
+
+
+def default_lifecycle_rules(storage_config: StorageBucketConfig) -> List[LifecycleRuleConfig]:
+    """
+    Lifecycle rules that vertex:edge suggests. The state file is left in Standard storage, as every command reads it.
+
+    :param storage_config:
+    :return:
+    """
+    return [
+        LifecycleRuleConfig(
+            prefix=f"{storage_config.dvc_store_directory}/",
+            nearline_after_days=30,
+            coldline_after_days=90,
+        ),
+        LifecycleRuleConfig(
+            prefix=f"{storage_config.vertex_jobs_directory}/{VERTEX_STAGING_PREFIX}",
+            delete_after_days=30,
+        ),
+    ]
+
+
+def managed_lifecycle_prefixes(storage_config: StorageBucketConfig) -> List[str]:
+    """
+    :param storage_config:
+    :return: prefixes of the directories that vertex:edge writes to in the bucket
+    """
+    return [f"{storage_config.dvc_store_directory}/", f"{storage_config.vertex_jobs_directory}/"]
+
+
+def is_managed_lifecycle_rule(rule: dict, managed_prefixes: List[str]) -> bool:
+    """
+    Check if a lifecycle rule only applies to objects under [managed_prefixes]. Other rules, e.g. rules for the
+    whole bucket, belong to the user.
+
+    :param rule: in the format of the Google Storage JSON API
+    :param managed_prefixes:
+    :return:
+    """
+    prefixes = rule.get("condition", {}).get("matchesPrefix", [])
+    return len(prefixes) > 0 and all(
+        any(prefix.startswith(managed_prefix) for managed_prefix in managed_prefixes) for prefix in prefixes
+    )
+
+
+def lifecycle_rules_for(rule_configs: List[LifecycleRuleConfig]) -> List[dict]:
+    """
+    Convert vertex:edge lifecycle config to Google Storage lifecycle rules
+
+    :param rule_configs:
+    :return: rules in the format of the Google Storage JSON API
+    """
+    rules = []
+    for rule_config in rule_configs:
+        nearline, coldline = rule_config.nearline_after_days, rule_config.coldline_after_days
+        if nearline is not None and coldline is not None and coldline <= nearline:
+            raise EdgeException(f"Lifecycle rule for '{rule_config.prefix}' moves objects to Coldline before "
+                                f"Nearline. coldline_after_days must be greater than nearline_after_days.")
+        condition = {"matchesPrefix": [rule_config.prefix]}
+        if nearline is not None:
+            rules.append({
+                "action": {"type": "SetStorageClass", "storageClass": "NEARLINE"},
+                "condition": {**condition, "age": nearline, "matchesStorageClass": ["STANDARD"]},
+            })
+        if coldline is not None:
+            rules.append({
+                "action": {"type": "SetStorageClass", "storageClass": "COLDLINE"},
+                "condition": {**condition, "age": coldline, "matchesStorageClass": ["STANDARD", "NEARLINE"]},
+            })
+        if rule_config.delete_after_days is not None:
+            rules.append({
+                "action": {"type": "Delete"},
+                "condition": {**condition, "age": rule_config.delete_after_days},
+            })
+    return rules
+
+
+def describe_lifecycle_rule(rule: dict) -> str:
+    condition = dict(rule.get("condition", {}))
+    action = rule.get("action", {})
+    prefixes = ", ".join(condition.pop("matchesPrefix", [])) or "all objects"
+    if action.get("type") == "Delete":
+        description = f"{prefixes}: delete"
+    else:
+        description = f"{prefixes}: move to {action.get('storageClass', '?').capitalize()}"
+    if "age" in condition:
+        description += f" after {condition.pop('age')} days"
+    condition.pop("matchesStorageClass", None)
+    if condition:
+        description += f" ({json.dumps(condition, sort_keys=True)})"
+    return description
+
+
+def diff_lifecycle_rules(
+    current: List[dict],
+    desired: List[dict],
+    managed_prefixes: List[str],
+) -> (List[dict], List[dict]):
+    """
+    :param current:
+    :param desired:
+    :param managed_prefixes: only rules under these prefixes are removed, see `is_managed_lifecycle_rule`
+    :return: rules to add, and rules to remove
+    """
+    def key(rule: dict) -> str:
+        return json.dumps(rule, sort_keys=True)
+
+    current_keys = {key(rule) for rule in current}
+    desired_keys = {key(rule) for rule in desired}
+    return (
+        [rule for rule in desired if key(rule) not in current_keys],
+        [
+            rule for rule in current
+            if key(rule) not in desired_keys and is_managed_lifecycle_rule(rule, managed_prefixes)
+        ],
+    )
+
+
+def setup_lifecycle_rules(
+    project_id: str,
+    bucket_name: str,
+    rule_configs: List[LifecycleRuleConfig],
+    managed_prefixes: List[str],
+    dry_run: bool = False,
+) -> bool:
+    """
+    Show how the lifecycle rules of the bucket differ from [rule_configs], and apply them once confirmed. Rules under
+    [managed_prefixes], or the prefixes of [rule_configs], that are not in [rule_configs] are removed. Other rules
+    of the bucket are left as they are.
+
+    :param project_id:
+    :param bucket_name:
+    :param rule_configs:
+    :param managed_prefixes: prefixes that vertex:edge manages the lifecycle of, see `managed_lifecycle_prefixes`
+    :param dry_run: only show the differences
+    :return: whether the bucket lifecycle rules match [rule_configs]
+    """
+    desired = lifecycle_rules_for(rule_configs)
+    managed_prefixes = managed_prefixes + [rule_config.prefix for rule_config in rule_configs]
+    with SubStepTUI(f"Comparing lifecycle rules of '{bucket_name}' with vertex:edge config") as sub_step:
+        bucket = get_bucket(project_id, bucket_name)
+        if bucket is None:
+            raise EdgeException(f"Bucket '{bucket_name}' does not exist")
+        current = [dict(rule) for rule in bucket.lifecycle_rules]
+        added, removed = diff_lifecycle_rules(current, desired, managed_prefixes)
+        if not added and not removed:
+            sub_step.update("Lifecycle rules are up to date")
+            return True
+        sub_step.update("Lifecycle rules differ from vertex:edge config", status=TUIStatus.NEUTRAL)
+        sub_step.set_dirty()
+        for rule in removed:
+            sub_step.add_explanation(f"- {describe_lifecycle_rule(rule)}")
+        for rule in added:
+            sub_step.add_explanation(f"+ {describe_lifecycle_rule(rule)}")
+    if dry_run:
+        return False
+    with SubStepTUI("Applying lifecycle rules") as sub_step:
+        to_apply = questionary.confirm(
+            "Do you want to apply these changes to the bucket lifecycle rules?",
+            default=True,
+            qmark=qmark
+        ).ask()
+        if to_apply is None:
+            raise EdgeException("Canceled by user")
+        if not to_apply:
+            sub_step.update("Lifecycle rules are not applied", status=TUIStatus.WARNING)
+            return False
+        bucket.lifecycle_rules = [
+            rule for rule in current if not is_managed_lifecycle_rule(rule, managed_prefixes)
+        ] + desired
+        bucket.patch()
+    return True
+
+
 def delete_bucket(project_id: str, region: str, bucket_name: str):
     client = storage.Client(project_id)
     bucket = client.get_bucket(bucket_name)
@@ -0,0 +1,186 @@
+"""
+Garbage collection of the Vertex AI jobs directory in the storage bucket
+
+Every training run leaves a `<vertex_jobs_directory>/<model_id>/` prefix with its outputs, and Vertex AI stages
+source packages and job outputs next to them. Prefixes that no Vertex AI model in the project refers to any more
+are orphans.
+
+The directory is listed one level deep with a delimiter, so only the top-level prefixes are enumerated rather
+than every blob in the directory. Prefixes are then scanned and deleted on a thread pool, with batched delete
+requests.
+"""
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List, Set, Optional
+
+from google.cloud import storage
+
+from edge.storage import delete_blobs
+
+# Batch prediction inputs are cleaned up with their jobs, not by storage gc
+EXCLUDED_PREFIXES = ["batch-prediction/"]
+PAGE_SIZE = 1000
+
+
+@dataclass
+class PrefixUsage:
+    prefix: str
+    blob_count: int
+    size: int
+    # Time the most recent blob under the prefix was written
+    newest: Optional[datetime.datetime]
+
+
+@dataclass
+class GarbageCollectionReport:
+    scanned: int = 0
+    live: int = 0
+    recent: int = 0
+    deleted: List[PrefixUsage] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def blobs_deleted(self) -> int:
+        return sum(usage.blob_count for usage in self.deleted)
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        return sum(usage.size for usage in self.deleted)
+
+
+def list_top_level_prefixes(client: storage.Client, bucket_name: str, directory: str) -> List[str]:
+    """
+    List the prefixes directly under [directory], without listing the blobs below them
+
+    :param client:
+    :param bucket_name:
+    :param directory:
+    :return: prefixes, ending with "/"
+    """
+    iterator = client.list_blobs(
+        bucket_name,
+        prefix=directory.rstrip("/") + "/",
+        delimiter="/",
+        page_size=PAGE_SIZE,
+        fields="prefixes,nextPageToken",
+    )
+    prefixes = []
+    for page in iterator.pages:
+        prefixes += page.prefixes
+    return sorted(prefixes)
+
+
+def scan_prefix(client: storage.Client, bucket_name: str, prefix: str) -> (PrefixUsage, List[storage.Blob]):
+    blobs = list(client.list_blobs(
+        bucket_name, prefix=prefix, page_size=PAGE_SIZE, fields="items(name,size,updated),nextPageToken"
+    ))
+    usage = PrefixUsage(
+        prefix=prefix,
+        blob_count=len(blobs),
+        size=sum(blob.size or 0 for blob in blobs),
+        newest=max((blob.updated for blob in blobs if blob.updated is not None), default=None),
+    )
+    return usage, blobs
+
+
+def prefix_of_uri(uri: str, bucket_name: str, directory: str) -> Optional[str]:
+    """
+    Get the top-level prefix of [directory] that a Google Storage URI is under, if any
+
+    :param uri:
+    :param bucket_name:
+    :param directory:
+    :return:
+    """
+    base = f"gs://{bucket_name}/{directory.rstrip('/')}/"
+    if not uri.startswith(base):
+        return None
+    name = uri[len(base):].split("/")[0]
+    return f"{directory.rstrip('/')}/{name}/" if name else None
+
+
+def find_live_prefixes(artifact_uris: Iterable[str], bucket_name: str, directory: str) -> Set[str]:
+    """
+    Get the top-level prefixes of [directory] that model artifacts are stored under
+
+    :param artifact_uris: artifact URIs of models, wherever they are stored
+    :param bucket_name:
+    :param directory:
+    :return:
+    """
+    prefixes = set(prefix_of_uri(uri, bucket_name, directory) for uri in artifact_uris)
+    prefixes.discard(None)
+    return prefixes
+
+
+def collect_garbage(
+    client_factory: Callable[[], storage.Client],
+    bucket_name: str,
+    directory: str,
+    live_prefixes: Set[str],
+    min_age: datetime.timedelta,
+    dry_run: bool = False,
+    max_workers: int = 8,
+    on_progress: Optional[Callable[[GarbageCollectionReport, int], None]] = None,
+    now: Optional[datetime.datetime] = None,
+) -> GarbageCollectionReport:
+    """
+    Delete orphaned prefixes of [directory]
+
+    :param client_factory: creates a storage client. Every worker thread gets its own client, because batches
+                           are tracked per client.
+    :param bucket_name:
+    :param directory:
+    :param live_prefixes: prefixes that are still referenced, and are kept
+    :param min_age: prefixes written more recently than this are kept, as they may belong to a running job
+    :param dry_run: only report what would be deleted
+    :param max_workers:
+    :param on_progress: called with the report so far and the number of candidate prefixes, from the calling thread
+    :param now:
+    :return:
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    report = GarbageCollectionReport()
+    clients = threading.local()
+
+    def get_client() -> storage.Client:
+        if not hasattr(clients, "client"):
+            clients.client = client_factory()
+        return clients.client
+
+    candidates = []
+    for prefix in list_top_level_prefixes(get_client(), bucket_name, directory):
+        report.scanned += 1
+        relative = prefix[len(directory.rstrip("/")) + 1:]
+        if prefix in live_prefixes or any(relative.startswith(excluded) for excluded in EXCLUDED_PREFIXES):
+            report.live += 1
+        else:
+            candidates.append(prefix)
+
+    def process(prefix: str) -> Optional[PrefixUsage]:
+        client = get_client()
+        usage, blobs = scan_prefix(client, bucket_name, prefix)
+        if usage.newest is not None and now - usage.newest < min_age:
+            return None
+        if not dry_run:
+            delete_blobs(client, blobs)
+        return usage
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="edge-storage-gc") as executor:
+        futures = {executor.submit(process, prefix): prefix for prefix in candidates}
+        for future in as_completed(futures):
+            try:
+                usage = future.result()
+            except Exception as exc:
+                report.errors.append(f"{futures[future]}: {exc}")
+                continue
+            if usage is None:
+                report.recent += 1
+            else:
+                report.deleted.append(usage)
+            if on_progress is not None:
+                on_progress(report, len(candidates))
+    report.deleted.sort(key=lambda usage: usage.prefix)
+    return report
@@ -0,0 +1,106 @@
+"""
+Timing the phases of a training run
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any
+
+
+class PhaseTimer:
+    """
+    Records named phases using a monotonic clock, and exports them as Chrome trace events
+    (https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU)
+    """
+
+    def __init__(self):
+        self._origin = time.monotonic()
+        # Wall clock time of the origin, so that traces of other processes and times reported by APIs can be aligned
+        self._origin_unix_time = time.time()
+        self._events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str, category: str = "edge"):
+        """
+        Time the enclosed block as a phase called [name]
+
+        :param name:
+        :param category:
+        :return:
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.monotonic(), category)
+
+    def record(self, name: str, start: float, end: float, category: str = "edge"):
+        """
+        Record a phase from a pair of `time.monotonic()` readings
+
+        :param name:
+        :param start:
+        :param end:
+        :param category:
+        :return:
+        """
+        with self._lock:
+            self._events.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": int((start - self._origin) * 1e6),
+                "dur": int((end - start) * 1e6),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            })
+
+    def from_unix_time(self, timestamp: float) -> float:
+        """
+        Convert a wall clock time, e.g. when a Vertex AI job started, to a `time.monotonic()` reading for `record`
+
+        :param timestamp: seconds since the epoch
+        :return:
+        """
+        return self._origin + timestamp - self._origin_unix_time
+
+    def merge(self, trace: Dict[str, Any]):
+        """
+        Add the phases of a trace saved by another process, e.g. inside a Vertex AI training job. They keep their
+        process ID, so they are shown on their own rows.
+
+        :param trace: as returned by `to_trace`
+        :return:
+        """
+        origin_unix_time = trace.get("otherData", {}).get("origin_unix_time", self._origin_unix_time)
+        offset = int((origin_unix_time - self._origin_unix_time) * 1e6)
+        with self._lock:
+            for event in trace.get("traceEvents", []):
+                self._events.append({**event, "ts": event["ts"] + offset})
+
+    def durations(self) -> Dict[str, float]:
+        """
+        Total duration in seconds for each phase name
+
+        :return:
+        """
+        totals = {}
+        with self._lock:
+            for event in self._events:
+                totals[event["name"]] = totals.get(event["name"], 0.0) + event["dur"] / 1e6
+        return totals
+
+    def to_trace(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "traceEvents": list(self._events),
+                "displayTimeUnit": "ms",
+                "otherData": {"origin_unix_time": self._origin_unix_time},
+            }
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_trace(), f)
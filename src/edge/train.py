@@ -1,6 +1,7 @@
 import os
 import sys
 import abc
+import time
 import uuid
 import inspect
 import logging
@@ -11,14 +12,18 @@ from enum import Enum
 from serde import serialize, deserialize
 from serde.json import to_json
 from sacred import Experiment
-from sacred.observers import MongoObserver
-from google.cloud import secretmanager_v1
+from google.cloud import storage
 from google.cloud.aiplatform import Model, CustomJob
 
 import edge.path
 #from edge.state import EdgeState
 from edge.config import EdgeConfig
 from edge.exception import EdgeException
+from edge.local_experiments import SQLiteObserver
+from edge.registry import TRACE_FILE_NAME, read_trace, register_model_version, write_metrics, write_trace
+from edge.sacred import create_mongo_observer
+from edge.secret import SecretResolver
+from edge.timing import PhaseTimer
 
 logging.basicConfig(level = logging.INFO)
 
@@ -32,6 +37,8 @@ class TrainingTarget(Enum):
 class TrainedModel:
     model_name: Optional[str]
     is_local: bool = False
+    # Where a locally trained model has been saved
+    local_path: Optional[str] = None
 
     @classmethod
     def from_vertex_model(cls, model: Model):
@@ -40,10 +47,11 @@ class TrainedModel:
         )
 
     @classmethod
-    def from_local_model(cls):
+    def from_local_model(cls, local_path: Optional[str] = None):
         return TrainedModel(
             model_name=None,
             is_local=True,
+            local_path=local_path,
         )
 
 """
@@ -66,14 +74,18 @@ class Trainer():
     ]
     vertex_staging_path = None
     vertex_output_path = None
+    local_output_path = None
     script_path = None
     mongo_connection_string = None
+    mongo_secret = None
     target = TrainingTarget.LOCAL
     model_config = None
     model_id = None
+    phase_timer = None
 
     def __init__(self, name: str):
         self.name = name
+        self.phase_timer = PhaseTimer()
 
         # We need the path to the training script itself
         self.script_path = inspect.getframeinfo(sys._getframe(1)).filename
@@ -88,13 +100,14 @@ class Trainer():
 
         # Load the Edge configuration from the appropriate source
         # TODO: Document env var
-        if os.environ.get("EDGE_CONFIG"):
-            logging.info("Edge config will be loaded from environment variable EDGE_CONFIG_STRING")
-            self.edge_config = self._decode_config_string(os.environ.get("EDGE_CONFIG"))
-        else:
-            logging.info("Edge config will be loaded from edge.yaml")
-            # TODO: This isn't very stable. We should search for the config file.
-            self.edge_config = EdgeConfig.load(edge.path.get_default_config_path_from_model(inspect.getframeinfo(sys._getframe(1)).filename))
+        with self.timer("load_config"):
+            if os.environ.get("EDGE_CONFIG"):
+                logging.info("Edge config will be loaded from environment variable EDGE_CONFIG_STRING")
+                self.edge_config = self._decode_config_string(os.environ.get("EDGE_CONFIG"))
+            else:
+                logging.info("Edge config will be loaded from edge.yaml")
+                # TODO: This isn't very stable. We should search for the config file.
+                self.edge_config = EdgeConfig.load(edge.path.get_default_config_path_from_model(self.script_path))
 
         # Extract the model configuration and check if the model has been initialised
         if name in self.edge_config.models:
@@ -117,6 +130,7 @@ class Trainer():
             self.edge_config.storage_bucket.vertex_jobs_directory
         )
         self.vertex_output_path = os.path.join(self.vertex_staging_path, str(self.model_id))
+        self.local_output_path = os.path.join(os.path.dirname(os.path.abspath(self.script_path)), "trained_model")
 
         # Set up experiment tracking for this training job
         # TODO: Restore Git support
@@ -124,16 +138,15 @@ class Trainer():
         # TODO: Experiment initialisation in its own function (but *must* be called during construction)
         self.experiment = Experiment(name, save_git_info=True)
 
+        # The connection string is resolved in the background, and only waited on when the observer is needed
         # TODO: Document env var
         if os.environ.get("MONGO_CONNECTION_STRING"):
             self.mongo_connection_string = os.environ.get("MONGO_CONNECTION_STRING")
-        else:
-            self.mongo_connection_string = self._get_mongo_connection_string()
-
-        if self.mongo_connection_string is not None:
-            self.experiment.observers.append(MongoObserver(self.mongo_connection_string))
-        else:
-            logging.info("Experiment tracker has not been initialised")
+        elif self.edge_config.experiments is not None:
+            self.mongo_secret = SecretResolver(
+                self.edge_config.google_cloud_project.project_id,
+                self.edge_config.experiments.mongodb_connection_string_secret
+            )
 
         @self.experiment.main
         def ex_noop_main(c):
@@ -157,8 +170,17 @@ class Trainer():
         self.experiment_run.log_scalar(key, value)
 
     def get_model_save_path(self):
-        # TODO: Support local paths
-        return self.vertex_output_path
+        # MODEL_ID is set when the script runs inside a Vertex training job
+        if self.target == TrainingTarget.VERTEX or os.environ.get("MODEL_ID"):
+            return self.vertex_output_path
+        return self.local_output_path
+
+    """
+    Time a block of user code, e.g. `with self.timer("epoch"):`
+    The timing is recorded in the same trace as the training lifecycle phases
+    """
+    def timer(self, name: str):
+        return self.phase_timer.phase(name)
 
     """
     Executes the training script and tracks experiment details
@@ -168,38 +190,81 @@ class Trainer():
             os.path.dirname(self.script_path),
             "trained_model.json"
         )
+        trace_path = os.path.join(
+            os.path.dirname(self.script_path),
+            TRACE_FILE_NAME
+        )
 
-        with open(json_path, "w") as train_json:
-            if self.target == TrainingTarget.VERTEX:
-                self._run_on_vertex()
-
+        try:
+            with open(json_path, "w") as train_json:
+                if self.target == TrainingTarget.VERTEX:
+                    submitted = time.monotonic()
+                    job = None
+                    try:
+                        with self.timer("vertex_job"):
+                            job = self._create_vertex_job()
+                            job.run()
+                    finally:
+                        if job is not None:
+                            self._record_vertex_job_phases(job, submitted)
+                    self._merge_vertex_job_trace()
+
+                    try:
+                        with self.timer("upload_model"):
+                            model = self._create_model_on_vertex()
+                        train_json.write(to_json(TrainedModel.from_vertex_model(model)))
+                    except Exception as e:
+                        logging.info("Unable to capture saved model. This might mean the model has not been saved by the training script")
+                    else:
+                        try:
+                            with self.timer("register_model"):
+                                register_model_version(self.edge_config, self.name, model, self.vertex_output_path)
+                        except Exception as e:
+                            logging.warning(f"Unable to register the model version in vertex:edge state: {e}")
+                else:
+                    self._run_locally()
+                    local_path = self.get_model_save_path()
+                    train_json.write(to_json(TrainedModel.from_local_model(
+                        local_path if os.path.exists(local_path) else None
+                    )))
+        finally:
+            self.phase_timer.save(trace_path)
+            # Inside a Vertex training job, the trace is kept with the model, as the container's files are lost
+            if os.environ.get("MODEL_ID"):
                 try:
-                    model = self._create_model_on_vertex()
-                    train_json.write(to_json(TrainedModel.from_vertex_model(model)))
+                    write_trace(self.get_model_save_path(), self.phase_timer.to_trace())
                 except Exception as e:
-                    logging.info("Unable to capture saved model. This might mean the model has not been saved by the training script")
-            else:
-                self._run_locally()
-                train_json.write(to_json(TrainedModel.from_local_model()))
+                    logging.warning(f"Unable to save the training trace: {e}")
 
     def _run_locally(self):
-        self.experiment_run = self.experiment._create_run()
-        result = self.main()
+        self._attach_experiment_tracker()
+        with self.timer("create_run"):
+            self.experiment_run = self.experiment._create_run()
+        with self.timer("main"):
+            result = self.main()
 
         self.experiment_run.log_scalar("score", result)
+        self.experiment_run.info["timings"] = self.phase_timer.durations()
+        # Inside a Vertex training job, the score is kept with the model so that it is recorded in the registry
+        if os.environ.get("MODEL_ID") and result is not None:
+            try:
+                write_metrics(self.get_model_save_path(), {"score": float(result)})
+            except Exception as e:
+                logging.warning(f"Unable to save model metrics: {e}")
         self.experiment_run({})
 
-    def _run_on_vertex(self):
+    def _create_vertex_job(self) -> CustomJob:
         environment_variables = {
             "RUN_ON_VERTEX": "False",
             "EDGE_CONFIG": self._get_encoded_config(),
             "MODEL_ID": str(self.model_id)
         }
 
-        if self.mongo_connection_string is not None:
-            environment_variables["MONGO_CONNECTION_STRING"] = self.mongo_connection_string
+        mongo_connection_string = self._get_mongo_connection_string()
+        if mongo_connection_string is not None:
+            environment_variables["MONGO_CONNECTION_STRING"] = mongo_connection_string
 
-        CustomJob.from_local_script(
+        return CustomJob.from_local_script(
             display_name=f"{self.name}-custom-training",
             script_path=self.script_path,
             container_uri=self.model_config.training_container_image_uri,
@@ -210,7 +275,38 @@ class Trainer():
             location=self.edge_config.google_cloud_project.region,
             staging_bucket=self.vertex_staging_path,
             environment_variables=environment_variables
-        ).run()
+        )
+
+    """
+    Split the Vertex job into packaging and submission, queueing, and training, from the times Vertex AI recorded
+    """
+    def _record_vertex_job_phases(self, job: CustomJob, submitted: float):
+        try:
+            created, started, ended = job.create_time, job.start_time, job.end_time
+        except Exception as e:
+            logging.warning(f"Unable to get the times of the Vertex training job: {e}")
+            return
+        if created is not None:
+            created = self.phase_timer.from_unix_time(created.timestamp())
+            self.phase_timer.record("vertex_submit", submitted, max(submitted, created))
+            if started is not None:
+                started = self.phase_timer.from_unix_time(started.timestamp())
+                self.phase_timer.record("vertex_queue", created, max(created, started))
+                if ended is not None:
+                    ended = self.phase_timer.from_unix_time(ended.timestamp())
+                    self.phase_timer.record("vertex_training", started, max(started, ended))
+
+    """
+    Add the phases timed inside the Vertex job, e.g. `main`, to the trace of this run
+    """
+    def _merge_vertex_job_trace(self):
+        try:
+            trace = read_trace(storage.Client(), self.vertex_output_path)
+        except Exception as e:
+            logging.warning(f"Unable to read the trace of the Vertex training job: {e}")
+            return
+        if trace is not None:
+            self.phase_timer.merge(trace)
 
     def _create_model_on_vertex(self):
         return Model.upload(
@@ -218,7 +314,7 @@ class Trainer():
             project=self.edge_config.google_cloud_project.project_id,
             location=self.edge_config.google_cloud_project.region,
             serving_container_image_uri=self.model_config.serving_container_image_uri,
-            artifact_uri=self.get_model_save_path()
+            artifact_uri=self.vertex_output_path
         )
 
     def _get_encoded_config(self) -> str:
@@ -227,12 +323,32 @@ class Trainer():
     def _decode_config_string(self, s: str) -> EdgeConfig:
         return EdgeConfig.from_string(s.replace("\\n", "\n"))
 
-    def _get_mongo_connection_string(self) -> str:
-        # Try to get the Mongo connection string, if available
-        try:
-            client = secretmanager_v1.SecretManagerServiceClient()
-            secret_name = f"projects/{self.edge_config.google_cloud_project.project_id}/secrets/{self.edge_config.experiments.mongodb_connection_string_secret}/versions/latest"
-            response = client.access_secret_version(name=secret_name)
-            return response.payload.data.decode("UTF-8")
-        except Exception as e:
-            return None
+    def _attach_experiment_tracker(self):
+        mongo_connection_string = self._get_mongo_connection_string()
+        if mongo_connection_string is not None:
+            with self.timer("connect_mongo_observer"):
+                self.experiment.observers.append(create_mongo_observer(mongo_connection_string))
+        else:
+            local_store_path = edge.path.get_local_experiments_path(os.path.dirname(os.path.abspath(
+                edge.path.get_default_config_path_from_model(self.script_path)
+            )))
+            if self.edge_config.experiments is None:
+                logging.info(f"Experiment tracker has not been initialised, the experiment will be tracked locally "
+                             f"in {local_store_path}")
+            else:
+                logging.warning(f"Unable to connect to the experiment tracker, the experiment will be tracked "
+                                f"locally in {local_store_path} instead. Run `./edge.sh experiments list --local` "
+                                "to see it.")
+            with self.timer("connect_local_observer"):
+                self.experiment.observers.append(SQLiteObserver(local_store_path))
+
+    def _get_mongo_connection_string(self) -> Optional[str]:
+        # Wait for the background lookup of the Mongo connection string, if one was started
+        if self.mongo_connection_string is None and self.mongo_secret is not None:
+            with self.timer("get_mongo_connection_string"):
+                try:
+                    self.mongo_connection_string = self.mongo_secret.get()
+                except Exception as e:
+                    logging.info(f"Unable to get the experiment tracker connection string: {e}")
+                self.mongo_secret = None
+        return self.mongo_connection_string
@@ -1,6 +1,9 @@
 import sys
+import threading
 import traceback
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional, Callable, List, Dict
 import questionary
 from enum import Enum
 from edge.exception import EdgeException
@@ -81,6 +84,18 @@ def print_warning_explanation(text: str):
     questionary.print(strfmt_failure_explanation(text), styles["warning"])
 
 
+def format_size(size: float) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def format_throughput(bytes_per_second: float) -> str:
+    return f"{bytes_per_second / 1024 / 1024:.1f} MB/s"
+
+
 def clear_last_line():
     print("\033[1A\033[0K", end="\r")
 
@@ -93,6 +108,36 @@ class TUIStatus(Enum):
     WARNING = "warning"
 
 
+_thread_local = threading.local()
+
+
+def _get_reporter() -> Optional[Callable[[str, TUIStatus], None]]:
+    return getattr(_thread_local, "reporter", None)
+
+
+def is_reporting_steps() -> bool:
+    """
+    Check if steps run on the current thread are sent to a reporter, i.e. if it runs on behalf of a `ParallelTUI`
+    """
+    return _get_reporter() is not None
+
+
+@contextmanager
+def report_steps_to(reporter: Callable[[str, TUIStatus], None]):
+    """
+    Send steps and sub-steps run on the current thread to [reporter] instead of printing them, so that steps
+    running concurrently do not garble each other's output
+
+    :param reporter: called with the message and status of every step update
+    :return:
+    """
+    _thread_local.reporter = reporter
+    try:
+        yield
+    finally:
+        _thread_local.reporter = None
+
+
 class TUI(object):
     def __init__(
         self,
@@ -119,7 +164,7 @@ class TUI(object):
             print()
             print(self.success_message)
             sys.exit(0)
-        elif exc_type is EdgeException:
+        elif issubclass(exc_type, EdgeException):
             print()
             questionary.print(self.failure_title, style="fg:ansired")
             print()
@@ -145,6 +190,10 @@ class StepTUI(object):
     def print(self):
         if self.silent:
             return
+        reporter = _get_reporter()
+        if reporter is not None:
+            reporter(self.message, TUIStatus.PENDING)
+            return
         questionary.print(f"{self.emoji} {self.message}", "bold")
 
 
@@ -183,7 +232,7 @@ class SubStepTUI(object):
         if exc_type is None:  # sub-step exited with errors
             if self.status == TUIStatus.PENDING:
                 self.update(status=TUIStatus.SUCCESSFUL)
-        elif exc_type is EdgeException:
+        elif issubclass(exc_type, EdgeException):
             if exc_val.fatal:
                 self.update(status=TUIStatus.FAILED)
                 suppress = False
@@ -209,6 +258,10 @@ class SubStepTUI(object):
             return
         if not self._entered:
             return
+        reporter = _get_reporter()
+        if reporter is not None:
+            reporter(self.message, self.status)
+            return
         if self.written and not self._dirty:
             clear_last_line()
         line = f"  {self.emoji[self.status]} {self.message}"
@@ -223,9 +276,108 @@ class SubStepTUI(object):
         self.print()
 
     def add_explanation(self, text: str):
+        if self.silent:
+            return
+        reporter = _get_reporter()
+        if reporter is not None:
+            reporter(f"{self.message}: {text}", self.status)
+            return
         self._dirty = True
         line = f"   - {text}"
         questionary.print(line, self.style[self.status])
 
     def set_dirty(self):
         self._dirty = True
+
+
+class ParallelTUI(object):
+    """
+    Runs the same operation for several items concurrently, showing one progress line per item.
+    Steps and sub-steps inside the operation update the item's line rather than being printed.
+    """
+
+    def __init__(self, items: List[str], max_workers: int = 4):
+        self.items = items
+        self.max_workers = max_workers
+        self.lines: Dict[str, tuple] = {item: ("waiting", TUIStatus.NEUTRAL) for item in items}
+        self.errors: Dict[str, str] = {}
+        self._failures: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._drawn = False
+        self._interactive = sys.stdout.isatty()
+
+    def _line(self, item: str) -> str:
+        message, status = self.lines[item]
+        return f"  {SubStepTUI.emoji[status]} {item}: {message}"
+
+    def update(self, item: str, message: str, status: TUIStatus):
+        # Each item keeps to a single line, so that the block can be redrawn in place
+        message = message.strip().splitlines()[-1] if message.strip() else message
+        with self._lock:
+            self.lines[item] = (message, status)
+            if not self._interactive:
+                # Without a terminal lines cannot be redrawn, so only the outcome of each item is printed
+                if status in (TUIStatus.SUCCESSFUL, TUIStatus.FAILED):
+                    questionary.print(self._line(item), SubStepTUI.style[status])
+                return
+            if self._drawn:
+                print(f"\033[{len(self.items)}A", end="")
+            for i in self.items:
+                print("\033[0K", end="")
+                questionary.print(self._line(i), SubStepTUI.style[self.lines[i][1]])
+            self._drawn = True
+
+    def _report(self, item: str, message: str, status: TUIStatus):
+        if status == TUIStatus.FAILED:
+            # Sub-steps report the cause of a failure before raising
+            self._failures[item] = message
+        self.update(item, message, TUIStatus.PENDING)
+
+    def run_item(self, item: str, operation: Callable[[str], None]) -> bool:
+        """
+        Run [operation] for one item on the current thread, showing its steps on the item's line
+
+        :param item:
+        :param operation: called with the item
+        :return: whether the operation succeeded. If not, the error is recorded in `errors`
+        """
+        self.update(item, "starting", TUIStatus.PENDING)
+        try:
+            with report_steps_to(lambda message, status: self._report(item, message, status)):
+                operation(item)
+        except Exception as exc:
+            self.errors[item] = self._failures.get(item, str(exc))
+            self.update(item, self.errors[item], TUIStatus.FAILED)
+            return False
+        self.update(item, "done", TUIStatus.SUCCESSFUL)
+        return True
+
+    def run(self, operation: Callable[[str], None]) -> Dict[str, str]:
+        """
+        Run [operation] for every item. A failure of one item does not stop the others.
+
+        :param operation: called with the item, on a worker thread
+        :return: error message of every item that failed
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="edge-parallel") as executor:
+            for item in self.items:
+                executor.submit(self.run_item, item, operation)
+        return self.errors
+
+
+def report_failures(errors: Dict[str, str], total: int, action: str):
+    """
+    Show the items that failed in a `ParallelTUI` run, and fail the command if there are any
+
+    :param errors: error message of every item that failed
+    :param total: number of items that were run
+    :param action: e.g. "deploy"
+    :return:
+    """
+    if not errors:
+        return
+    with StepTUI("Failures", emoji="📋"):
+        for item, error in errors.items():
+            with SubStepTUI(f"'{item}' failed", status=TUIStatus.FAILED) as sub_step:
+                sub_step.add_explanation(error)
+    raise EdgeException(f"{len(errors)} of {total} failed to {action}")
@@ -1,24 +1,432 @@
-from google.cloud.aiplatform import Model, Endpoint
+import datetime
+import time
+from typing import Set, Dict, Optional, Callable
+
+from google.api_core.operation import Operation
+
+from google.cloud.aiplatform import Model, Endpoint, compat
+from google.cloud.aiplatform.compat.types import endpoint as gca_endpoint
+from google.cloud.aiplatform.compat.types import endpoint_v1beta1 as gca_endpoint_v1beta1
+from google.cloud.aiplatform.compat.types import machine_resources as gca_machine_resources
+from google.cloud.aiplatform.compat.types import machine_resources_v1beta1 as gca_machine_resources_v1beta1
 from google.api_core.exceptions import NotFound
 
+from edge.canary import MetricsSource, evaluate_step
+from edge.config import ServingConfig, CanaryConfig
+from edge.endpoint import endpoint_lock, get_owned_deployed_model_ids, set_model_traffic
 from edge.exception import EdgeException
-from edge.tui import StepTUI, SubStepTUI
+from edge.state import ModelState, RolloutState, PendingDeploymentState
+from edge.tui import StepTUI, SubStepTUI, TUIStatus
+
+
+def get_endpoint(endpoint_resource_name: str) -> Endpoint:
+    try:
+        return Endpoint(endpoint_name=endpoint_resource_name)
+    except NotFound:
+        raise EdgeException(f"Endpoint '{endpoint_resource_name}' is not found. Please reinitialise the model "
+                            f"by running `./edge.py model init` to create it.")
+
+
+def get_model(model_resource_name: str) -> Model:
+    try:
+        return Model(model_resource_name)
+    except NotFound:
+        raise EdgeException(f"Model '{model_resource_name}' is not found. You need to train a model "
+                            f"by running `dvc repro ...`.")
+
+
+def get_deployed_model_ids(endpoint: Endpoint) -> Set[str]:
+    return set(deployed_model.id for deployed_model in endpoint.list_models())
+
+
+CPU_UTILIZATION_METRIC = "aiplatform.googleapis.com/prediction/online/cpu/utilization"
+
+
+def start_deploy_model(
+    endpoint: Endpoint,
+    model: Model,
+    serving: ServingConfig,
+    traffic_split: Dict[str, int],
+) -> Operation:
+    """
+    Start deploying [model] on [endpoint] with the given serving resources, without waiting for it to finish.
+
+    The deployment request is built directly, because `Endpoint.deploy` does not expose autoscaling targets.
+    Autoscaling targets are only part of the v1beta1 API, so models with one are deployed through it.
+
+    :param endpoint:
+    :param model:
+    :param serving:
+    :param traffic_split: the new traffic split of the endpoint, where "0" refers to the model being deployed
+    :return: the long-running deployment operation
+    """
+    if serving.min_replica_count < 1 or serving.max_replica_count < serving.min_replica_count:
+        raise EdgeException(f"Invalid replica counts: min {serving.min_replica_count}, "
+                            f"max {serving.max_replica_count}. Check `serving` in the model configuration.")
+    target = serving.autoscaling_target_cpu_utilization
+    if target is not None and not 0 < target <= 100:
+        raise EdgeException(f"Invalid autoscaling target CPU utilization {target}%. It must be a percentage. "
+                            f"Check `serving` in the model configuration.")
+    api_client, endpoint_types, machine_resources_types = endpoint.api_client, gca_endpoint, gca_machine_resources
+    if target is not None:
+        api_client = api_client.select_version(compat.V1BETA1)
+        endpoint_types, machine_resources_types = gca_endpoint_v1beta1, gca_machine_resources_v1beta1
+    dedicated_resources = machine_resources_types.DedicatedResources(
+        machine_spec=machine_resources_types.MachineSpec(machine_type=serving.machine_type),
+        min_replica_count=serving.min_replica_count,
+        max_replica_count=serving.max_replica_count,
+    )
+    if target is not None:
+        dedicated_resources.autoscaling_metric_specs = [
+            machine_resources_types.AutoscalingMetricSpec(metric_name=CPU_UTILIZATION_METRIC, target=target)
+        ]
+    return api_client.deploy_model(
+        endpoint=endpoint.resource_name,
+        deployed_model=endpoint_types.DeployedModel(
+            model=model.resource_name,
+            display_name=model.display_name,
+            dedicated_resources=dedicated_resources,
+        ),
+        traffic_split=traffic_split,
+    )
+
+
+def deploy_model(endpoint: Endpoint, model: Model, serving: ServingConfig, traffic_split: Dict[str, int]) -> str:
+    """
+    Deploy [model] on [endpoint] with the given serving resources, and wait until it is ready to serve
+
+    :param endpoint:
+    :param model:
+    :param serving:
+    :param traffic_split: the new traffic split of the endpoint, where "0" refers to the model being deployed
+    :return: id of the new deployed model
+    """
+    with endpoint_lock(endpoint.resource_name):
+        operation = start_deploy_model(endpoint, model, serving, traffic_split)
+        deployed_model_id = operation.result().deployed_model.id
+        endpoint._sync_gca_resource()
+    return deployed_model_id
+
+
+def undeploy_models(endpoint: Endpoint, deployed_model_ids: Set[str]):
+    with endpoint_lock(endpoint.resource_name):
+        for deployed_model_id in deployed_model_ids:
+            endpoint.undeploy(deployed_model_id)
+
+
+def traffic_split_without_new_model(endpoint: Endpoint) -> Dict[str, int]:
+    """
+    Traffic split that deploys a model alongside the models already on [endpoint], without sending it any traffic
+    """
+    endpoint._sync_gca_resource()
+    traffic_split = dict(endpoint._gca_resource.traffic_split)
+    if sum(traffic_split.values()) == 100:
+        traffic_split["0"] = 0
+    else:
+        # Nothing is serving traffic on this endpoint yet, so there is nothing to protect
+        traffic_split = {"0": 100}
+    return traffic_split
+
+
+def deploy_without_traffic(endpoint: Endpoint, model: Model, serving: ServingConfig) -> str:
+    """
+    Deploy [model] on [endpoint] alongside the models that are already deployed, without sending it any traffic.
+    The call returns once the new deployed model is ready to serve.
+
+    :param endpoint:
+    :param model:
+    :param serving:
+    :return: id of the new deployed model
+    """
+    with endpoint_lock(endpoint.resource_name):
+        return deploy_model(endpoint, model, serving, traffic_split_without_new_model(endpoint))
+
+
+def start_deploy(
+    endpoint_resource_name: str,
+    model_resource_name: str,
+    model_state: ModelState,
+    serving: ServingConfig,
+    shared: bool = False,
+):
+    """
+    Start deploying a model alongside its current deployment, and record the operation in [model_state] so that
+    the deployment can be completed by `finish_deploy` from a later command
+
+    :param endpoint_resource_name:
+    :param model_resource_name:
+    :param model_state:
+    :param serving:
+    :param shared: whether other models are co-hosted on the endpoint
+    :return:
+    """
+    with SubStepTUI(f"Checking endpoint '{endpoint_resource_name}'"):
+        endpoint = get_endpoint(endpoint_resource_name)
+    with SubStepTUI(f"Checking model '{model_resource_name}'"):
+        model = get_model(model_resource_name)
+    with SubStepTUI(f"Starting deployment of '{model_resource_name}' ({describe_serving(serving)})"):
+        with endpoint_lock(endpoint.resource_name):
+            previous_ids = get_owned_deployed_model_ids(endpoint, model_state, shared)
+            operation = start_deploy_model(endpoint, model, serving, traffic_split_without_new_model(endpoint))
+        model_state.pending_deployment = PendingDeploymentState(
+            operation_name=operation.operation.name,
+            model_resource_name=model_resource_name,
+            serving=serving,
+            previous_deployed_model_ids=sorted(previous_ids),
+            started_at=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        )
+
+
+def finish_deploy(model_name: str, model_state: ModelState, operation: dict):
+    """
+    Complete a deployment started by `start_deploy` once its operation is done: switch the model's traffic to the
+    new deployed model, undeploy the previous ones, and record the deployment in [model_state]
+
+    :param model_name:
+    :param model_state:
+    :param operation: the finished operation, see `edge.operations.get_operation`
+    :return:
+    """
+    pending = model_state.pending_deployment
+    if "error" in operation:
+        model_state.pending_deployment = None
+        raise EdgeException(f"Deployment of '{pending.model_resource_name}' failed: "
+                            f"{operation['error'].get('message', operation['error'])}")
+    deployed_model_id = operation["response"]["deployedModel"]["id"]
+    endpoint = get_endpoint(model_state.endpoint_resource_name)
+    previous_ids = set(pending.previous_deployed_model_ids) & get_deployed_model_ids(endpoint)
+    with SubStepTUI(f"Switching all traffic of '{model_name}' to the new deployment"):
+        set_model_traffic(endpoint, previous_ids, {deployed_model_id: 100})
+        model_state.deployed_model_id = deployed_model_id
+        model_state.deployed_serving = pending.serving
+        model_state.deployed_model_resource_name = pending.model_resource_name
+        model_state.standby_deployed_model_id = None
+        model_state.pending_deployment = None
+    with SubStepTUI(f"Undeploying previous models of '{model_name}' from endpoint '{endpoint.resource_name}'"):
+        undeploy_models(endpoint, previous_ids - {deployed_model_id})
+
+
+def blue_green_deploy(
+    endpoint: Endpoint,
+    model: Model,
+    model_state: ModelState,
+    model_name: str,
+    serving: ServingConfig,
+    shared: bool = False,
+):
+    """
+    Replace the models deployed on [endpoint] with [model] without downtime: the new model is deployed next to the
+    current one, traffic is switched over once it is ready, and only then the previous models are undeployed
+
+    :param endpoint:
+    :param model:
+    :param model_state: updated with the deployed model ids as the deployment progresses
+    :param model_name:
+    :param serving:
+    :param shared: whether other models are co-hosted on the endpoint, whose deployments are left untouched
+    :return:
+    """
+    previous_ids = get_owned_deployed_model_ids(endpoint, model_state, shared)
+    with SubStepTUI(f"Deploying model '{model.resource_name}' alongside the current deployment (no traffic)"):
+        model_state.standby_deployed_model_id = deploy_without_traffic(endpoint, model, serving)
+    with SubStepTUI(f"Switching all traffic of '{model_name}' to the new deployment"):
+        set_model_traffic(endpoint, previous_ids, {model_state.standby_deployed_model_id: 100})
+        model_state.standby_deployed_model_id, model_state.deployed_model_id = (
+            model_state.deployed_model_id, model_state.standby_deployed_model_id
+        )
+        model_state.deployed_serving = serving
+    with SubStepTUI(f"Undeploying previous models of '{model_name}' from endpoint '{endpoint.resource_name}'"):
+        undeploy_models(endpoint, previous_ids - {model_state.deployed_model_id})
+        model_state.standby_deployed_model_id = None
+
+
+def replace_deploy(
+    endpoint: Endpoint,
+    model: Model,
+    model_state: ModelState,
+    model_name: str,
+    serving: ServingConfig,
+    shared: bool = False,
+):
+    if shared:
+        # Undeploying first would take the model offline, so it is replaced without touching other models instead
+        blue_green_deploy(endpoint, model, model_state, model_name, serving, shared=True)
+        return
+    with SubStepTUI(f"Undeploying previous models from endpoint '{endpoint.resource_name}'"):
+        undeploy_models(endpoint, get_owned_deployed_model_ids(endpoint, model_state, shared=False))
+        model_state.deployed_model_id = None
+        model_state.deployed_serving = None
+    with SubStepTUI(f"Deploying model '{model.resource_name}' on endpoint '{endpoint.resource_name}' "
+                    f"({describe_serving(serving)})"):
+        model_state.deployed_model_id = deploy_model(endpoint, model, serving, {"0": 100})
+        model_state.deployed_serving = serving
+
+
+def canary_deploy(
+    endpoint: Endpoint,
+    model: Model,
+    model_state: ModelState,
+    model_name: str,
+    serving: ServingConfig,
+    canary: CanaryConfig,
+    metrics_source: MetricsSource,
+    checkpoint: Optional[Callable[[], None]] = None,
+    sleep: Callable[[float], None] = time.sleep,
+    shared: bool = False,
+):
+    """
+    Roll [model] out progressively: the new model is deployed next to the current one, and traffic is shifted to it
+    in the configured steps. Before each step, latency and error rate gates are evaluated on the new model, and the
+    rollout is rolled back if any of them fails, or if the new model does not serve enough requests to evaluate
+    them. See `edge.canary.evaluate_step`.
+
+    Progress is kept in [model_state].rollout and saved with [checkpoint] after every step, so an interrupted
+    rollout is resumed by running the same deployment again.
+
+    :return:
+    """
+    if not canary.steps or canary.steps[-1] != 100 or any(not 0 < p <= 100 for p in canary.steps):
+        raise EdgeException(f"Invalid canary steps {canary.steps}. Steps must be percentages ending with 100.")
+    # A step that never waits could never serve enough requests, and would query the metrics forever
+    if canary.step_wait_seconds <= 0:
+        raise EdgeException(f"Invalid canary step_wait_seconds {canary.step_wait_seconds}. It must be positive.")
+    if canary.max_step_wait_seconds < canary.step_wait_seconds:
+        raise EdgeException(f"Invalid canary max_step_wait_seconds {canary.max_step_wait_seconds}. It must be at "
+                            f"least step_wait_seconds ({canary.step_wait_seconds}).")
+    if canary.min_requests < 0:
+        raise EdgeException(f"Invalid canary min_requests {canary.min_requests}. It must not be negative.")
+
+    def save_progress():
+        if checkpoint is not None:
+            checkpoint()
+
+    rollout = model_state.rollout
+    if rollout is not None and rollout.model_resource_name != model.resource_name:
+        raise EdgeException(f"A canary rollout of '{rollout.model_resource_name}' is in progress. "
+                            f"Finish it by deploying that model with `--canary` again before rolling out "
+                            f"another model.")
+
+    if rollout is None:
+        baseline_id = model_state.deployed_model_id
+        if baseline_id is None or baseline_id not in get_deployed_model_ids(endpoint):
+            with SubStepTUI("No model is serving on the endpoint, so the model is deployed directly",
+                            status=TUIStatus.NEUTRAL):
+                pass
+            replace_deploy(endpoint, model, model_state, model_name, serving, shared)
+            return
+        with SubStepTUI(f"Deploying model '{model.resource_name}' alongside the current deployment (no traffic)"):
+            candidate_id = deploy_without_traffic(endpoint, model, serving)
+            rollout = RolloutState(
+                model_resource_name=model.resource_name,
+                candidate_deployed_model_id=candidate_id,
+                baseline_deployed_model_id=baseline_id,
+            )
+            model_state.rollout = rollout
+            model_state.standby_deployed_model_id = candidate_id
+            save_progress()
+    else:
+        with SubStepTUI(f"Resuming canary rollout at {rollout.traffic_percentage}% of traffic",
+                        status=TUIStatus.NEUTRAL):
+            pass
+
+    while rollout.next_step < len(canary.steps):
+        if rollout.traffic_percentage > 0:
+            message = f"Evaluating new model at {rollout.traffic_percentage}% of traffic"
+            with SubStepTUI(f"{message} (waiting {canary.step_wait_seconds}s)") as sub_step:
+                def on_extend(metrics, waited):
+                    sub_step.update(f"{message} ({metrics.request_count} of {canary.min_requests} requests "
+                                    f"served in {waited}s, waiting {canary.step_wait_seconds}s more)")
+
+                failure = evaluate_step(
+                    metrics_source, endpoint.resource_name, rollout.candidate_deployed_model_id, canary, sleep,
+                    on_extend,
+                )
+            if failure is not None:
+                rollback_canary(endpoint, model_state)
+                save_progress()
+                raise EdgeException(f"Canary rollout of '{model_name}' was rolled back: {failure}")
+
+        percentage = canary.steps[rollout.next_step]
+        with SubStepTUI(f"Shifting {percentage}% of traffic to the new model"):
+            # Percentages are of the model's own traffic, which matters when the endpoint is shared
+            set_model_traffic(
+                endpoint,
+                {rollout.candidate_deployed_model_id, rollout.baseline_deployed_model_id},
+                {
+                    rollout.candidate_deployed_model_id: percentage,
+                    rollout.baseline_deployed_model_id: 100 - percentage,
+                },
+            )
+            rollout.traffic_percentage = percentage
+            rollout.next_step += 1
+            save_progress()
+
+    with SubStepTUI(f"Promoting the new model and undeploying the previous one"):
+        undeploy_models(endpoint, {rollout.baseline_deployed_model_id})
+        model_state.deployed_model_id = rollout.candidate_deployed_model_id
+        model_state.deployed_serving = serving
+        model_state.standby_deployed_model_id = None
+        model_state.rollout = None
+
+
+def rollback_canary(endpoint: Endpoint, model_state: ModelState):
+    rollout = model_state.rollout
+    with SubStepTUI("Rolling back: returning all traffic to the previous model"):
+        set_model_traffic(
+            endpoint,
+            {rollout.candidate_deployed_model_id, rollout.baseline_deployed_model_id},
+            {rollout.baseline_deployed_model_id: 100},
+        )
+        undeploy_models(endpoint, {rollout.candidate_deployed_model_id})
+        model_state.standby_deployed_model_id = None
+        model_state.rollout = None
+
+
+def describe_serving(serving: ServingConfig) -> str:
+    if serving.min_replica_count == serving.max_replica_count:
+        replicas = f"{serving.min_replica_count} replica{'s' if serving.min_replica_count > 1 else ''}"
+    else:
+        replicas = f"{serving.min_replica_count}-{serving.max_replica_count} replicas"
+        if serving.autoscaling_target_cpu_utilization is not None:
+            replicas += f" at {serving.autoscaling_target_cpu_utilization}% CPU"
+    return f"{serving.machine_type}, {replicas}"
 
 
-def vertex_deploy(endpoint_resource_name: str, model_resource_name: str, model_name: str):
+def vertex_deploy(
+    endpoint_resource_name: str,
+    model_resource_name: str,
+    model_name: str,
+    model_state: ModelState,
+    serving: ServingConfig,
+    blue_green: bool = False,
+    canary: Optional[CanaryConfig] = None,
+    metrics_source: Optional[MetricsSource] = None,
+    checkpoint: Optional[Callable[[], None]] = None,
+    shared: bool = False,
+):
     with StepTUI(f"Deploying model '{model_name}'", emoji="🐏"):
         with SubStepTUI(f"Checking endpoint '{endpoint_resource_name}'"):
-            try:
-                endpoint = Endpoint(endpoint_name=endpoint_resource_name)
-            except NotFound:
-                raise EdgeException(f"Endpoint '{endpoint_resource_name}' is not found. Please reinitialise the model "
-                                    f"by running `./edge.py model init` to create it.")
-        with SubStepTUI(f"Undeploying previous models from endpoint '{endpoint_resource_name}'"):
-            endpoint.undeploy_all()
-        with SubStepTUI(f"Deploying model '{model_resource_name}' on endpoint '{endpoint_resource_name}'"):
-            try:
-                model = Model(model_resource_name)
-            except NotFound:
-                raise EdgeException(f"Model '{model_resource_name}' is not found. You need to train a model "
-                                    f"by running `dvc repro ...`.")
-            endpoint.deploy(model=model, traffic_percentage=100, machine_type="n1-standard-2")
+            endpoint = get_endpoint(endpoint_resource_name)
+        with SubStepTUI(f"Checking model '{model_resource_name}'"):
+            model = get_model(model_resource_name)
+        if canary is not None:
+            canary_deploy(endpoint, model, model_state, model_name, serving, canary, metrics_source, checkpoint,
+                          shared=shared)
+            return
+        if model_state.deployed_model_resource_name == model_resource_name:
+            if model_state.deployed_serving == serving:
+                with SubStepTUI(f"Model '{model_name}' is already deployed with {describe_serving(serving)}",
+                                status=TUIStatus.NEUTRAL):
+                    return
+            # Only the serving resources differ, so the model is resized without downtime
+            previous_serving = (
+                describe_serving(model_state.deployed_serving) if model_state.deployed_serving is not None
+                else "unknown resources"
+            )
+            with SubStepTUI(f"Resizing '{model_name}' from {previous_serving} to {describe_serving(serving)}",
+                            status=TUIStatus.NEUTRAL):
+                blue_green = True
+        if blue_green:
+            blue_green_deploy(endpoint, model, model_state, model_name, serving, shared)
+        else:
+            replace_deploy(endpoint, model, model_state, model_name, serving, shared)
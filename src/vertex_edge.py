@@ -12,6 +12,8 @@ from edge.command.init import edge_init
 from edge.command.dvc.subparser import add_dvc_parser, run_dvc_actions
 from edge.command.config.subparser import add_config_parser, run_config_actions
 from edge.command.model.subparser import add_model_parser, run_model_actions
+from edge.command.storage.subparser import add_storage_parser, run_storage_actions
+from edge.command.data.subparser import add_data_parser, run_data_actions
 
 logging.disable(logging.WARNING)
 warnings.filterwarnings(
@@ -34,6 +36,8 @@ if __name__ == "__main__":
     add_model_parser(subparsers)
     add_experiments_parser(subparsers)
     add_config_parser(subparsers)
+    add_storage_parser(subparsers)
+    add_data_parser(subparsers)
 
     args = parser.parse_args()
 
@@ -49,5 +53,9 @@ if __name__ == "__main__":
         run_experiments_actions(args)
     elif args.command == "config":
         run_config_actions(args)
+    elif args.command == "storage":
+        run_storage_actions(args)
+    elif args.command == "data":
+        run_data_actions(args)
 
     raise NotImplementedError("The rest of the commands are not implemented")
@@ -0,0 +1,92 @@
+import shutil
+import socket
+import subprocess
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pymongo
+import pytest
+import questionary
+
+from edge.config import EdgeConfig, GCProjectConfig, StorageBucketConfig
+from edge.state import EdgeState
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="session")
+def mongod(tmp_path_factory):
+    """
+    Start a local mongod for the session
+
+    :return: its connection string, for the "sacred" database
+    """
+    executable = shutil.which("mongod")
+    if executable is None:
+        pytest.skip("mongod is not installed")
+    port = _free_port()
+    process = subprocess.Popen(
+        [executable, "--dbpath", str(tmp_path_factory.mktemp("mongod")), "--port", str(port), "--bind_ip", "127.0.0.1"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    client = pymongo.MongoClient("127.0.0.1", port, serverSelectionTimeoutMS=500)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                client.admin.command("ping")
+                break
+            except pymongo.errors.PyMongoError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("mongod did not start")
+        yield f"mongodb://127.0.0.1:{port}/sacred"
+    finally:
+        client.close()
+        process.terminate()
+        process.wait()
+
+
+@pytest.fixture
+def mongo_database(mongod):
+    """
+    Empty "sacred" database on the local mongod
+    """
+    client = pymongo.MongoClient(mongod)
+    client.drop_database("sacred")
+    yield client.sacred
+    client.close()
+
+
+@pytest.fixture
+def project(monkeypatch):
+    """
+    In-memory vertex:edge configuration and state, used by commands instead of `edge.yaml` and the state in Google
+    Storage. Confirmations are answered with yes.
+
+    :return: (config, state)
+    """
+    config = EdgeConfig(
+        google_cloud_project=GCProjectConfig(project_id="project", region="europe-west4"),
+        storage_bucket=StorageBucketConfig(bucket_name="bucket", dvc_store_directory="dvcstore",
+                                           vertex_jobs_directory="vertex"),
+    )
+    state = EdgeState(models={})
+
+    @contextmanager
+    def config_context(*args, **kwargs):
+        yield config
+
+    @contextmanager
+    def state_context(*args, **kwargs):
+        yield state
+
+    monkeypatch.setattr(EdgeConfig, "context", config_context)
+    monkeypatch.setattr(EdgeState, "context", state_context)
+    monkeypatch.setattr(questionary, "confirm", lambda *args, **kwargs: SimpleNamespace(ask=lambda: True))
+    return config, state
@@ -0,0 +1,265 @@
+"""
+Fakes of the Vertex AI and Google Storage objects that vertex:edge works with
+"""
+import datetime
+import io
+import itertools
+import zlib
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from google.api_core.exceptions import NotFound
+
+from edge.endpoint import apportion
+
+
+class FakeDeployOperation:
+    def __init__(self, name: str, deployed_model_id: str, error: Optional[Exception] = None):
+        self.operation = SimpleNamespace(name=name)
+        self.deployed_model_id = deployed_model_id
+        self.error = error
+
+    def result(self):
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(deployed_model=SimpleNamespace(id=self.deployed_model_id))
+
+
+class FakeEndpointApiClient:
+    def __init__(self, endpoint: "FakeEndpoint"):
+        self.endpoint = endpoint
+
+    def select_version(self, version: str) -> "FakeEndpointApiClient":
+        self.endpoint.api_versions.append(version)
+        return self
+
+    def deploy_model(self, endpoint: str, deployed_model, traffic_split: Dict[str, int]) -> FakeDeployOperation:
+        assert endpoint == self.endpoint.resource_name
+        self.endpoint.deploy_requests.append(deployed_model)
+        deployed_model_id = str(next(self.endpoint.ids))
+        operation = FakeDeployOperation(f"{endpoint}/operations/{deployed_model_id}", deployed_model_id,
+                                        self.endpoint.deploy_error)
+        if self.endpoint.deploy_error is None:
+            self.endpoint.deployed_models[deployed_model_id] = deployed_model
+            self.endpoint.set_traffic_split({
+                (deployed_model_id if key == "0" else key): percentage for key, percentage in traffic_split.items()
+            })
+        return operation
+
+    def update_endpoint(self, endpoint, update_mask):
+        assert endpoint.name == self.endpoint.resource_name
+        assert list(update_mask.paths) == ["traffic_split"]
+        self.endpoint.set_traffic_split(dict(endpoint.traffic_split))
+
+
+class FakeEndpoint:
+    """
+    Endpoint that keeps its deployed models and traffic split in memory, and checks that every traffic split it is
+    given is valid. Every traffic split it goes through is recorded in [traffic_history].
+    """
+
+    def __init__(self, traffic_split: Optional[Dict[str, int]] = None,
+                 resource_name: str = "projects/project/locations/europe-west4/endpoints/123",
+                 display_names: Optional[Dict[str, str]] = None):
+        """
+        :param traffic_split: deployed models of the endpoint, and their traffic
+        :param resource_name:
+        :param display_names: display names of deployed models, for deployed models without traffic too
+        """
+        self.resource_name = resource_name
+        self.api_client = FakeEndpointApiClient(self)
+        self.ids = itertools.count(1000)
+        self.deployed_models = {
+            deployed_model_id: SimpleNamespace(display_name=(display_names or {}).get(deployed_model_id))
+            for deployed_model_id in {**(traffic_split or {}), **(display_names or {})}
+        }
+        self.traffic_split = dict(traffic_split or {})
+        self.traffic_history: List[Dict[str, int]] = [dict(self.traffic_split)]
+        self.deploy_requests = []
+        # API versions selected on the client, other than the default
+        self.api_versions: List[str] = []
+        self.deploy_error: Optional[Exception] = None
+        # Deployed models that were undeployed while they were still serving traffic
+        self.undeployed_with_traffic: List[str] = []
+        self.deleted = False
+
+    @property
+    def _gca_resource(self):
+        return SimpleNamespace(traffic_split=dict(self.traffic_split))
+
+    def _sync_gca_resource(self):
+        pass
+
+    def set_traffic_split(self, traffic_split: Dict[str, int]):
+        traffic_split = {key: value for key, value in traffic_split.items() if value > 0}
+        assert sum(traffic_split.values()) in (0, 100), f"Invalid traffic split {traffic_split}"
+        assert set(traffic_split) <= set(self.deployed_models), f"Traffic sent to unknown models {traffic_split}"
+        self.traffic_split = traffic_split
+        self.traffic_history.append(dict(traffic_split))
+
+    def list_models(self):
+        return [
+            SimpleNamespace(id=deployed_model_id, display_name=deployed_model.display_name)
+            for deployed_model_id, deployed_model in self.deployed_models.items()
+        ]
+
+    def undeploy(self, deployed_model_id: str):
+        assert deployed_model_id in self.deployed_models, f"'{deployed_model_id}' is not deployed"
+        if self.traffic_split.get(deployed_model_id, 0) > 0:
+            self.undeployed_with_traffic.append(deployed_model_id)
+        del self.deployed_models[deployed_model_id]
+        remaining = {key: value for key, value in self.traffic_split.items() if key != deployed_model_id}
+        # Like Vertex AI, the traffic of the undeployed model is spread over the remaining ones
+        self.set_traffic_split(apportion(100, remaining))
+
+    def undeploy_all(self):
+        for deployed_model_id in list(self.deployed_models):
+            self.undeploy(deployed_model_id)
+
+    def delete(self):
+        assert not self.deployed_models, "Endpoint has deployed models"
+        self.deleted = True
+
+
+class FakeModel:
+    def __init__(self, resource_name: str = "projects/project/locations/europe-west4/models/1",
+                 display_name: str = "fashion"):
+        self.resource_name = resource_name
+        self.display_name = display_name
+
+
+class FakeBlob:
+    """
+    Google Storage blob, kept in the bucket it was created from once it is written
+    """
+
+    def __init__(self, name: str, bucket: "FakeBucket"):
+        self.name = name
+        self.bucket = bucket
+        self.data = b""
+        self.updated = None
+
+    @property
+    def size(self) -> Optional[int]:
+        return len(self.data)
+
+    @property
+    def crc32c(self) -> str:
+        # Any checksum of the content does, as long as it changes with it
+        return format(zlib.crc32(self.data), "08x")
+
+    def _stored(self) -> "FakeBlob":
+        if self.name not in self.bucket.blobs:
+            raise NotFound(f"gs://{self.bucket.name}/{self.name}")
+        return self.bucket.blobs[self.name]
+
+    def _store(self, data: bytes):
+        self.data = data
+        self.updated = datetime.datetime.now(datetime.timezone.utc)
+        self.bucket.blobs[self.name] = self
+
+    def exists(self, client=None) -> bool:
+        return self.name in self.bucket.blobs
+
+    def reload(self, client=None):
+        self.data = self._stored().data
+
+    def delete(self, client=None):
+        self._stored()
+        del self.bucket.blobs[self.name]
+
+    def open(self, mode: str = "r"):
+        if mode == "r":
+            return io.StringIO(self._stored().data.decode("utf-8"))
+        blob = self
+
+        class Writer(io.StringIO):
+            def close(self):
+                blob._store(self.getvalue().encode("utf-8"))
+                super().close()
+
+        return Writer()
+
+    def upload_from_string(self, data, content_type=None, client=None):
+        self._store(data.encode("utf-8") if isinstance(data, str) else data)
+
+    def upload_from_filename(self, filename: str, client=None):
+        with open(filename, "rb") as f:
+            self._store(f.read())
+
+    def download_to_file(self, file, client=None, start=None):
+        file.write(self._stored().data[start or 0:])
+
+    def download_as_bytes(self, client=None) -> bytes:
+        return self._stored().data
+
+
+class FakeBucket:
+    def __init__(self, client: "FakeStorageClient", name: str):
+        self.client = client
+        self.name = name
+        self.blobs: Dict[str, FakeBlob] = {}
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(name, self)
+
+    def get_blob(self, name: str) -> Optional[FakeBlob]:
+        return self.blobs.get(name)
+
+    def exists(self, client=None) -> bool:
+        return True
+
+
+class FakeBlobIterator:
+    def __init__(self, blobs: List[FakeBlob], prefixes: List[str], page_size: int):
+        self.blobs = blobs
+        self.prefixes = prefixes
+        self.page_size = page_size
+
+    def __iter__(self):
+        return iter(self.blobs)
+
+    @property
+    def pages(self):
+        for start in range(0, max(len(self.prefixes), 1), self.page_size):
+            yield SimpleNamespace(prefixes=set(self.prefixes[start:start + self.page_size]))
+
+
+class FakeStorageClient:
+    """
+    Google Storage client backed by memory. Clients created from the same [FakeStorageClient] share its buckets.
+    """
+
+    def __init__(self):
+        self.buckets: Dict[str, FakeBucket] = {}
+        self.batches = 0
+
+    def bucket(self, bucket_name: str) -> FakeBucket:
+        return self.buckets.setdefault(bucket_name, FakeBucket(self, bucket_name))
+
+    def add_blob(self, uri: str, data=b"", updated: Optional[datetime.datetime] = None) -> FakeBlob:
+        bucket_name, _, name = uri[len("gs://"):].partition("/")
+        blob = self.bucket(bucket_name).blob(name)
+        blob.upload_from_string(data)
+        if updated is not None:
+            blob.updated = updated
+        return blob
+
+    def list_blobs(self, bucket_name: str, prefix: str = "", delimiter: Optional[str] = None, page_size: int = 1000,
+                   fields: Optional[str] = None) -> FakeBlobIterator:
+        blobs, prefixes = [], set()
+        for name in sorted(self.bucket(bucket_name).blobs):
+            if not name.startswith(prefix):
+                continue
+            rest = name[len(prefix):]
+            if delimiter is not None and delimiter in rest:
+                prefixes.add(prefix + rest[:rest.index(delimiter) + 1])
+            else:
+                blobs.append(self.bucket(bucket_name).blobs[name])
+        return FakeBlobIterator(blobs, sorted(prefixes), page_size)
+
+    @contextmanager
+    def batch(self):
+        self.batches += 1
+        yield
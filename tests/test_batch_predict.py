@@ -0,0 +1,171 @@
+from types import SimpleNamespace
+
+import pytest
+from google.cloud.aiplatform.compat.types import job_state as gca_job_state
+
+from edge import batch_predict
+from edge.batch_predict import shard_input, submit_batch_prediction, wait_for_batch_prediction
+from edge.config import ServingConfig
+from edge.exception import EdgeException
+
+from tests.fakes import FakeStorageClient
+
+JobState = gca_job_state.JobState
+
+
+class FakeBatchPredictionJob:
+    """
+    Batch prediction job that goes through [states] as it is polled, predicting [per_poll] instances each time
+    """
+
+    def __init__(self, states, per_poll: int = 100, error_message: str = ""):
+        self.resource_name = "projects/project/locations/europe-west4/batchPredictionJobs/1"
+        self.states = list(states)
+        self.per_poll = per_poll
+        self.polls = 0
+        self._gca_resource = SimpleNamespace(
+            name=self.resource_name,
+            state=JobState.JOB_STATE_PENDING,
+            completion_stats=SimpleNamespace(successful_count=0, failed_count=0),
+            error=SimpleNamespace(message=error_message),
+        )
+
+    def _sync_gca_resource(self):
+        self._gca_resource.state = self.states[min(self.polls, len(self.states) - 1)]
+        self._gca_resource.completion_stats.successful_count = self.per_poll * self.polls
+        self.polls += 1
+
+
+class FakeModel:
+    """
+    Model that records the batch prediction jobs it is asked to submit
+    """
+    jobs = []
+
+    def __init__(self, resource_name: str):
+        self.resource_name = resource_name
+
+    def batch_predict(self, **kwargs):
+        FakeModel.jobs.append(kwargs)
+        return FakeBatchPredictionJob([JobState.JOB_STATE_SUCCEEDED])
+
+
+class FakeSubStep:
+    def __init__(self):
+        self.messages = []
+        self.status = None
+
+    def update(self, message=None, status=None):
+        if message is not None:
+            self.messages.append(message)
+        if status is not None:
+            self.status = status
+
+
+@pytest.fixture
+def client():
+    return FakeStorageClient()
+
+
+def read(client: FakeStorageClient, uri: str) -> str:
+    bucket_name, _, name = uri[len("gs://"):].partition("/")
+    return client.bucket(bucket_name).get_blob(name).download_as_bytes().decode("utf-8")
+
+
+def test_jsonl_input_is_sharded(client):
+    client.add_blob("gs://data/input.jsonl", "".join(f'{{"x": {i}}}\n' for i in range(5)))
+
+    shards = shard_input(client, "gs://data/input.jsonl", "gs://staging/batch-prediction/1", shard_size=2)
+
+    assert shards == [f"gs://staging/batch-prediction/1/input-{i:05d}.jsonl" for i in range(3)]
+    assert [read(client, shard) for shard in shards] == [
+        '{"x": 0}\n{"x": 1}\n', '{"x": 2}\n{"x": 3}\n', '{"x": 4}\n'
+    ]
+
+
+def test_csv_shards_repeat_the_header(client):
+    client.add_blob("gs://data/input.csv", "a,b\n1,2\n3,4\n5,6\n")
+
+    shards = shard_input(client, "gs://data/input.csv", "gs://staging/batch-prediction/1", shard_size=2)
+
+    assert [read(client, shard) for shard in shards] == ["a,b\n1,2\n3,4\n", "a,b\n5,6\n"]
+
+
+@pytest.mark.parametrize("input_uri", ["gs://data/missing.jsonl", "gs://data/input.parquet", "data/input.jsonl"])
+def test_invalid_input_is_rejected(client, input_uri):
+    with pytest.raises(EdgeException):
+        shard_input(client, input_uri, "gs://staging/batch-prediction/1", shard_size=2)
+
+
+def test_job_is_submitted_with_serving_resources(monkeypatch):
+    monkeypatch.setattr(batch_predict, "Model", FakeModel)
+    FakeModel.jobs.clear()
+    serving = ServingConfig(machine_type="n1-highmem-4", min_replica_count=2, max_replica_count=8)
+    shards = ["gs://staging/input-00000.csv", "gs://staging/input-00001.csv"]
+
+    submit_batch_prediction("projects/project/locations/europe-west4/models/1", "fashion", shards,
+                            "gs://data/predictions", serving)
+
+    (job,) = FakeModel.jobs
+    assert job["gcs_source"] == shards
+    assert job["instances_format"] == "csv"
+    assert job["gcs_destination_prefix"] == "gs://data/predictions"
+    assert (job["machine_type"], job["starting_replica_count"], job["max_replica_count"]) == ("n1-highmem-4", 2, 8)
+    assert job["sync"] is False
+
+
+def test_job_is_tracked_until_it_succeeds():
+    job = FakeBatchPredictionJob([JobState.JOB_STATE_RUNNING, JobState.JOB_STATE_RUNNING,
+                                  JobState.JOB_STATE_SUCCEEDED])
+    sub_step = FakeSubStep()
+    sleeps = []
+
+    report = wait_for_batch_prediction(job, sub_step, poll_interval=30, sleep=sleeps.append)
+
+    assert sleeps == [30, 30]
+    assert report.successful_count == 200
+    assert report.state == "JOB_STATE_SUCCEEDED"
+    assert sub_step.messages[0].startswith("Batch prediction running: 0 predictions")
+    assert sub_step.messages[-1].startswith("Batch prediction succeeded: 200 predictions")
+
+
+def test_failed_job_is_reported():
+    job = FakeBatchPredictionJob([JobState.JOB_STATE_FAILED], error_message="Quota exceeded")
+
+    with pytest.raises(EdgeException, match="Quota exceeded"):
+        wait_for_batch_prediction(job, FakeSubStep(), sleep=lambda _: None)
+
+
+class FakeUncreatedJob:
+    """
+    Batch prediction job submitted asynchronously, whose creation fails in the background after [polls] polls
+    """
+
+    def __init__(self, polls: int, exception: Exception = None):
+        self._gca_resource = None
+        self._exception = None
+        self.polls = polls
+        self.exception = exception
+
+    def poll(self):
+        self.polls -= 1
+        if self.polls == 0:
+            self._exception = self.exception
+
+
+def test_job_that_cannot_be_created_is_reported():
+    job = FakeUncreatedJob(polls=3, exception=RuntimeError("403 Permission 'aiplatform.batchPredictionJobs.create' "
+                                                            "denied"))
+
+    with pytest.raises(EdgeException, match="could not be created: 403 Permission"):
+        wait_for_batch_prediction(job, FakeSubStep(), sleep=lambda _: job.poll())
+
+
+def test_job_creation_is_waited_for_until_the_timeout():
+    job = FakeUncreatedJob(polls=-1)
+    sleeps = []
+
+    with pytest.raises(EdgeException, match="not created within 60s"):
+        wait_for_batch_prediction(job, FakeSubStep(), creation_timeout_seconds=60, sleep=sleeps.append)
+
+    assert sum(sleeps) == 60
@@ -0,0 +1,106 @@
+import glob
+import json
+import os
+
+import pytest
+
+from edge.benchmark import percentile, read_payloads, run_concurrency_level, run_qps_level
+from edge.command.model.benchmark import model_benchmark
+from edge.config import EdgeConfig, GCProjectConfig, ModelConfig, StorageBucketConfig
+from edge.exception import EdgeException
+from edge.predict import PredictionClient
+from edge.serve import FakePredictor, LocalPredictionServer
+
+
+def fake_endpoint(**kwargs) -> LocalPredictionServer:
+    return LocalPredictionServer(FakePredictor(**kwargs), max_batch_size=1, workers=16)
+
+
+def test_percentiles_are_nearest_rank():
+    values = list(range(1, 101))
+
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 99)) == (50, 95, 99)
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) is None
+
+
+def test_instances_are_grouped_into_payloads(tmp_path):
+    path = tmp_path / "instances.jsonl"
+    path.write_text("".join(f'{{"x": {i}}}\n' for i in range(5)) + "\n")
+
+    assert read_payloads(str(path), 2) == [[{"x": 0}, {"x": 1}], [{"x": 2}, {"x": 3}], [{"x": 4}]]
+
+
+def test_concurrency_level_measures_fake_endpoint_latency():
+    with fake_endpoint(latency_ms=20) as server, \
+            PredictionClient(server.predict_url, max_concurrency=4, max_retries=0) as client:
+        result = run_concurrency_level(client.predict_batch, [[{"x": 1}]], concurrency=4, duration_seconds=0.5)
+
+    assert result.error_count == 0
+    assert result.request_count > 10
+    assert 20 <= result.p50_ms <= result.p95_ms <= result.p99_ms <= result.max_ms
+    # At most 4 requests of 20ms each are in flight at any time
+    assert result.throughput <= 4 / 0.020
+
+
+def test_qps_level_sends_requests_at_the_target_rate():
+    with fake_endpoint(latency_ms=5) as server, \
+            PredictionClient(server.predict_url, max_concurrency=16, max_retries=0) as client:
+        result = run_qps_level(client.predict_batch, [[{"x": 1}]], qps=50, duration_seconds=1, max_concurrency=16)
+
+    assert (result.mode, result.request_count, result.error_count) == ("qps", 50, 0)
+    assert result.duration_seconds >= 0.98
+
+
+def test_qps_level_counts_queueing_delay_as_latency():
+    with fake_endpoint(latency_ms=50) as server, \
+            PredictionClient(server.predict_url, max_concurrency=1, max_retries=0) as client:
+        # Requests are scheduled every 10ms, but only one can be sent every 50ms
+        result = run_qps_level(client.predict_batch, [[{"x": 1}]], qps=100, duration_seconds=0.2, max_concurrency=1)
+
+    assert result.request_count == 20
+    # The last request is sent about 19 * 40ms after it was scheduled
+    assert result.max_ms >= 700
+    assert result.p50_ms > 300
+
+
+def test_errors_are_counted():
+    with fake_endpoint(latency_ms=0, error_rate=1) as server, \
+            PredictionClient(server.predict_url, max_retries=0) as client:
+        result = run_concurrency_level(client.predict_batch, [[{"x": 1}]], concurrency=2, duration_seconds=0.2)
+
+    assert result.request_count == result.error_count > 0
+    assert result.error_rate == 1.0
+    assert (result.p50_ms, result.throughput) == (None, 0.0)
+    assert "Simulated failure" in result.errors[0]
+
+
+@pytest.mark.parametrize("kwargs", [dict(latency_ms=-1), dict(error_rate=1.5)])
+def test_invalid_fake_endpoint_is_rejected(kwargs):
+    with pytest.raises(EdgeException):
+        FakePredictor(**kwargs)
+
+
+def test_benchmark_command_runs_against_fake_endpoint(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    EdgeConfig(
+        google_cloud_project=GCProjectConfig(project_id="project", region="europe-west4"),
+        storage_bucket=StorageBucketConfig(bucket_name="bucket", dvc_store_directory="dvcstore",
+                                           vertex_jobs_directory="vertex"),
+        models={"fashion": ModelConfig(name="fashion", endpoint_name="fashion-endpoint")},
+    ).save("edge.yaml")
+    (tmp_path / "instances.jsonl").write_text('{"x": 1}\n{"x": 2}\n')
+
+    with pytest.raises(SystemExit) as exit_info:
+        model_benchmark("fashion", "instances.jsonl", concurrency=[1, 2], qps=[20], duration_seconds=0.3,
+                        warmup_seconds=0, fake_endpoint=True, fake_latency_ms=5)
+    assert exit_info.value.code == 0
+
+    (report_path,) = glob.glob(os.path.join("models", "fashion", "benchmarks", "benchmark-*.json"))
+    with open(report_path) as f:
+        report = json.load(f)
+    assert report["model_name"] == "fashion"
+    assert report["serving"].startswith("fake endpoint")
+    assert [(level["mode"], level["level"]) for level in report["levels"]] == \
+        [("concurrency", 1), ("concurrency", 2), ("qps", 20)]
+    assert all(level["error_count"] == 0 and level["request_count"] > 0 for level in report["levels"])
@@ -0,0 +1,101 @@
+import pytest
+
+from edge import vertex_deploy
+from edge.config import ServingConfig
+from edge.exception import EdgeException
+from edge.state import ModelState
+from edge.vertex_deploy import blue_green_deploy, replace_deploy, vertex_deploy as deploy
+
+from tests.fakes import FakeEndpoint, FakeModel
+
+NEW_MODEL = "projects/project/locations/europe-west4/models/2"
+
+
+@pytest.fixture
+def endpoint():
+    return FakeEndpoint({"1": 100})
+
+
+@pytest.fixture
+def model_state(endpoint):
+    return ModelState(
+        endpoint_resource_name=endpoint.resource_name,
+        deployed_model_resource_name="projects/project/locations/europe-west4/models/1",
+        deployed_model_id="1",
+        deployed_serving=ServingConfig(),
+    )
+
+
+def test_new_model_is_ready_before_traffic_is_switched(endpoint, model_state):
+    blue_green_deploy(endpoint, FakeModel(NEW_MODEL), model_state, "fashion", ServingConfig())
+
+    assert endpoint.traffic_history == [
+        {"1": 100},
+        # The new model is deployed without traffic
+        {"1": 100},
+        # Traffic is switched in a single update
+        {"1000": 100},
+        {"1000": 100},
+    ]
+    assert endpoint.undeployed_with_traffic == []
+    assert set(endpoint.deployed_models) == {"1000"}
+    assert (model_state.deployed_model_id, model_state.standby_deployed_model_id) == ("1000", None)
+
+
+def test_endpoint_always_serves_traffic(endpoint, model_state):
+    blue_green_deploy(endpoint, FakeModel(NEW_MODEL), model_state, "fashion", ServingConfig())
+
+    assert all(sum(traffic_split.values()) == 100 for traffic_split in endpoint.traffic_history)
+
+
+def test_replace_deploy_has_downtime(endpoint, model_state):
+    replace_deploy(endpoint, FakeModel(NEW_MODEL), model_state, "fashion", ServingConfig())
+
+    assert {} in endpoint.traffic_history
+    assert endpoint.undeployed_with_traffic == ["1"]
+
+
+def test_failed_deployment_leaves_current_model_serving(endpoint, model_state):
+    endpoint.deploy_error = RuntimeError("Quota exceeded")
+
+    with pytest.raises(EdgeException):
+        blue_green_deploy(endpoint, FakeModel(NEW_MODEL), model_state, "fashion", ServingConfig())
+
+    assert endpoint.traffic_split == {"1": 100}
+    assert (model_state.deployed_model_id, model_state.standby_deployed_model_id) == ("1", None)
+
+
+def test_co_hosted_models_keep_their_traffic(model_state):
+    endpoint = FakeEndpoint({"1": 60, "7": 40})
+
+    blue_green_deploy(endpoint, FakeModel(NEW_MODEL), model_state, "fashion", ServingConfig(), shared=True)
+
+    assert endpoint.traffic_split == {"1000": 60, "7": 40}
+    assert set(endpoint.deployed_models) == {"1000", "7"}
+
+
+def test_changing_serving_resources_resizes_without_downtime(endpoint, model_state, monkeypatch):
+    monkeypatch.setattr(vertex_deploy, "get_endpoint", lambda _: endpoint)
+    monkeypatch.setattr(vertex_deploy, "get_model", lambda resource_name: FakeModel(resource_name))
+    serving = ServingConfig(machine_type="n1-standard-4")
+
+    deploy(endpoint.resource_name, model_state.deployed_model_resource_name, "fashion", model_state, serving)
+
+    assert endpoint.undeployed_with_traffic == []
+    assert endpoint.deploy_requests[0].dedicated_resources.machine_spec.machine_type == "n1-standard-4"
+    assert model_state.deployed_serving == serving
+
+
+def test_unchanged_model_is_not_redeployed(endpoint, model_state, monkeypatch):
+    monkeypatch.setattr(vertex_deploy, "get_endpoint", lambda _: endpoint)
+    monkeypatch.setattr(vertex_deploy, "get_model", lambda resource_name: FakeModel(resource_name))
+
+    deploy(endpoint.resource_name, model_state.deployed_model_resource_name, "fashion", model_state, ServingConfig())
+
+    assert endpoint.deploy_requests == []
+
+
+def test_invalid_replica_counts_are_rejected(endpoint, model_state):
+    with pytest.raises(EdgeException):
+        blue_green_deploy(endpoint, FakeModel(NEW_MODEL), model_state, "fashion",
+                          ServingConfig(min_replica_count=3, max_replica_count=2))
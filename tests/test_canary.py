@@ -0,0 +1,173 @@
+from typing import List
+
+import pytest
+
+from edge.canary import CanaryMetrics, MetricsSource, check_gates, evaluate_step
+from edge.config import CanaryConfig, ServingConfig
+from edge.exception import EdgeException
+from edge.state import ModelState, RolloutState
+from edge.vertex_deploy import canary_deploy
+
+from tests.fakes import FakeEndpoint, FakeModel
+
+NEW_MODEL = "projects/project/locations/europe-west4/models/2"
+HEALTHY = CanaryMetrics(request_count=500, error_count=1, latency_ms=120.0)
+
+
+class SyntheticMetricsSource(MetricsSource):
+    """
+    Returns the given metrics in turn, repeating the last one, and records the windows they were asked for
+    """
+
+    def __init__(self, *metrics: CanaryMetrics):
+        self.metrics = list(metrics)
+        self.windows: List[int] = []
+
+    def get_metrics(self, endpoint_resource_name: str, deployed_model_id: str, window_seconds: int) -> CanaryMetrics:
+        assert deployed_model_id == "1000", "Gates must be evaluated on the new model"
+        self.windows.append(window_seconds)
+        return self.metrics.pop(0) if len(self.metrics) > 1 else self.metrics[0]
+
+
+@pytest.fixture
+def endpoint():
+    return FakeEndpoint({"1": 100})
+
+
+@pytest.fixture
+def model_state(endpoint):
+    return ModelState(
+        endpoint_resource_name=endpoint.resource_name,
+        deployed_model_resource_name="projects/project/locations/europe-west4/models/1",
+        deployed_model_id="1",
+    )
+
+
+@pytest.fixture
+def canary():
+    return CanaryConfig(steps=[5, 25, 100], step_wait_seconds=60, max_step_wait_seconds=180)
+
+
+def rollout(endpoint, model_state, canary, metrics_source, checkpoints=None):
+    canary_deploy(
+        endpoint, FakeModel(NEW_MODEL), model_state, "fashion", ServingConfig(), canary, metrics_source,
+        checkpoint=(lambda: checkpoints.append(model_state.rollout)) if checkpoints is not None else None,
+        sleep=lambda _: None,
+    )
+
+
+def candidate_traffic(endpoint) -> List[int]:
+    return [traffic_split.get("1000", 0) for traffic_split in endpoint.traffic_history]
+
+
+def test_healthy_canary_is_promoted(endpoint, model_state, canary):
+    checkpoints = []
+
+    rollout(endpoint, model_state, canary, SyntheticMetricsSource(HEALTHY), checkpoints)
+
+    assert endpoint.traffic_history[-2] == {"1000": 100}
+    assert [percentage for percentage in candidate_traffic(endpoint) if percentage > 0][:3] == [5, 25, 100]
+    assert endpoint.traffic_split == {"1000": 100}
+    assert set(endpoint.deployed_models) == {"1000"}
+    assert endpoint.undeployed_with_traffic == []
+    assert (model_state.deployed_model_id, model_state.rollout, model_state.standby_deployed_model_id) == \
+        ("1000", None, None)
+    assert len(checkpoints) == 4
+
+
+def test_failing_canary_is_rolled_back(endpoint, model_state, canary):
+    unhealthy = CanaryMetrics(request_count=500, error_count=50, latency_ms=120.0)
+
+    with pytest.raises(EdgeException):
+        rollout(endpoint, model_state, canary, SyntheticMetricsSource(HEALTHY, unhealthy))
+
+    assert max(candidate_traffic(endpoint)) == 25
+    assert endpoint.traffic_split == {"1": 100}
+    assert set(endpoint.deployed_models) == {"1"}
+    assert (model_state.deployed_model_id, model_state.rollout) == ("1", None)
+
+
+def test_step_is_extended_until_enough_requests_are_served(endpoint, model_state, canary):
+    metrics_source = SyntheticMetricsSource(
+        CanaryMetrics(request_count=0, error_count=0),
+        CanaryMetrics(request_count=40, error_count=0, latency_ms=100.0),
+        HEALTHY,
+    )
+
+    rollout(endpoint, model_state, canary, metrics_source)
+
+    # Metrics are read over the whole step so far
+    assert metrics_source.windows[:3] == [60, 120, 180]
+    assert model_state.deployed_model_id == "1000"
+
+
+def test_canary_without_enough_requests_is_rolled_back(endpoint, model_state, canary):
+    metrics_source = SyntheticMetricsSource(CanaryMetrics(request_count=3, error_count=0, latency_ms=100.0))
+
+    with pytest.raises(EdgeException):
+        rollout(endpoint, model_state, canary, metrics_source)
+
+    assert metrics_source.windows == [60, 120, 180]
+    assert max(candidate_traffic(endpoint)) == 5
+    assert endpoint.traffic_split == {"1": 100}
+    assert model_state.rollout is None
+
+
+def test_interrupted_rollout_is_resumed(endpoint, model_state, canary):
+    endpoint = FakeEndpoint({"1": 75, "1000": 25})
+    model_state.rollout = RolloutState(
+        model_resource_name=NEW_MODEL,
+        candidate_deployed_model_id="1000",
+        baseline_deployed_model_id="1",
+        next_step=2,
+        traffic_percentage=25,
+    )
+
+    rollout(endpoint, model_state, canary, SyntheticMetricsSource(HEALTHY))
+
+    assert endpoint.deploy_requests == []
+    assert candidate_traffic(endpoint)[:2] == [25, 100]
+    assert model_state.deployed_model_id == "1000"
+
+
+def test_rollout_of_another_model_is_not_started(endpoint, model_state, canary):
+    model_state.rollout = RolloutState(
+        model_resource_name="projects/project/locations/europe-west4/models/3",
+        candidate_deployed_model_id="1000",
+        baseline_deployed_model_id="1",
+    )
+
+    with pytest.raises(EdgeException):
+        rollout(endpoint, model_state, canary, SyntheticMetricsSource(HEALTHY))
+    assert endpoint.deploy_requests == []
+
+
+@pytest.mark.parametrize("invalid", [
+    dict(step_wait_seconds=0),
+    dict(step_wait_seconds=-60),
+    dict(max_step_wait_seconds=30),
+    dict(min_requests=-1),
+])
+def test_invalid_canary_config_is_rejected(endpoint, model_state, canary, invalid):
+    for key, value in invalid.items():
+        setattr(canary, key, value)
+    metrics_source = SyntheticMetricsSource(HEALTHY)
+
+    with pytest.raises(EdgeException, match=f"Invalid canary {list(invalid)[0]}"):
+        rollout(endpoint, model_state, canary, metrics_source)
+    assert endpoint.deploy_requests == []
+    assert metrics_source.windows == []
+
+
+def test_gates():
+    assert check_gates(HEALTHY, max_latency_ms=500, max_error_rate=0.01) is None
+    assert "error rate" in check_gates(CanaryMetrics(100, 5, 100.0), max_latency_ms=500, max_error_rate=0.01)
+    assert "latency" in check_gates(CanaryMetrics(100, 0, 900.0), max_latency_ms=500, max_error_rate=0.01)
+
+
+def test_step_is_evaluated_once_when_enough_requests_are_served(canary):
+    sleeps = []
+    metrics_source = SyntheticMetricsSource(HEALTHY)
+
+    assert evaluate_step(metrics_source, "endpoint", "1000", canary, sleep=sleeps.append) is None
+    assert sleeps == [60]
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from edge.compaction import downsample_indices
+
+
+@pytest.mark.parametrize("max_points", [3, 4, 10, 100])
+def test_series_is_downsampled_to_at_most_max_points(max_points):
+    values = np.sin(np.linspace(0, 20, 1001))
+
+    indices = downsample_indices(values, max_points)
+
+    assert len(indices) <= max_points
+    assert indices[-1] == len(values) - 1
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_envelope_is_kept():
+    values = np.zeros(1000)
+    values[123], values[456] = 5.0, -5.0
+
+    indices = downsample_indices(values, 30)
+
+    assert 123 in indices and 456 in indices
+
+
+def test_short_series_is_kept():
+    assert list(downsample_indices(np.arange(5.0), 10)) == [0, 1, 2, 3, 4]
+
+
+def test_series_cannot_be_downsampled_below_three_points():
+    with pytest.raises(ValueError):
+        downsample_indices(np.arange(10.0), 2)
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from edge.data import (
+    GoogleStorageRemote, LocalRemote, PARTIAL_SUFFIX, Remote, discover_outputs, file_md5, get_remote, object_name, pull,
+    push,
+)
+
+from tests.fakes import FakeStorageClient
+
+
+def md5(data: bytes) -> str:
+    return hashlib.md5(data).hexdigest()
+
+
+def write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class Repository:
+    """
+    DVC repository whose cache is filled the way `dvc add` fills it
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.cache_dir = os.path.join(root, ".dvc", "cache")
+
+    def add_to_cache(self, data: bytes, suffix: str = "") -> str:
+        write(os.path.join(self.cache_dir, object_name(md5(data) + suffix)), data)
+        return md5(data) + suffix
+
+    def add_file(self, path: str, data: bytes):
+        self.track(path, self.add_to_cache(data))
+
+    def add_directory(self, path: str, files: dict):
+        listing = [{"md5": self.add_to_cache(data), "relpath": name} for name, data in sorted(files.items())]
+        # Directory listings are stored with a `.dir` suffix
+        self.track(path, self.add_to_cache(json.dumps(listing).encode("utf-8"), ".dir"))
+
+    def track(self, path: str, hash_value: str):
+        with open(os.path.join(self.root, f"{path}.dvc"), "w") as f:
+            f.write(f"outs:\n- md5: {hash_value}\n  path: {os.path.basename(path)}\n")
+
+    def cached(self) -> set:
+        return {
+            os.path.relpath(os.path.join(directory, file), self.cache_dir)
+            for directory, _, files in os.walk(self.cache_dir) for file in files
+        }
+
+
+@pytest.fixture
+def repository(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    repository = Repository(str(tmp_path))
+    repository.add_file("data/labels.csv", b"id,label\n1,cat\n")
+    repository.add_directory("data/images", {"1.png": b"\x89PNG one", "2.png": b"\x89PNG two"})
+    return repository
+
+
+@pytest.fixture
+def remote(tmp_path):
+    return LocalRemote(str(tmp_path / "remote"))
+
+
+def remote_objects(remote: LocalRemote) -> set:
+    return {
+        os.path.relpath(os.path.join(directory, file), remote.root)
+        for directory, _, files in os.walk(remote.root) for file in files
+    }
+
+
+def test_tracked_outputs_are_discovered(repository):
+    outputs = discover_outputs()
+
+    assert sorted((output.path, output.is_dir) for output in outputs) == [
+        (os.path.join("data", "images"), True), (os.path.join("data", "labels.csv"), False)
+    ]
+
+
+def test_push_uploads_every_object(repository, remote):
+    report = push(discover_outputs(), remote, repository.cache_dir, jobs=4)
+
+    assert (report.total, report.transferred, report.skipped) == (4, 4, 0)
+    assert remote_objects(remote) == repository.cached()
+
+
+def test_objects_in_the_remote_are_not_pushed_again(repository, remote):
+    push(discover_outputs(), remote, repository.cache_dir)
+
+    report = push(discover_outputs(), remote, repository.cache_dir)
+
+    assert (report.transferred, report.skipped, report.bytes_transferred) == (0, 4, 0)
+
+
+def test_pull_downloads_files_listed_in_directories(repository, remote):
+    push(discover_outputs(), remote, repository.cache_dir)
+    expected = {name: read(os.path.join(repository.cache_dir, name)) for name in repository.cached()}
+    os.rename(repository.cache_dir, repository.cache_dir + ".old")
+
+    report = pull(discover_outputs(), remote, repository.cache_dir, jobs=4)
+
+    assert (report.total, report.transferred, report.missing, report.errors) == (4, 4, [], [])
+    assert {name: read(os.path.join(repository.cache_dir, name)) for name in repository.cached()} == expected
+
+
+def test_interrupted_download_is_resumed(repository, remote):
+    data = b"id,label\n1,cat\n"
+    push(discover_outputs(), remote, repository.cache_dir)
+    name = object_name(md5(data))
+    os.remove(os.path.join(repository.cache_dir, name))
+    write(os.path.join(repository.cache_dir, name + PARTIAL_SUFFIX), data[:5])
+
+    report = pull(discover_outputs(), remote, repository.cache_dir)
+
+    assert (report.transferred, report.skipped, report.bytes_transferred) == (1, 3, len(data) - 5)
+    assert read(os.path.join(repository.cache_dir, name)) == data
+    assert not os.path.exists(os.path.join(repository.cache_dir, name + PARTIAL_SUFFIX))
+
+
+def test_corrupted_object_is_not_cached(repository, remote):
+    data = b"id,label\n1,cat\n"
+    push(discover_outputs(), remote, repository.cache_dir)
+    name = object_name(md5(data))
+    os.remove(os.path.join(repository.cache_dir, name))
+    write(os.path.join(remote.root, name), b"id,label\n1,dog\n")
+
+    report = pull(discover_outputs(), remote, repository.cache_dir)
+
+    assert len(report.errors) == 1 and "does not match its hash" in report.errors[0]
+    assert name not in repository.cached()
+    assert name + PARTIAL_SUFFIX not in repository.cached()
+
+
+def test_objects_missing_from_the_remote_are_reported(repository, remote):
+    report = pull(discover_outputs(), remote, repository.cache_dir + ".empty")
+
+    # Files of the directory are not known without its listing
+    assert report.missing == [object_name(output.md5) for output in discover_outputs() if output.is_dir] + \
+        [object_name(md5(b"id,label\n1,cat\n"))]
+
+
+def test_text_with_windows_line_endings_matches_its_dvc_hash(tmp_path):
+    path = str(tmp_path / "labels.csv")
+    write(path, b"id,label\r\n1,cat\r\n")
+
+    assert md5(b"id,label\n1,cat\n") in file_md5(path)
+
+
+def test_local_remote_is_relative_to_the_dvc_directory(repository):
+    remote = get_remote("../../remote")
+
+    assert remote.root == os.path.normpath(os.path.join(repository.root, "..", "remote"))
+
+
+def test_google_storage_remote_round_trip(repository):
+    client = FakeStorageClient()
+    remote = GoogleStorageRemote("gs://bucket/dvcstore", lambda: client)
+    expected = repository.cached()
+
+    push(discover_outputs(), remote, repository.cache_dir)
+    os.rename(repository.cache_dir, repository.cache_dir + ".old")
+    report = pull(discover_outputs(), remote, repository.cache_dir)
+
+    assert sorted(client.bucket("bucket").blobs) == sorted(f"dvcstore/{name}" for name in expected)
+    assert (report.transferred, report.errors) == (4, [])
+    assert repository.cached() == expected
+
+
+def test_remote_must_implement_every_method():
+    class ReadOnlyRemote(Remote):
+        def exists(self, name: str) -> bool:
+            return False
+
+    with pytest.raises(TypeError):
+        ReadOnlyRemote()
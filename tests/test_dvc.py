@@ -0,0 +1,162 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from edge.config import DvcPerformanceConfig
+from edge.dvc import (
+    dvc_add_remote, dvc_configure_performance, get_dvc_cache_dir, get_dvc_remote_jobs, get_dvc_storage_path,
+    get_performance_profile, read_dvc_config,
+)
+from edge.exception import EdgeException
+
+# As written by `dvc init`, `dvc remote add -d storage ...` and `dvc cache dir ...`
+DVC_WRITTEN_CONFIG = """[core]
+    remote = storage
+[cache]
+    dir = ../../shared
+['remote "storage"']
+    url = "gs://bucket/dvc store,x"
+    jobs = 16
+"""
+
+
+@pytest.fixture
+def dvc_repo(tmp_path, monkeypatch):
+    """
+    Empty DVC repository in a temporary directory, which is the working directory during the test
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(".dvc")
+    with open(os.path.join(".dvc", "config"), "w"):
+        pass
+    return tmp_path
+
+
+@pytest.fixture
+def dvc(dvc_repo):
+    """
+    Run the DVC CLI in the repository, to check how DVC reads the config
+
+    :return: function running a DVC command and returning its output
+    """
+    if shutil.which("dvc") is None:
+        pytest.skip("dvc is not installed")
+    subprocess.run(["git", "init", "-q"], check=True)
+    shutil.rmtree(".dvc")
+    subprocess.run(["dvc", "init", "-q"], check=True)
+
+    def run(*args) -> str:
+        return subprocess.run(["dvc", *args], check=True, capture_output=True, text=True).stdout.strip()
+
+    return run
+
+
+def write_config(text: str, name: str = "config"):
+    with open(os.path.join(".dvc", name), "w") as f:
+        f.write(text)
+
+
+def test_config_written_by_dvc_is_read(dvc_repo):
+    write_config(DVC_WRITTEN_CONFIG)
+
+    config = read_dvc_config()
+
+    assert get_dvc_storage_path(config) == "gs://bucket/dvc store,x"
+    assert get_dvc_remote_jobs(config) == 16
+    assert os.path.abspath(get_dvc_cache_dir(config)) == str(dvc_repo.parent / "shared")
+
+
+def test_local_config_overrides_the_repository_config(dvc_repo):
+    write_config(DVC_WRITTEN_CONFIG)
+    write_config("[cache]\n    dir = /tmp/local-cache\n", "config.local")
+
+    assert get_dvc_cache_dir(read_dvc_config(local=True)) == "/tmp/local-cache"
+    # Settings of this clone are not shared through the repository config
+    assert get_dvc_cache_dir(read_dvc_config()) == os.path.normpath("../shared")
+
+
+def test_remote_is_added_as_default(dvc_repo):
+    dvc_add_remote("gs://bucket/dvcstore")
+
+    config = read_dvc_config()
+    assert get_dvc_storage_path(config) == "gs://bucket/dvcstore"
+    assert config.get("core", "remote") == "storage"
+
+
+def test_remote_is_updated_without_touching_other_settings(dvc_repo):
+    write_config(DVC_WRITTEN_CONFIG + "['remote \"backup\"']\n    url = s3://backup\n")
+
+    dvc_add_remote("gs://other-bucket/dvcstore")
+
+    config = read_dvc_config()
+    assert get_dvc_storage_path(config) == "gs://other-bucket/dvcstore"
+    assert get_dvc_remote_jobs(config) == 16
+    assert config.get("'remote \"backup\"'", "url") == "s3://backup"
+    assert [name for name in os.listdir(".dvc") if name.startswith(".config.")] == []
+
+
+def test_performance_profile_is_written(dvc_repo, tmp_path):
+    dvc_add_remote("gs://bucket/dvcstore")
+    shared_cache_dir = str(tmp_path / "shared cache, for everyone")
+
+    dvc_configure_performance(DvcPerformanceConfig(cache_type="hardlink,copy", jobs=32,
+                                                   shared_cache_dir=shared_cache_dir))
+
+    config = read_dvc_config(local=True)
+    assert config.get("cache", "type") == "hardlink,copy"
+    assert config.get("cache", "shared") == "group"
+    assert get_dvc_cache_dir(config) == shared_cache_dir
+    assert get_dvc_remote_jobs(config) == 32
+    assert os.path.isdir(shared_cache_dir)
+    # Other clones, on other machines, do not share the cache settings of this one
+    assert not read_dvc_config().has_section("cache")
+
+
+def test_cache_settings_of_the_user_are_kept(dvc_repo):
+    write_config(DVC_WRITTEN_CONFIG)
+    write_config("[cache]\n    dir = /mnt/cache\n    shared = group\n    protected = true\n", "config.local")
+
+    dvc_configure_performance(DvcPerformanceConfig(cache_type="symlink,copy", jobs=8))
+
+    assert read_dvc_config().get("cache", "dir") == "../../shared"
+    local_config = read_dvc_config(os.path.join(".dvc", "config.local"))
+    assert dict(local_config["cache"]) == {"dir": "/mnt/cache", "shared": "group", "protected": "true",
+                                           "type": "symlink,copy"}
+
+
+def test_performance_profile_needs_the_remote(dvc_repo):
+    with pytest.raises(EdgeException):
+        dvc_configure_performance(DvcPerformanceConfig())
+
+
+def test_performance_profile_always_falls_back_to_copies(dvc_repo):
+    profile = get_performance_profile()
+
+    assert profile.cache_type.split(",")[-1] == "copy"
+    assert profile.jobs > 0
+
+
+def test_dvc_reads_the_config_that_is_written(dvc, tmp_path):
+    shared_cache_dir = str(tmp_path / "shared cache, for everyone")
+    dvc_add_remote("gs://bucket/dvc store,x")
+    dvc_configure_performance(DvcPerformanceConfig(cache_type="hardlink,symlink,copy", jobs=32,
+                                                   shared_cache_dir=shared_cache_dir))
+
+    assert dvc("config", "core.remote") == "storage"
+    assert dvc("config", "remote.storage.url") == "gs://bucket/dvc store,x"
+    assert dvc("config", "remote.storage.jobs") == "32"
+    assert dvc("config", "cache.type") == "['hardlink', 'symlink', 'copy']"
+    assert dvc("cache", "dir") == shared_cache_dir
+
+
+def test_config_written_by_dvc_cli_is_read(dvc, tmp_path):
+    dvc("remote", "add", "-d", "storage", "gs://bucket/dvc store,x")
+    dvc("remote", "modify", "storage", "jobs", "16")
+    dvc("cache", "dir", "--local", str(tmp_path / "local cache"))
+
+    config = read_dvc_config(local=True)
+    assert get_dvc_storage_path(config) == "gs://bucket/dvc store,x"
+    assert get_dvc_remote_jobs(config) == 16
+    assert get_dvc_cache_dir(config) == dvc("cache", "dir")
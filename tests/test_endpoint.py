@@ -0,0 +1,44 @@
+from edge.endpoint import apportion, set_model_traffic
+
+from tests.fakes import FakeEndpoint
+
+
+def test_percentages_add_up_to_the_total():
+    assert apportion(100, {"a": 1, "b": 1, "c": 1}) == {"a": 34, "b": 33, "c": 33}
+    assert apportion(50, {"a": 3, "b": 1}) == {"a": 38, "b": 12}
+    assert apportion(100, {"a": 0}) == {}
+
+
+def test_joining_model_gets_an_equal_share_with_each_model():
+    # "b" is in the middle of a canary rollout, so two of its versions are deployed
+    endpoint = FakeEndpoint({"7": 75, "8": 25}, display_names={"7": "b", "8": "b", "9": "a"})
+
+    set_model_traffic(endpoint, {"9"}, {"9": 100})
+
+    assert endpoint.traffic_split["9"] == 50
+    assert endpoint.traffic_split["7"] + endpoint.traffic_split["8"] == 50
+    assert endpoint.traffic_split["7"] > endpoint.traffic_split["8"]
+
+
+def test_deployed_models_of_unknown_models_count_on_their_own():
+    endpoint = FakeEndpoint({"7": 50, "8": 50}, display_names={"9": "a"})
+
+    set_model_traffic(endpoint, {"9"}, {"9": 100})
+
+    assert endpoint.traffic_split == {"7": 34, "8": 33, "9": 33}
+
+
+def test_model_traffic_is_split_without_changing_other_models():
+    endpoint = FakeEndpoint({"7": 40, "8": 60}, display_names={"7": "b", "8": "a", "9": "a"})
+
+    set_model_traffic(endpoint, {"8", "9"}, {"8": 75, "9": 25})
+
+    assert endpoint.traffic_split == {"7": 40, "8": 45, "9": 15}
+
+
+def test_withdrawn_traffic_is_handed_to_other_models():
+    endpoint = FakeEndpoint({"7": 30, "8": 10, "9": 60}, display_names={"7": "b", "8": "b", "9": "a"})
+
+    set_model_traffic(endpoint, {"9"}, {})
+
+    assert endpoint.traffic_split == {"7": 75, "8": 25}
@@ -0,0 +1,99 @@
+import pytest
+from sacred import Experiment
+
+from edge.command.experiments import compare, list as list_command, show
+from edge.command.experiments.compare import compare_experiments
+from edge.command.experiments.list import list_experiments
+from edge.command.experiments.show import show_experiment
+from edge.exception import EdgeException
+from edge.experiments import MongoExperimentStore, compare_runs
+from edge.sacred import close_mongo_clients, create_mongo_observer
+
+
+def run_experiment(connection_string: str, name: str, learning_rate: float, fail: bool = False):
+    experiment = Experiment(name, save_git_info=False, interactive=True)
+    experiment.add_config({"learning_rate": learning_rate, "optimizer": {"name": "adam"}, "layers": [64, 32],
+                           "dropout": None})
+    experiment.observers.append(create_mongo_observer(connection_string))
+
+    @experiment.main
+    def main(_run, learning_rate):
+        for step in range(3):
+            _run.log_scalar("loss", learning_rate * (3 - step))
+        if fail:
+            raise RuntimeError("diverged")
+        return learning_rate * 10
+
+    try:
+        experiment.run(options={"--loglevel": "ERROR"})
+    except RuntimeError:
+        pass
+
+
+@pytest.fixture
+def store(mongod, mongo_database, monkeypatch):
+    run_experiment(mongod, "fashion", 0.1)
+    run_experiment(mongod, "fashion", 0.2)
+    run_experiment(mongod, "fashion", 0.3, fail=True)
+    run_experiment(mongod, "mnist", 0.4)
+    store = MongoExperimentStore(mongo_database)
+    for command in [list_command, show, compare]:
+        monkeypatch.setattr(command, "get_experiment_store", lambda config, local: store)
+    yield store
+    close_mongo_clients()
+
+
+def test_runs_are_filtered_and_sorted(store):
+    assert [run["_id"] for run in store.find_runs(experiment_name="fashion")] == [3, 2, 1]
+    assert [run["_id"] for run in store.find_runs(status="failed")] == [3]
+    assert [run["_id"] for run in store.find_runs(config_filters=["learning_rate=0.2"])] == [2]
+    assert [run["_id"] for run in store.find_runs(config_filters=["layers=[64, 32]", "dropout=null"])] == \
+        [4, 3, 2, 1]
+    # The failed run has no result, which sorts first
+    assert [run["_id"] for run in store.find_runs(sort_by="result", ascending=True, limit=2)] == [3, 1]
+
+
+def test_runs_are_compared(store):
+    comparison = compare_runs(store, [1, 2])
+
+    assert comparison["config.learning_rate"] == {1: 0.1, 2: 0.2}
+    assert "config.optimizer.name" not in comparison
+    assert comparison["metrics.loss"] == {1: pytest.approx(0.1), 2: pytest.approx(0.2)}
+
+
+def test_missing_run_is_reported(store):
+    with pytest.raises(EdgeException, match="not found in the experiment tracker"):
+        store.get_run(10)
+    with pytest.raises(EdgeException, match="Runs 10 are not found in the experiment tracker"):
+        compare_runs(store, [1, 10])
+
+
+def test_runs_are_listed(project, store, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        list_experiments(experiment_name="fashion")
+
+    assert exit_info.value.code == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split()[:3] for line in lines[1:]] == [
+        ["3", "fashion", "FAILED"], ["2", "fashion", "COMPLETED"], ["1", "fashion", "COMPLETED"]
+    ]
+
+
+def test_run_is_shown(project, store, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        show_experiment(2)
+
+    assert exit_info.value.code == 0
+    out = capsys.readouterr().out
+    assert "learning_rate: 0.2" in out
+    assert "loss: 0.2" in out
+
+
+def test_runs_are_compared_by_the_command(project, store, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        compare_experiments([1, 3])
+
+    assert exit_info.value.code == 0
+    rows = {line.split()[0]: line.split()[1:] for line in capsys.readouterr().out.splitlines()}
+    assert rows["status"] == ["COMPLETED", "FAILED"]
+    assert rows["config.learning_rate"] == ["0.1", "0.3"]
@@ -0,0 +1,92 @@
+import datetime
+import os
+
+import numpy as np
+
+from edge.export import export_experiments, MANIFEST_FILE
+
+
+def add_run(database, run_id: int, experiment: str = "fashion", status: str = "COMPLETED", values=(0.5, 0.25)):
+    database.runs.insert_one({
+        "_id": run_id,
+        "experiment": {"name": experiment},
+        "status": status,
+        "start_time": datetime.datetime(2021, 7, 1, 12, 0, 0),
+        "config": {"epochs": run_id, "optimizer": {"name": "adam"}},
+        "result": 0.9,
+    })
+    database.metrics.insert_one({
+        "run_id": run_id,
+        "name": "loss",
+        "steps": list(range(len(values))),
+        "values": list(values),
+        "timestamps": [datetime.datetime(2021, 7, 1, 12, 0, i) for i in range(len(values))],
+    })
+
+
+def load_run_ids(output_dir) -> list:
+    return sorted(
+        int(run_id)
+        for file_name in os.listdir(output_dir) if file_name.endswith(".npz")
+        for run_id in np.load(os.path.join(output_dir, file_name))["run_id"]
+    )
+
+
+def test_runs_and_metrics_are_exported_in_shards(mongo_database, tmp_path):
+    for run_id in range(1, 6):
+        add_run(mongo_database, run_id)
+
+    report = export_experiments(mongo_database, str(tmp_path), shard_size=2)
+
+    assert (report.runs, report.shards, report.metric_points, report.last_run_id) == (5, 3, 10, 5)
+    shard = np.load(tmp_path / "runs-00000001-00000002.npz")
+    assert list(shard["config.epochs"]) == [1, 2]
+    assert list(shard["config.optimizer.name"]) == ["adam", "adam"]
+    assert list(shard["metric.run_id"]) == [1, 1, 2, 2]
+    assert list(shard["metric.value"]) == [0.5, 0.25, 0.5, 0.25]
+    assert (tmp_path / MANIFEST_FILE).exists()
+
+
+def test_export_resumes_after_the_last_exported_run(mongo_database, tmp_path):
+    add_run(mongo_database, 1)
+    export_experiments(mongo_database, str(tmp_path))
+    add_run(mongo_database, 2)
+
+    report = export_experiments(mongo_database, str(tmp_path))
+
+    assert report.runs == 1
+    assert load_run_ids(tmp_path) == [1, 2]
+
+
+def test_runs_that_were_running_are_exported_once_finished(mongo_database, tmp_path):
+    add_run(mongo_database, 1, status="RUNNING")
+    add_run(mongo_database, 2)
+
+    report = export_experiments(mongo_database, str(tmp_path))
+    assert (report.runs, report.unfinished_runs) == (1, 1)
+
+    mongo_database.runs.update_one({"_id": 1}, {"$set": {"status": "COMPLETED"}})
+    report = export_experiments(mongo_database, str(tmp_path))
+
+    assert (report.runs, report.unfinished_runs) == (1, 0)
+    assert load_run_ids(tmp_path) == [1, 2]
+    assert export_experiments(mongo_database, str(tmp_path)).runs == 0
+
+
+def test_exports_of_different_experiments_are_tracked_separately(mongo_database, tmp_path):
+    add_run(mongo_database, 1, experiment="fashion")
+    add_run(mongo_database, 2, experiment="mnist")
+
+    assert export_experiments(mongo_database, str(tmp_path), experiment_name="mnist").runs == 1
+    assert export_experiments(mongo_database, str(tmp_path), experiment_name="fashion").runs == 1
+    assert export_experiments(mongo_database, str(tmp_path), experiment_name="fashion").runs == 0
+
+
+def test_non_numeric_metric_values_are_exported_as_nan(mongo_database, tmp_path):
+    add_run(mongo_database, 1, values=[0.5, "n/a", None, 2])
+
+    report = export_experiments(mongo_database, str(tmp_path))
+
+    assert report.non_numeric_values == 1
+    values = np.load(tmp_path / "runs-00000001-00000001.npz")["metric.value"]
+    assert values[0] == 0.5 and np.isnan(values[1]) and np.isnan(values[2]) and values[3] == 2.0
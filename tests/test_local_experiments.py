@@ -0,0 +1,109 @@
+from types import SimpleNamespace
+
+import pytest
+from sacred import Experiment
+
+from edge.exception import EdgeException
+from edge.experiments import SQLiteExperimentStore, compare_runs, get_experiment_store
+from edge.local_experiments import SQLiteObserver
+from edge.path import get_local_experiments_path
+
+
+def run_experiment(path: str, name: str, learning_rate: float, fail: bool = False):
+    experiment = Experiment(name, save_git_info=False, interactive=True)
+    experiment.add_config({"learning_rate": learning_rate, "optimizer": {"name": "adam"}, "layers": [64, 32],
+                           "dropout": None})
+    experiment.observers.append(SQLiteObserver(path))
+
+    @experiment.main
+    def main(_run, learning_rate):
+        for step in range(3):
+            _run.log_scalar("loss", learning_rate * (3 - step))
+        if fail:
+            raise RuntimeError("diverged")
+        return learning_rate * 10
+
+    try:
+        experiment.run(options={"--loglevel": "ERROR"})
+    except RuntimeError:
+        pass
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    path = str(tmp_path / "experiments.db")
+    run_experiment(path, "fashion", 0.1)
+    run_experiment(path, "fashion", 0.2)
+    run_experiment(path, "fashion", 0.3, fail=True)
+    run_experiment(path, "mnist", 0.4)
+    return path
+
+
+def test_runs_are_recorded(store_path):
+    store = SQLiteExperimentStore(store_path)
+
+    run = store.get_run(1)
+
+    assert run["experiment"] == {"name": "fashion"}
+    assert run["status"] == "COMPLETED"
+    assert run["result"] == 1.0
+    assert run["config"]["optimizer"] == {"name": "adam"}
+    assert run["start_time"] <= run["stop_time"]
+    assert store.get_run(3)["status"] == "FAILED"
+    assert store.get_last_metric_values([1, 2]) == {1: {"loss": pytest.approx(0.1)}, 2: {"loss": pytest.approx(0.2)}}
+
+
+def test_runs_are_filtered_and_sorted(store_path):
+    store = SQLiteExperimentStore(store_path)
+
+    assert [run["_id"] for run in store.find_runs(experiment_name="fashion")] == [3, 2, 1]
+    assert [run["_id"] for run in store.find_runs(status="failed")] == [3]
+    assert [run["_id"] for run in store.find_runs(config_filters=["learning_rate=0.2"])] == [2]
+    assert [run["_id"] for run in store.find_runs(sort_by="result", ascending=True, limit=2)] == [3, 1]
+
+
+def test_runs_are_filtered_by_json_config_values(store_path):
+    store = SQLiteExperimentStore(store_path)
+
+    assert [run["_id"] for run in store.find_runs(config_filters=["layers=[64, 32]", "learning_rate=0.2"])] == [2]
+    assert [run["_id"] for run in store.find_runs(config_filters=['optimizer={"name": "adam"}'])] == [4, 3, 2, 1]
+    assert [run["_id"] for run in store.find_runs(config_filters=["layers=[64]"])] == []
+    assert [run["_id"] for run in store.find_runs(config_filters=["dropout=null"])] == [4, 3, 2, 1]
+    assert [run["_id"] for run in store.find_runs(config_filters=["missing=null"])] == [4, 3, 2, 1]
+
+
+def test_runs_are_compared(store_path):
+    comparison = compare_runs(SQLiteExperimentStore(store_path), [1, 2])
+
+    assert comparison["config.learning_rate"] == {1: 0.1, 2: 0.2}
+    assert "config.optimizer.name" not in comparison
+    assert comparison["metrics.loss"] == {1: pytest.approx(0.1), 2: pytest.approx(0.2)}
+
+
+def test_missing_run_is_reported(store_path):
+    with pytest.raises(EdgeException, match="not found in the local experiment store"):
+        SQLiteExperimentStore(store_path).get_run(10)
+    with pytest.raises(EdgeException, match="Runs 10 are not found in the local experiment store"):
+        compare_runs(SQLiteExperimentStore(store_path), [1, 10])
+
+
+def test_local_store_is_used_when_tracker_is_not_initialised(tmp_path, monkeypatch):
+    monkeypatch.setenv("EDGE_CONFIG_PATH", str(tmp_path / "edge.yaml"))
+    run_experiment(get_local_experiments_path(str(tmp_path)), "fashion", 0.1)
+
+    store = get_experiment_store(SimpleNamespace(experiments=None))
+
+    assert isinstance(store, SQLiteExperimentStore)
+
+
+def test_local_store_can_be_queried_when_tracker_is_initialised(tmp_path, monkeypatch):
+    monkeypatch.setenv("EDGE_CONFIG_PATH", str(tmp_path / "edge.yaml"))
+    config = SimpleNamespace(experiments=SimpleNamespace(mongodb_connection_string_secret="sacred-mongodb"))
+
+    with pytest.raises(EdgeException):
+        get_experiment_store(config, local=True)
+
+    run_experiment(get_local_experiments_path(str(tmp_path)), "fashion", 0.1)
+    store = get_experiment_store(config, local=True)
+
+    assert [run["_id"] for run in store.find_runs()] == [1]
@@ -0,0 +1,148 @@
+import random
+import threading
+import time
+from typing import Any, List
+
+import pytest
+
+from edge.predict import PredictionClient, PredictionError
+from edge.serve import LocalPredictionServer, Predictor
+
+
+class FakePredictor(Predictor):
+    """
+    Echoes the `x` of every instance after [latency_ms], failing the first [failures] calls. The size of every call
+    is recorded in [batch_sizes].
+    """
+
+    def __init__(self, latency_ms: float = 0, failures: int = 0, jitter: bool = False):
+        self.latency = latency_ms / 1000
+        self.failures = failures
+        self.jitter = jitter
+        self.batch_sizes: List[int] = []
+        self.lock = threading.Lock()
+
+    def predict(self, instances: List[Any]) -> List[Any]:
+        with self.lock:
+            self.batch_sizes.append(len(instances))
+            if self.failures > 0:
+                self.failures -= 1
+                raise RuntimeError("Model is not ready")
+        time.sleep(self.latency * (random.random() * 2 if self.jitter else 1))
+        return [instance["x"] for instance in instances]
+
+
+def serve(predictor: Predictor) -> LocalPredictionServer:
+    # Without batching on the server, every call of the predictor is one request of the client
+    return LocalPredictionServer(predictor, max_batch_size=1, workers=16)
+
+
+def instances(count: int):
+    return [{"x": i} for i in range(count)]
+
+
+def test_predictions_are_returned_in_input_order():
+    with serve(FakePredictor(latency_ms=5, jitter=True)) as server, \
+            PredictionClient(server.predict_url, max_batch_size=8, max_concurrency=8) as client:
+        assert list(client.predict_stream(instances(500))) == list(range(500))
+
+
+def test_instances_are_coalesced_into_batches():
+    predictor = FakePredictor(latency_ms=5)
+    with serve(predictor) as server, \
+            PredictionClient(server.predict_url, max_batch_size=16, max_latency_ms=50) as client:
+        futures = [client.predict(instance) for instance in instances(100)]
+        assert [future.result() for future in futures] == list(range(100))
+
+    assert sum(predictor.batch_sizes) == 100
+    assert max(predictor.batch_sizes) == 16
+    assert len(predictor.batch_sizes) < 20
+
+
+def test_predict_blocks_while_the_client_is_saturated():
+    predictor = FakePredictor(latency_ms=100)
+    submitted = []
+    with serve(predictor) as server, \
+            PredictionClient(server.predict_url, max_batch_size=1, max_concurrency=1, max_latency_ms=0) as client:
+
+        def submit():
+            for instance in instances(10):
+                submitted.append(client.predict(instance))
+
+        thread = threading.Thread(target=submit)
+        thread.start()
+        time.sleep(0.05)
+        # 1 request in flight, 1 batch waiting for a worker, 1 batch waiting for the batcher to submit it, and
+        # 2 instances waiting to be batched
+        assert len(submitted) <= 5
+        thread.join()
+        assert [future.result() for future in submitted] == list(range(10))
+
+
+def test_transient_failures_are_retried():
+    predictor = FakePredictor(failures=2)
+    with serve(predictor) as server, PredictionClient(server.predict_url, backoff_seconds=0) as client:
+        assert client.predict_batch(instances(3)) == [0, 1, 2]
+    assert len(predictor.batch_sizes) == 3
+
+
+def test_persistent_failures_fail_every_instance_of_the_batch():
+    with serve(FakePredictor(failures=100)) as server, \
+            PredictionClient(server.predict_url, max_retries=2, backoff_seconds=0, max_latency_ms=50) as client:
+        futures = [client.predict(instance) for instance in instances(3)]
+        for future in futures:
+            with pytest.raises(PredictionError, match="after 2 retries"):
+                future.result()
+
+
+def test_client_errors_are_not_retried():
+    predictor = FakePredictor()
+    with serve(predictor) as server:
+        unknown_url = server.predict_url.replace(":predict", ":explain")
+        with PredictionClient(unknown_url, backoff_seconds=0) as client:
+            with pytest.raises(PredictionError, match="HTTP 404"):
+                client.predict_batch(instances(1))
+    assert predictor.batch_sizes == []
+
+
+def test_unreachable_server_is_reported():
+    with serve(FakePredictor()) as server:
+        predict_url = server.predict_url
+    with PredictionClient(predict_url, max_retries=1, backoff_seconds=0, timeout_seconds=1) as client:
+        with pytest.raises(PredictionError, match="after 1 retries"):
+            client.predict_batch(instances(1))
+
+
+def test_closed_client_rejects_instances():
+    with serve(FakePredictor()) as server:
+        client = PredictionClient(server.predict_url)
+        client.close()
+    with pytest.raises(PredictionError):
+        client.predict({"x": 0})
+
+
+def test_micro_batching_outperforms_one_request_per_instance():
+    count = 200
+    with serve(FakePredictor(latency_ms=5)) as server:
+        with PredictionClient(server.predict_url, max_concurrency=1) as client:
+            started = time.perf_counter()
+            serial = [client.predict_batch([instance]) for instance in instances(count)]
+            serial_seconds = time.perf_counter() - started
+
+        with PredictionClient(server.predict_url, max_batch_size=32, max_concurrency=8) as client:
+            started = time.perf_counter()
+            batched = list(client.predict_stream(instances(count)))
+            batched_seconds = time.perf_counter() - started
+
+    assert [prediction for (prediction,) in serial] == batched == list(range(count))
+    # Serial requests take at least 5ms each, while batches of 32 are sent concurrently
+    assert serial_seconds >= count * 0.005
+    assert batched_seconds * 4 < serial_seconds
+
+
+def test_predictor_must_implement_predict():
+    class Incomplete(Predictor):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
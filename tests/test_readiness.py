@@ -0,0 +1,239 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from kubernetes import client
+
+from edge.exception import EdgeException
+from edge.readiness import INITIAL_BACKOFF_SECONDS, wait_for, wait_for_deployment, wait_for_load_balancer
+
+
+def service(name: str, ip: str = None) -> dict:
+    return {
+        "metadata": {"name": name, "namespace": "default"},
+        "spec": {"type": "LoadBalancer"},
+        "status": {"loadBalancer": {"ingress": [{"ip": ip}] if ip else []}},
+    }
+
+
+def deployment(name: str, generation: int, observed_generation: int, available_replicas: int) -> dict:
+    return {
+        "metadata": {"name": name, "namespace": "default", "generation": generation},
+        "spec": {"replicas": 1, "selector": {"matchLabels": {"app": name}}, "template": {}},
+        "status": {"observedGeneration": observed_generation, "updatedReplicas": available_replicas,
+                   "availableReplicas": available_replicas},
+    }
+
+
+class FakeApiServer:
+    """
+    Kubernetes API server on a local port, which answers lists and watches of namespaced resources from a script
+
+    Lists answer the `items` of the kind of resource, e.g. "services", selected by name. A watch streams the `events`
+    queued for the kind, then ends like a watch that timed out, after which the items are replaced by those in
+    `after_watch`. The next requests are answered with the statuses in `errors` instead.
+    """
+
+    def __init__(self):
+        self.items = {}
+        self.events = {}
+        self.after_watch = {}
+        self.errors = []
+        self.requests = []
+        self.resource_version = 0
+        self.lock = threading.Lock()
+        api_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                api_server.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.api_client = client.ApiClient(client.Configuration())
+        self.api_client.configuration.host = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def handle(self, handler: BaseHTTPRequestHandler):
+        url = urlparse(handler.path)
+        kind = url.path.rstrip("/").split("/")[-1]
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        # The client sends `watch=True`
+        watching = query.get("watch", "").lower() == "true"
+        _, _, name = query.get("fieldSelector", "").partition("metadata.name=")
+        with self.lock:
+            self.requests.append((kind, watching, query))
+            error = self.errors.pop(0) if self.errors else None
+            self.resource_version += 1
+            items = [item for item in self.items.get(kind, []) if item["metadata"]["name"] == name]
+            events = self.events.pop(kind, []) if watching else []
+        if error is not None:
+            self.respond(handler, error, {"kind": "Status", "code": error, "reason": "Scripted", "message": "error"})
+        elif watching:
+            handler.send_response(200)
+            handler.send_header("Content-Type", "application/json")
+            handler.end_headers()
+            for event_type, resource in events:
+                handler.wfile.write(json.dumps({"type": event_type, "object": resource}).encode("utf-8") + b"\n")
+                handler.wfile.flush()
+            with self.lock:
+                if kind in self.after_watch:
+                    self.items[kind] = self.after_watch.pop(kind)
+        else:
+            self.respond(handler, 200, {"metadata": {"resourceVersion": str(self.resource_version)}, "items": items})
+
+    @staticmethod
+    def respond(handler: BaseHTTPRequestHandler, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def made_requests(self) -> list:
+        """
+        :return: "list" or "watch" for each request, in order
+        """
+        return ["watch" if watching else "list" for _, watching, _ in self.requests]
+
+
+@pytest.fixture
+def api_server():
+    api_server = FakeApiServer()
+    thread = threading.Thread(target=api_server.httpd.serve_forever, daemon=True)
+    thread.start()
+    yield api_server
+    api_server.httpd.shutdown()
+    api_server.httpd.server_close()
+
+
+def wait_for_service(api_server: FakeApiServer, name: str, sleep: Callable[[float], None], retries: list = None,
+                     timeout_seconds: float = 30):
+    return wait_for(
+        client.CoreV1Api(api_server.api_client).list_namespaced_service,
+        name,
+        "default",
+        lambda resource: bool(resource.status.load_balancer.ingress),
+        time.monotonic() + timeout_seconds,
+        on_retry=(lambda error, backoff: retries.append(backoff)) if retries is not None else None,
+        sleep=sleep,
+    )
+
+
+def test_address_is_pushed_by_the_watch(api_server):
+    api_server.items["services"] = [service("mongodb-lb")]
+    api_server.events["services"] = [("ADDED", service("mongodb-lb")), ("MODIFIED", service("mongodb-lb", "10.0.0.1"))]
+
+    address = wait_for_load_balancer(api_server.api_client, "mongodb-lb", time.monotonic() + 30)
+
+    assert address == "10.0.0.1"
+    assert api_server.made_requests() == ["list", "watch"]
+    _, _, query = api_server.requests[1]
+    assert query["fieldSelector"] == "metadata.name=mongodb-lb"
+    # The watch starts from the version of the list, so no change in between is missed
+    assert query["resourceVersion"] == "1"
+
+
+def test_ready_resource_is_not_watched(api_server):
+    api_server.items["services"] = [service("omniboard-lb", "10.0.0.2")]
+
+    address = wait_for_load_balancer(api_server.api_client, "omniboard-lb", time.monotonic() + 30)
+
+    assert address == "10.0.0.2"
+    assert api_server.made_requests() == ["list"]
+
+
+def test_watch_that_times_out_lists_again(api_server):
+    api_server.items["services"] = [service("mongodb-lb")]
+    api_server.after_watch["services"] = [service("mongodb-lb", "10.0.0.1")]
+    sleeps = []
+
+    resource = wait_for_service(api_server, "mongodb-lb", sleeps.append)
+
+    assert resource.status.load_balancer.ingress[0].ip == "10.0.0.1"
+    assert api_server.made_requests() == ["list", "watch", "list"]
+    assert sleeps == []
+
+
+def test_transient_errors_are_retried_with_backoff(api_server):
+    api_server.items["services"] = [service("mongodb-lb", "10.0.0.1")]
+    api_server.errors = [503, 429, 500]
+    sleeps, retries = [], []
+
+    resource = wait_for_service(api_server, "mongodb-lb", sleeps.append, retries)
+
+    assert resource.status.load_balancer.ingress[0].ip == "10.0.0.1"
+    assert retries == [INITIAL_BACKOFF_SECONDS, INITIAL_BACKOFF_SECONDS * 2, INITIAL_BACKOFF_SECONDS * 4]
+    assert sleeps == retries
+
+
+def test_expired_watch_lists_again_without_backoff(api_server):
+    api_server.items["services"] = [service("mongodb-lb")]
+    api_server.events["services"] = [("ERROR", {"kind": "Status", "code": 410, "reason": "Expired",
+                                                "message": "too old resource version"})]
+    api_server.after_watch["services"] = [service("mongodb-lb", "10.0.0.1")]
+    sleeps = []
+
+    wait_for_service(api_server, "mongodb-lb", sleeps.append)
+
+    assert api_server.made_requests() == ["list", "watch", "list"]
+    assert sleeps == []
+
+
+def test_other_errors_are_not_retried(api_server):
+    api_server.errors = [403]
+    sleeps = []
+
+    with pytest.raises(EdgeException, match="403"):
+        wait_for_service(api_server, "mongodb-lb", sleeps.append)
+
+    assert api_server.made_requests() == ["list"]
+    assert sleeps == []
+
+
+def test_unreachable_api_server_is_retried_until_the_deadline(api_server):
+    api_server.httpd.shutdown()
+    api_server.httpd.server_close()
+    sleeps, retries = [], []
+
+    with pytest.raises(EdgeException, match="Timed out"):
+        wait_for_service(api_server, "mongodb-lb", lambda seconds: (sleeps.append(seconds), time.sleep(seconds)),
+                         retries, timeout_seconds=1.5)
+
+    assert retries[0] == INITIAL_BACKOFF_SECONDS
+    assert sum(sleeps) <= 1.5
+
+
+def test_deployment_waits_for_the_new_revision(api_server):
+    # The previous revision is available, but the new one is not observed yet
+    api_server.items["deployments"] = [deployment("mongodb", generation=2, observed_generation=1,
+                                                  available_replicas=1)]
+    api_server.events["deployments"] = [
+        ("MODIFIED", deployment("mongodb", generation=2, observed_generation=2, available_replicas=0)),
+        ("MODIFIED", deployment("mongodb", generation=2, observed_generation=2, available_replicas=1)),
+    ]
+
+    wait_for_deployment(api_server.api_client, "mongodb", time.monotonic() + 30)
+
+    assert api_server.made_requests() == ["list", "watch"]
+    assert api_server.requests[0][0] == "deployments"
+
+
+def test_services_are_waited_for_concurrently(api_server):
+    api_server.items["services"] = [service("mongodb-lb"), service("omniboard-lb")]
+    api_server.after_watch["services"] = [service("mongodb-lb", "10.0.0.1"), service("omniboard-lb", "10.0.0.2")]
+    deadline = time.monotonic() + 30
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        addresses = list(executor.map(
+            lambda name: wait_for_load_balancer(api_server.api_client, name, deadline), ["mongodb-lb", "omniboard-lb"]
+        ))
+
+    assert addresses == ["10.0.0.1", "10.0.0.2"]
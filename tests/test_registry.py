@@ -0,0 +1,92 @@
+from contextlib import contextmanager
+
+import pytest
+
+from edge import registry
+from edge.command.model.init import merge_model_state
+from edge.exception import EdgeException
+from edge.registry import register_model_version
+from edge.state import EdgeState, ModelState, ModelVersion, StateLockedError
+
+from tests.fakes import FakeModel, FakeStorageClient
+
+ARTIFACT_URI = "gs://bucket/vertex/fashion-1/model"
+ENDPOINT = "projects/project/locations/europe-west4/endpoints/1"
+
+
+@pytest.fixture
+def storage_client(monkeypatch):
+    client = FakeStorageClient()
+    client.add_blob(f"{ARTIFACT_URI}/saved_model.pb", b"model")
+    client.add_blob(f"{ARTIFACT_URI}/edge_metrics.json", '{"accuracy": 0.9}')
+    monkeypatch.setattr(registry.storage, "Client", lambda *args, **kwargs: client)
+    return client
+
+
+@pytest.fixture
+def locked_state(project, monkeypatch):
+    """
+    State that stays locked by another command for the given number of attempts to lock it
+
+    :return: (state, set the number of attempts)
+    """
+    config, state = project
+    state.models["fashion"] = ModelState(endpoint_resource_name=ENDPOINT)
+    attempts = {"locked": 0, "made": 0}
+
+    @contextmanager
+    def context(_config, to_lock=False, to_save=False, silent=False):
+        attempts["made"] += 1
+        if to_lock and attempts["made"] <= attempts["locked"]:
+            raise StateLockedError("State file is already locked")
+        yield state
+
+    monkeypatch.setattr(EdgeState, "context", context)
+    return config, state, attempts
+
+
+def test_version_is_registered_with_metrics_and_fingerprint(locked_state, storage_client):
+    config, state, _ = locked_state
+
+    version = register_model_version(config, "fashion", FakeModel(), ARTIFACT_URI)
+
+    assert state.models["fashion"].versions == [version]
+    assert version.metrics == {"accuracy": 0.9}
+    assert version.fingerprint is not None
+
+
+def test_registration_waits_for_the_state_lock(locked_state, storage_client):
+    config, state, attempts = locked_state
+    attempts["locked"] = 3
+    sleeps = []
+
+    register_model_version(config, "fashion", FakeModel(), ARTIFACT_URI, sleep=sleeps.append)
+
+    assert sleeps == [5, 10, 20]
+    assert len(state.models["fashion"].versions) == 1
+
+
+def test_registration_gives_up_when_the_state_stays_locked(locked_state, storage_client):
+    config, state, attempts = locked_state
+    attempts["locked"] = 100
+    sleeps = []
+
+    with pytest.raises(EdgeException, match="force-unlock"):
+        register_model_version(config, "fashion", FakeModel(), ARTIFACT_URI, lock_timeout_seconds=30,
+                               sleep=sleeps.append)
+
+    assert sum(sleeps) == 30
+    assert state.models["fashion"].versions == []
+
+
+def test_reinitialised_model_keeps_its_state():
+    version = ModelVersion(resource_name="projects/project/locations/europe-west4/models/1",
+                           artifact_uri=ARTIFACT_URI, fingerprint=None, created_at="2021-09-01T00:00:00+00:00")
+    previous = ModelState(endpoint_resource_name=ENDPOINT, deployed_model_id="1", versions=[version])
+
+    assert merge_model_state(None, ModelState(endpoint_resource_name=ENDPOINT)).deployed_model_id is None
+    assert merge_model_state(previous, ModelState(endpoint_resource_name=ENDPOINT)) is previous
+
+    moved = merge_model_state(previous, ModelState(endpoint_resource_name=ENDPOINT.replace("/1", "/2")))
+    assert (moved.endpoint_resource_name, moved.deployed_model_id) == (ENDPOINT.replace("/1", "/2"), None)
+    assert moved.versions == [version]
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from edge.command.model import remove
+from edge.command.model.remove import remove_models
+from edge.config import ModelConfig
+from edge.exception import EdgeException
+from edge.state import ModelState
+
+DEDICATED = "projects/project/locations/europe-west4/endpoints/1"
+SHARED = "projects/project/locations/europe-west4/endpoints/2"
+
+
+def run(command, *args) -> int:
+    """
+    Run a command, which always exits
+
+    :return: its exit code
+    """
+    with pytest.raises(SystemExit) as exit_info:
+        command(*args)
+    return exit_info.value.code
+
+
+@pytest.fixture
+def removals(project, monkeypatch):
+    """
+    Models that were removed from their endpoints, in order
+    """
+    config, state = project
+    for model_name, endpoint in [("a", SHARED), ("b", SHARED), ("c", SHARED), ("d", DEDICATED)]:
+        config.models[model_name] = ModelConfig(name=model_name, endpoint_name=endpoint)
+        state.models[model_name] = ModelState(endpoint_resource_name=endpoint)
+    monkeypatch.setattr(remove, "precommand_checks", lambda _: None)
+    removed = []
+    lock = threading.Lock()
+
+    def remove_model_from_endpoint(model_state, shared_with):
+        # Slow enough for the other models to be waiting by the time the endpoint is deleted
+        time.sleep(0.1)
+        with lock:
+            removed.append((model_state.endpoint_resource_name, sorted(shared_with)))
+        if model_state.endpoint_resource_name in failing:
+            raise EdgeException("Endpoint has deployed models")
+
+    failing = set()
+    monkeypatch.setattr(remove, "remove_model_from_endpoint", remove_model_from_endpoint)
+    return removed, failing
+
+
+def test_endpoint_left_without_models_is_deleted_once(project, removals):
+    config, state = project
+    removed, _ = removals
+
+    run(remove_models, ["a", "b", "c"])
+
+    assert removed == [(SHARED, [])]
+    assert set(config.models) == set(state.models) == {"d"}
+
+
+def test_model_sharing_with_a_kept_model_is_undeployed(project, removals):
+    config, state = project
+    removed, _ = removals
+
+    run(remove_models, ["a", "b"])
+
+    assert sorted(removed) == [(SHARED, ["c"]), (SHARED, ["c"])]
+    assert set(state.models) == {"c", "d"}
+
+
+def test_models_are_kept_when_their_endpoint_cannot_be_deleted(project, removals):
+    config, state = project
+    removed, failing = removals
+    failing.add(SHARED)
+
+    assert run(remove_models, ["a", "b", "c", "d"]) == 1
+
+    assert removed.count((SHARED, [])) == 1
+    assert set(config.models) == set(state.models) == {"a", "b", "c"}
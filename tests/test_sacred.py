@@ -0,0 +1,64 @@
+import pytest
+from sacred import Experiment
+
+from edge import sacred
+from edge.sacred import close_mongo_clients, create_mongo_observer, create_mongodb_indexes, get_mongo_client
+
+
+@pytest.fixture(autouse=True)
+def shared_clients():
+    yield
+    close_mongo_clients()
+
+
+def run_experiment(connection_string: str, loss: float):
+    experiment = Experiment("fashion", save_git_info=False, interactive=True)
+    experiment.observers.append(create_mongo_observer(connection_string))
+
+    @experiment.main
+    def main(_run):
+        _run.log_scalar("loss", loss)
+        return loss
+
+    return experiment.run(options={"--loglevel": "ERROR"})
+
+
+def test_client_is_shared_per_connection_string():
+    client = get_mongo_client("mongodb://127.0.0.1:27017/sacred")
+
+    assert get_mongo_client("mongodb://127.0.0.1:27017/sacred") is client
+    assert get_mongo_client("mongodb://127.0.0.1:27018/sacred") is not client
+    assert create_mongo_observer("mongodb://127.0.0.1:27017/sacred").runs.database.client is client
+
+
+def test_client_is_tuned():
+    client = get_mongo_client("mongodb://127.0.0.1:27017/sacred")
+
+    assert client.max_pool_size == sacred.MONGO_CLIENT_OPTIONS["maxPoolSize"]
+    assert client.write_concern.document == {"w": 1}
+
+
+def test_clients_are_closed():
+    client = get_mongo_client("mongodb://127.0.0.1:27017/sacred")
+    close_mongo_clients()
+
+    assert get_mongo_client("mongodb://127.0.0.1:27017/sacred") is not client
+
+
+def test_observers_share_one_client(mongod, mongo_database):
+    for loss in [0.5, 0.25, 0.125]:
+        run_experiment(mongod, loss)
+
+    assert len(sacred._mongo_clients) == 1
+    runs = list(mongo_database.runs.find({}, {"result": 1, "status": 1}))
+    assert sorted(run["result"] for run in runs) == [0.125, 0.25, 0.5]
+    assert {run["status"] for run in runs} == {"COMPLETED"}
+    assert mongo_database.metrics.count_documents({"name": "loss"}) == 3
+
+
+def test_indexes_are_created_idempotently(mongod, mongo_database):
+    create_mongodb_indexes(mongod)
+    create_mongodb_indexes(mongod)
+
+    assert {"experiment_name", "status", "start_time"} <= set(mongo_database.runs.index_information())
+    assert "run_id" in mongo_database.metrics.index_information()
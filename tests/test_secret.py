@@ -0,0 +1,67 @@
+import os
+import stat
+from types import SimpleNamespace
+
+import pytest
+
+from edge import secret
+from edge.secret import SecretResolver
+
+
+class FakeSecretManagerClient:
+    def __init__(self, version: str = "1", value: str = "mongodb://tracker"):
+        self.version = version
+        self.value = value
+        self.accessed = 0
+
+    def __call__(self):
+        return self
+
+    def get_secret_version(self, name: str):
+        return SimpleNamespace(name=name.replace("latest", self.version))
+
+    def access_secret_version(self, name: str):
+        self.accessed += 1
+        return SimpleNamespace(
+            name=name.replace("latest", self.version),
+            payload=SimpleNamespace(data=self.value.encode("UTF-8")),
+        )
+
+
+@pytest.fixture
+def secret_manager(monkeypatch):
+    client = FakeSecretManagerClient()
+    monkeypatch.setattr(secret.secretmanager_v1, "SecretManagerServiceClient", client)
+    return client
+
+
+def test_secret_is_cached(tmp_path, monkeypatch, secret_manager):
+    monkeypatch.setenv("EDGE_CACHE_PATH", str(tmp_path))
+
+    assert SecretResolver("project", "secret").get(timeout=5) == "mongodb://tracker"
+    assert SecretResolver("project", "secret").get(timeout=5) == "mongodb://tracker"
+
+    assert secret_manager.accessed == 1
+    (cache_file,) = (tmp_path / "secrets").iterdir()
+    assert stat.S_IMODE(os.stat(cache_file).st_mode) == 0o600
+
+
+def test_expired_secret_is_fetched_again_when_its_version_changes(tmp_path, monkeypatch, secret_manager):
+    monkeypatch.setenv("EDGE_CACHE_PATH", str(tmp_path))
+    SecretResolver("project", "secret", ttl=0).get(timeout=5)
+
+    assert SecretResolver("project", "secret", ttl=0).get(timeout=5) == "mongodb://tracker"
+    assert secret_manager.accessed == 1
+
+    secret_manager.version, secret_manager.value = "2", "mongodb://new-tracker"
+    assert SecretResolver("project", "secret", ttl=0).get(timeout=5) == "mongodb://new-tracker"
+    assert secret_manager.accessed == 2
+
+
+def test_secret_is_resolved_when_it_cannot_be_cached(tmp_path, monkeypatch, secret_manager):
+    # A file where the cache directory should be, so that the cache cannot be written
+    not_a_directory = tmp_path / "cache"
+    not_a_directory.write_text("")
+    monkeypatch.setenv("EDGE_CACHE_PATH", str(not_a_directory))
+
+    assert SecretResolver("project", "secret").get(timeout=5) == "mongodb://tracker"
@@ -0,0 +1,58 @@
+import pytest
+from google.cloud.aiplatform import compat
+from google.cloud.aiplatform.compat.types import endpoint as gca_endpoint
+from google.cloud.aiplatform.compat.types import endpoint_v1beta1 as gca_endpoint_v1beta1
+
+from edge.config import ServingConfig
+from edge.exception import EdgeException
+from edge.vertex_deploy import CPU_UTILIZATION_METRIC, describe_serving, start_deploy_model
+
+from tests.fakes import FakeEndpoint, FakeModel
+
+
+def test_deploy_request_has_serving_resources():
+    endpoint = FakeEndpoint()
+    serving = ServingConfig(machine_type="n1-highcpu-4", min_replica_count=2, max_replica_count=2)
+
+    start_deploy_model(endpoint, FakeModel(), serving, {"0": 100})
+
+    (request,) = endpoint.deploy_requests
+    assert isinstance(request, gca_endpoint.DeployedModel)
+    assert request.dedicated_resources.machine_spec.machine_type == "n1-highcpu-4"
+    assert (request.dedicated_resources.min_replica_count, request.dedicated_resources.max_replica_count) == (2, 2)
+    assert endpoint.api_versions == []
+
+
+def test_deploy_request_with_autoscaling_target_uses_v1beta1():
+    endpoint = FakeEndpoint()
+    serving = ServingConfig(min_replica_count=1, max_replica_count=5, autoscaling_target_cpu_utilization=70)
+
+    start_deploy_model(endpoint, FakeModel(), serving, {"0": 100})
+
+    (request,) = endpoint.deploy_requests
+    assert isinstance(request, gca_endpoint_v1beta1.DeployedModel)
+    (metric_spec,) = request.dedicated_resources.autoscaling_metric_specs
+    assert (metric_spec.metric_name, metric_spec.target) == (CPU_UTILIZATION_METRIC, 70)
+    assert request.dedicated_resources.max_replica_count == 5
+    assert endpoint.api_versions == [compat.V1BETA1]
+
+
+@pytest.mark.parametrize("serving", [
+    ServingConfig(min_replica_count=0),
+    ServingConfig(min_replica_count=3, max_replica_count=2),
+    ServingConfig(max_replica_count=3, autoscaling_target_cpu_utilization=0),
+    ServingConfig(max_replica_count=3, autoscaling_target_cpu_utilization=150),
+])
+def test_invalid_serving_resources_are_rejected(serving):
+    endpoint = FakeEndpoint()
+
+    with pytest.raises(EdgeException):
+        start_deploy_model(endpoint, FakeModel(), serving, {"0": 100})
+    assert endpoint.deploy_requests == []
+
+
+def test_serving_resources_are_described():
+    assert describe_serving(ServingConfig()) == "n1-standard-2, 1 replica"
+    assert describe_serving(ServingConfig(min_replica_count=1, max_replica_count=4,
+                                          autoscaling_target_cpu_utilization=60)) == \
+        "n1-standard-2, 1-4 replicas at 60% CPU"
@@ -0,0 +1,44 @@
+import pytest
+import questionary
+
+from edge.command.model.status import model_status
+from edge.config import ModelConfig, ServingConfig
+from edge.state import ModelState
+
+
+@pytest.fixture
+def config(project):
+    config, _ = project
+    config.models["fashion"] = ModelConfig(name="fashion", endpoint_name="fashion-endpoint")
+    return config
+
+
+@pytest.mark.parametrize("models", [None, {}, {"fashion": None}])
+def test_model_without_state_is_reported(project, config, monkeypatch, models):
+    _, state = project
+    state.models = models
+    errors = []
+    monkeypatch.setattr(questionary, "print", lambda message, **kwargs: errors.append(message))
+
+    with pytest.raises(SystemExit) as exit_info:
+        model_status("fashion")
+
+    assert exit_info.value.code == 1
+    assert "./edge.sh model init fashion" in errors[0]
+
+
+def test_deployed_model_is_described(project, config, capsys):
+    _, state = project
+    state.models["fashion"] = ModelState(
+        endpoint_resource_name="projects/project/locations/europe-west4/endpoints/1",
+        deployed_model_resource_name="projects/project/locations/europe-west4/models/2",
+        deployed_serving=ServingConfig(),
+    )
+
+    with pytest.raises(SystemExit) as exit_info:
+        model_status("fashion")
+
+    assert exit_info.value.code == 0
+    out = capsys.readouterr().out
+    assert "Deployed: projects/project/locations/europe-west4/models/2 (n1-standard-2, 1 replica)" in out
+    assert "Pending:  nothing" in out
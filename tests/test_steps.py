@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from edge.command.common import precommand_check
+from edge.command.common.precommand_check import precommand_checks
+from edge.exception import EdgeException
+from edge.steps import Step, StepGraph
+
+
+def test_outputs_are_passed_to_dependent_steps():
+    graph = StepGraph([
+        Step("Sum", lambda a, b: a + b, inputs=["a", "b"], outputs=["sum"]),
+        Step("Double", lambda sum: (sum, sum * 2), inputs=["sum"], outputs=["same", "double"]),
+    ], show_critical_path=False)
+
+    assert graph.run({"a": 1, "b": 2}) == {"a": 1, "b": 2, "sum": 3, "same": 3, "double": 6}
+
+
+def test_independent_steps_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    graph = StepGraph([
+        Step("First", lambda: barrier.wait(), outputs=["first"]),
+        Step("Second", lambda: barrier.wait(), outputs=["second"]),
+    ], show_critical_path=False)
+
+    assert set(graph.run()) == {"first", "second"}
+
+
+def test_critical_path_is_the_longest_chain():
+    graph = StepGraph([
+        Step("Short", lambda: time.sleep(0.01), outputs=["short"]),
+        Step("Long", lambda: time.sleep(0.1), outputs=["long"]),
+        Step("After long", lambda long: time.sleep(0.01), inputs=["long"]),
+    ], show_critical_path=False)
+    graph.run()
+
+    path, duration = graph.critical_path()
+
+    assert path == ["Long", "After long"]
+    assert duration >= 0.11
+
+
+def test_steps_that_can_never_run_are_rejected():
+    graph = StepGraph([Step("Orphan", lambda missing: None, inputs=["missing"])])
+
+    with pytest.raises(ValueError, match="missing"):
+        graph.run()
+
+
+def test_first_failure_is_raised_and_dependent_steps_are_skipped():
+    ran = []
+
+    def fail():
+        raise EdgeException("Enable the API first")
+
+    graph = StepGraph([
+        Step("Failing", fail, outputs=["enabled"]),
+        Step("Dependent", lambda enabled: ran.append("dependent"), inputs=["enabled"]),
+    ], show_critical_path=False)
+
+    with pytest.raises(EdgeException, match="Enable the API first"):
+        graph.run()
+
+    assert ran == []
+
+
+def test_unexpected_failure_is_counted_and_chained():
+    def fail():
+        raise RuntimeError("Boom")
+
+    graph = StepGraph([Step("Failing", fail), Step("Other", lambda: None)], show_critical_path=False)
+
+    with pytest.raises(EdgeException, match="1 of 2 failed to complete: Boom") as exc_info:
+        graph.run()
+
+    assert isinstance(exc_info.value.__cause__, RuntimeError)
+
+
+def test_failed_check_explains_what_to_fix(project, monkeypatch):
+    config, _ = project
+    monkeypatch.setattr(precommand_check, "is_authenticated", lambda project_id: (True, None))
+    monkeypatch.setattr(precommand_check, "project_exists", lambda project_id: None)
+    monkeypatch.setattr(precommand_check, "is_billing_enabled", lambda project_id: False)
+
+    with pytest.raises(EdgeException, match="Billing is not enabled for project 'project'"):
+        precommand_checks(config)
+
+
+def test_billing_is_not_checked_for_missing_project(project, monkeypatch):
+    config, _ = project
+    checked = []
+
+    def missing_project(project_id):
+        raise EdgeException(f"Project '{project_id}' does not exist")
+
+    monkeypatch.setattr(precommand_check, "is_authenticated", lambda project_id: (True, None))
+    monkeypatch.setattr(precommand_check, "project_exists", missing_project)
+    monkeypatch.setattr(precommand_check, "is_billing_enabled", lambda project_id: checked.append(project_id))
+
+    with pytest.raises(EdgeException, match="Project 'project' does not exist"):
+        precommand_checks(config)
+
+    assert checked == []
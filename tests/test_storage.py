@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+
+import pytest
+
+from edge import storage
+from edge.config import LifecycleRuleConfig
+from edge.exception import EdgeException
+from edge.storage import (
+    default_lifecycle_rules, diff_lifecycle_rules, lifecycle_rules_for, managed_lifecycle_prefixes,
+    setup_lifecycle_rules,
+)
+
+USER_RULE = {"action": {"type": "Delete"}, "condition": {"matchesPrefix": ["logs/"], "age": 7}}
+BUCKET_RULE = {"action": {"type": "Delete"}, "condition": {"age": 365}}
+
+
+class FakeBucket:
+    def __init__(self, lifecycle_rules: list):
+        self.lifecycle_rules = lifecycle_rules
+        self.patched = []
+
+    def patch(self):
+        self.patched.append(list(self.lifecycle_rules))
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    bucket = FakeBucket([])
+    monkeypatch.setattr(storage, "get_bucket", lambda project_id, bucket_name: bucket)
+    monkeypatch.setattr(storage.questionary, "confirm", lambda *args, **kwargs: SimpleNamespace(ask=lambda: True))
+    return bucket
+
+
+def test_lifecycle_rules_for_config():
+    rules = lifecycle_rules_for([
+        LifecycleRuleConfig("dvcstore/", nearline_after_days=30, coldline_after_days=90),
+        LifecycleRuleConfig("vertex/aiplatform-", delete_after_days=30),
+    ])
+
+    assert rules == [
+        {
+            "action": {"type": "SetStorageClass", "storageClass": "NEARLINE"},
+            "condition": {"matchesPrefix": ["dvcstore/"], "age": 30, "matchesStorageClass": ["STANDARD"]},
+        },
+        {
+            "action": {"type": "SetStorageClass", "storageClass": "COLDLINE"},
+            "condition": {"matchesPrefix": ["dvcstore/"], "age": 90, "matchesStorageClass": ["STANDARD", "NEARLINE"]},
+        },
+        {"action": {"type": "Delete"}, "condition": {"matchesPrefix": ["vertex/aiplatform-"], "age": 30}},
+    ]
+
+
+def test_coldline_before_nearline_is_rejected():
+    with pytest.raises(EdgeException, match="Coldline before Nearline"):
+        lifecycle_rules_for([LifecycleRuleConfig("dvcstore/", nearline_after_days=90, coldline_after_days=30)])
+
+
+def test_diff_ignores_rule_order_and_rules_of_the_user(project):
+    config, _ = project
+    desired = lifecycle_rules_for(default_lifecycle_rules(config.storage_bucket))
+    stale = lifecycle_rules_for([LifecycleRuleConfig("dvcstore/", delete_after_days=10)])
+    current = [USER_RULE, BUCKET_RULE] + stale + list(reversed(desired[1:]))
+
+    added, removed = diff_lifecycle_rules(current, desired, managed_lifecycle_prefixes(config.storage_bucket))
+
+    assert added == desired[:1]
+    assert removed == stale
+
+
+def test_setup_keeps_rules_of_the_user(project, bucket):
+    config, _ = project
+    stale = lifecycle_rules_for([LifecycleRuleConfig("vertex/old/", delete_after_days=10)])
+    bucket.lifecycle_rules = [USER_RULE, BUCKET_RULE] + stale
+    rule_configs = default_lifecycle_rules(config.storage_bucket)
+
+    assert setup_lifecycle_rules("project", "bucket", rule_configs, managed_lifecycle_prefixes(config.storage_bucket))
+
+    assert bucket.patched == [[USER_RULE, BUCKET_RULE] + lifecycle_rules_for(rule_configs)]
+
+
+def test_setup_leaves_bucket_alone_when_up_to_date(project, bucket):
+    config, _ = project
+    rule_configs = default_lifecycle_rules(config.storage_bucket)
+    bucket.lifecycle_rules = [USER_RULE] + lifecycle_rules_for(rule_configs)
+
+    assert setup_lifecycle_rules("project", "bucket", rule_configs, managed_lifecycle_prefixes(config.storage_bucket))
+
+    assert bucket.patched == []
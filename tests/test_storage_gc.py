@@ -0,0 +1,93 @@
+import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from edge import registry
+from edge.command.storage import gc
+from edge.command.storage.gc import storage_gc
+from edge.registry import list_vertex_artifact_uris
+from edge.state import ModelState, ModelVersion
+from edge.storage_gc import collect_garbage, find_live_prefixes
+
+from tests.fakes import FakeStorageClient
+
+NOW = datetime.datetime(2021, 10, 1, tzinfo=datetime.timezone.utc)
+OLD = NOW - datetime.timedelta(days=7)
+
+
+def prefixes(client: FakeStorageClient):
+    return sorted({name.split("/")[1] for name in client.bucket("bucket").blobs})
+
+
+@pytest.fixture
+def client():
+    client = FakeStorageClient()
+    client.add_blob("gs://bucket/vertex/live/model/saved_model.pb", b"model", updated=OLD)
+    client.add_blob("gs://bucket/vertex/orphan/model/saved_model.pb", b"orphaned", updated=OLD)
+    client.add_blob("gs://bucket/vertex/orphan/metrics.json", b"{}", updated=OLD)
+    client.add_blob("gs://bucket/vertex/running/model/saved_model.pb", b"model", updated=NOW)
+    client.add_blob("gs://bucket/vertex/batch-prediction/input-00000.jsonl", b"{}", updated=OLD)
+    return client
+
+
+def test_artifacts_under_the_directory_are_live():
+    uris = ["gs://bucket/vertex/a/model", "gs://bucket/vertex/b", "gs://bucket/elsewhere/c", "gs://other/vertex/d"]
+
+    assert find_live_prefixes(uris, "bucket", "vertex") == {"vertex/a/", "vertex/b/"}
+
+
+def test_orphaned_prefixes_are_deleted(client):
+    report = collect_garbage(lambda: client, "bucket", "vertex", {"vertex/live/"}, datetime.timedelta(days=1),
+                             now=NOW)
+
+    assert prefixes(client) == ["batch-prediction", "live", "running"]
+    assert [usage.prefix for usage in report.deleted] == ["vertex/orphan/"]
+    assert (report.scanned, report.live, report.recent) == (4, 2, 1)
+    assert (report.blobs_deleted, report.bytes_reclaimed) == (2, 10)
+
+
+def test_dry_run_deletes_nothing(client):
+    report = collect_garbage(lambda: client, "bucket", "vertex", {"vertex/live/"}, datetime.timedelta(days=1),
+                             dry_run=True, now=NOW)
+
+    assert prefixes(client) == ["batch-prediction", "live", "orphan", "running"]
+    assert [usage.prefix for usage in report.deleted] == ["vertex/orphan/"]
+
+
+def test_every_model_in_the_project_is_listed(project, monkeypatch):
+    config, _ = project
+    calls = []
+
+    def list_models(**kwargs):
+        calls.append(kwargs)
+        return [
+            SimpleNamespace(_gca_resource=SimpleNamespace(artifact_uri="gs://bucket/vertex/a/model")),
+            SimpleNamespace(_gca_resource=SimpleNamespace(artifact_uri="")),
+        ]
+
+    monkeypatch.setattr(registry.Model, "list", list_models)
+
+    assert list_vertex_artifact_uris(config) == ["gs://bucket/vertex/a/model"]
+    assert calls == [dict(project="project", location="europe-west4")]
+
+
+def test_artifacts_of_unconfigured_models_are_kept(project, client, monkeypatch):
+    config, state = project
+    state.models["fashion"] = ModelState(
+        endpoint_resource_name="projects/project/locations/europe-west4/endpoints/1",
+        versions=[ModelVersion(resource_name="projects/project/locations/europe-west4/models/1",
+                               artifact_uri="gs://bucket/vertex/live/model", fingerprint=None,
+                               created_at=OLD.isoformat())],
+    )
+    client.add_blob("gs://bucket/vertex/removed/model/saved_model.pb", b"model", updated=OLD)
+    monkeypatch.setattr(gc, "precommand_checks", lambda _: None)
+    monkeypatch.setattr(gc.storage, "Client", lambda *args, **kwargs: client)
+    # Uploaded for a model that was removed from vertex:edge since
+    monkeypatch.setattr(gc, "list_vertex_artifact_uris", lambda _: ["gs://bucket/vertex/removed/model"])
+
+    with pytest.raises(SystemExit) as exit_info:
+        storage_gc(min_age_hours=24)
+
+    assert exit_info.value.code == 0
+    assert prefixes(client) == ["batch-prediction", "live", "removed"]
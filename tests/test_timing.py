@@ -0,0 +1,119 @@
+import datetime
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from edge import registry, train
+from edge.config import ModelConfig
+from edge.registry import TRACE_FILE_NAME
+from edge.timing import PhaseTimer
+from edge.train import Trainer, TrainingTarget
+
+from tests.fakes import FakeStorageClient
+
+
+def test_durations_are_summed_per_phase():
+    timer = PhaseTimer()
+    timer.record("epoch", 10.0, 10.5)
+    timer.record("epoch", 11.0, 11.25)
+    timer.record("save", 12.0, 13.0)
+
+    assert timer.durations() == {"epoch": 0.75, "save": 1.0}
+
+
+def test_phases_are_chrome_trace_events():
+    timer = PhaseTimer()
+    with timer.phase("load_config"):
+        time.sleep(0.01)
+
+    trace = timer.to_trace()
+
+    assert trace["displayTimeUnit"] == "ms"
+    [event] = trace["traceEvents"]
+    assert {key: event[key] for key in ("name", "cat", "ph")} == {"name": "load_config", "cat": "edge", "ph": "X"}
+    # Complete events are in microseconds from the start of the timer
+    assert isinstance(event["ts"], int) and event["ts"] >= 0
+    assert isinstance(event["dur"], int) and event["dur"] >= 10_000
+    assert isinstance(event["pid"], int) and isinstance(event["tid"], int)
+
+
+def test_trace_of_another_process_is_aligned_by_wall_clock():
+    timer = PhaseTimer()
+    other = PhaseTimer()
+    other.record("main", other.from_unix_time(time.time() + 60), other.from_unix_time(time.time() + 90))
+    trace = other.to_trace()
+    # As if the other process started 10 seconds after this one
+    trace["otherData"]["origin_unix_time"] = timer.to_trace()["otherData"]["origin_unix_time"] + 10
+
+    timer.merge(trace)
+
+    [event] = timer.to_trace()["traceEvents"]
+    assert event["ts"] == pytest.approx(other.to_trace()["traceEvents"][0]["ts"] + 10_000_000, abs=1000)
+    assert timer.durations() == pytest.approx({"main": 30.0}, abs=0.001)
+
+
+@pytest.fixture
+def trainer(project, tmp_path, monkeypatch):
+    config, _ = project
+    config.models["fashion"] = ModelConfig(name="fashion", endpoint_name="fashion-endpoint")
+    monkeypatch.setenv("EDGE_CONFIG", str(config).replace("\n", "\\n"))
+    monkeypatch.delenv("MODEL_ID", raising=False)
+    monkeypatch.delenv("RUN_ON_VERTEX", raising=False)
+    trainer = Trainer("fashion")
+    # Files of the run are written next to the training script
+    trainer.script_path = str(tmp_path / "train.py")
+    return trainer
+
+
+def test_user_code_is_timed_in_the_training_trace(trainer):
+    with trainer.timer("epoch"):
+        pass
+
+    assert "load_config" in trainer.phase_timer.durations()
+    assert "epoch" in trainer.phase_timer.durations()
+
+
+def test_vertex_job_is_split_into_phases_and_merged_with_its_trace(trainer, tmp_path, monkeypatch):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    job = SimpleNamespace(
+        create_time=now,
+        start_time=now + datetime.timedelta(seconds=120),
+        end_time=now + datetime.timedelta(seconds=420),
+        run=lambda: None,
+    )
+    # Phases recorded inside the job, and saved next to the model artifacts
+    inside = PhaseTimer()
+    inside.record("main", inside.from_unix_time(job.start_time.timestamp() + 10),
+                  inside.from_unix_time(job.end_time.timestamp() - 10))
+    client = FakeStorageClient()
+    client.add_blob(f"{trainer.vertex_output_path}/{TRACE_FILE_NAME}", json.dumps(inside.to_trace()))
+    trainer.target = TrainingTarget.VERTEX
+    monkeypatch.setattr(train.storage, "Client", lambda *args, **kwargs: client)
+    monkeypatch.setattr(trainer, "_create_vertex_job", lambda: job)
+
+    def create_model():
+        raise RuntimeError("The training script did not save a model")
+
+    monkeypatch.setattr(trainer, "_create_model_on_vertex", create_model)
+
+    trainer.run()
+
+    durations = trainer.phase_timer.durations()
+    assert durations["vertex_queue"] == pytest.approx(120)
+    assert durations["vertex_training"] == pytest.approx(300)
+    assert durations["main"] == pytest.approx(280)
+    assert (tmp_path / TRACE_FILE_NAME).exists()
+
+
+def test_trace_inside_a_vertex_job_is_kept_with_the_model(trainer, monkeypatch):
+    client = FakeStorageClient()
+    monkeypatch.setenv("MODEL_ID", str(trainer.model_id))
+    monkeypatch.setattr(registry.storage, "Client", lambda *args, **kwargs: client)
+    monkeypatch.setattr(trainer, "_run_locally", lambda: None)
+
+    trainer.run()
+
+    blob = client.bucket("bucket").get_blob(f"vertex/{trainer.model_id}/{TRACE_FILE_NAME}")
+    assert "load_config" in [event["name"] for event in json.loads(blob.data)["traceEvents"]]